@@ -0,0 +1,285 @@
+## The University of Utah and the operator of this website (along with their employees or agents) are not responsible
+## for any decisions or results of the decisions that you make. You assume all risk arising from reliance on this
+## website and, by using this website you agree to hold the University of Utah and the operation of the website harmless
+## for damages arising out of your actions, whether or not in reliance on information provided through the website.
+
+## The information provided through the website application is given “as is”. To the maximum extent permitted by applicable
+## law, the University of Utah and the operator of the website disclaim all representations and warranties, expressed or
+## implied, with respect to such information, services, products, and materials, including without limitation any implied
+## warranties or merchantability, fitness for a particular purpose and noninfringement. In no event will the University of
+## Utah or website operator be liable for any consequential, indirect, incidental, special, or punitive damages, however
+## caused and under any theory of liability (including negligence), arising from your use of the website or the provision
+## of the information, services, products, and materials provided to or by the University of Utah or the website operator,
+## even if the University of Utah or website operator has been advised of the possibility of such damages.
+
+
+## benchmark for the array engines behind ssd_EXECUTION.py and ssde_EXECUTION.py.
+## Runs without arcpy or a Spatial Analyst license on seeded synthetic data:
+##   - fractal (spectral synthesis) DTM
+##   - EVH codes from every range the remap handles (11-100, 101-199, 201-230, 301-310)
+##     plus some NoData
+##   - round safety zones that grow with the raster, and segment rasters (Voronoi
+##     cells standing in for SegmentMeanShift) with a set number of segments
+##
+##   python benchmark_ssd.py --sizes 512,1024,2048 --save-baseline baseline.json
+##   python benchmark_ssd.py --sizes 512,1024,2048 --compare baseline.json
+##
+## segment_numpy times the NumPy segmentation of the donut (segmentation.py),
+## index_build and donut_max_index the max-pyramid (ssd_index.py) and its large donut query.
+## Each stage is timed --repeat times and the fastest run is kept. --compare flags any
+## stage more than --threshold times slower than the baseline and exits with 1.
+
+## import relevant packages
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import ssd_engine
+import ssd_index
+import pssd_engine
+import profiling
+import segmentation
+
+CELLSIZE = 30.0
+
+# EVH code ranges and the share of cells each gets
+EVH_RANGES = [((11, 100), 0.15), ((101, 199), 0.35), ((201, 230), 0.25), ((301, 310), 0.25)]
+
+
+##############################
+##   synthetic data         ##
+##############################
+# fractal surface (spectral synthesis, amplitude ~ 1/f^(h+1)) scaled to 0..1
+def fractal_surface(nrows, ncols, seed, h=0.8):
+    rng = np.random.default_rng(seed)
+    fy = np.fft.fftfreq(nrows)[:, None]
+    fx = np.fft.rfftfreq(ncols)[None, :]
+    f = np.sqrt(fx**2 + fy**2)
+    f[0, 0] = 1.0
+    spectrum = (rng.normal(size=f.shape) + 1j * rng.normal(size=f.shape)) / f**(h + 1)
+    spectrum[0, 0] = 0
+    surface = np.fft.irfft2(spectrum, s=(nrows, ncols))
+    surface -= surface.min()
+    return surface / surface.max()
+
+
+# DTM in meters, scaled to a median slope of median_slope percent so every slope
+# class shows up at any raster size
+def synthetic_dtm(nrows, ncols, seed, median_slope=20.0):
+    surface = fractal_surface(nrows, ncols, seed)
+    relief = median_slope / np.nanmedian(ssd_engine.slope_percent(surface, CELLSIZE))
+    return 1000.0 + relief * surface
+
+
+# EVH codes: a smooth field picks the range (so vegetation comes in patches like
+# real cover), the code inside the range is random. nodata is the NaN share.
+def synthetic_evh(nrows, ncols, seed, nodata=0.01):
+    rng = np.random.default_rng(seed + 1)
+    field = fractal_surface(nrows, ncols, seed + 2, h=0.5)
+    cuts = np.quantile(field, np.cumsum([share for _, share in EVH_RANGES])[:-1])
+    which = np.searchsorted(cuts, field)
+    evh = np.empty((nrows, ncols))
+    for i, ((lo, hi), _) in enumerate(EVH_RANGES):
+        cells = which == i
+        evh[cells] = rng.integers(lo, hi + 1, size=int(cells.sum()))
+    evh[rng.random((nrows, ncols)) < nodata] = np.nan
+    return evh
+
+
+# round safety zone in the middle of the raster, radius in cells
+def synthetic_zone(nrows, ncols, radius):
+    rows, cols = np.ogrid[:nrows, :ncols]
+    return (rows - nrows // 2)**2 + (cols - ncols // 2)**2 <= radius**2
+
+
+# segment labels over the cells of donut: nearest of nsegments random seeds
+def synthetic_segments(donut, nsegments, seed):
+    from scipy.spatial import cKDTree
+    rng = np.random.default_rng(seed + 3)
+    rows, cols = np.nonzero(donut)
+    labels = np.full(donut.shape, np.nan)
+    if rows.size == 0:
+        return labels
+    pick = rng.choice(rows.size, size=min(nsegments, rows.size), replace=False)
+    seeds = np.column_stack((rows[pick], cols[pick]))
+    _, nearest = cKDTree(seeds).query(np.column_stack((rows, cols)))
+    labels[rows, cols] = nearest + 1
+    return labels
+
+
+##############################
+##   benchmark cases        ##
+##############################
+def run_tiled(evh, dtm, mfl, tile_size, workers):
+    padded = np.pad(dtm, 1, mode="constant", constant_values=np.nan)
+    out = np.empty(evh.shape, dtype=np.float32)
+    def tile(t):
+        row, col, nrows, ncols = t
+        out[row:row + nrows, col:col + ncols] = ssd_engine.compute_ssd_tile(
+            evh[row:row + nrows, col:col + ncols], padded[row:row + nrows + 2, col:col + ncols + 2],
+            CELLSIZE, CELLSIZE, mfl)
+    with ThreadPoolExecutor(max_workers = workers) as pool:
+        list(pool.map(tile, ssd_engine.iter_tiles(evh.shape[0], evh.shape[1], tile_size)))
+    return out
+
+
+# times every stage of one raster size, results go in results[case][stage] (seconds)
+def bench_size(size, args, prof, results):
+    seed = args.seed + size
+    dtm = synthetic_dtm(size, size, seed)
+    evh = synthetic_evh(size, size, seed)
+    mfl = ssd_engine.get_mfl(*ssd_engine.SCENARIOS[args.scenario])
+    case = "size=" + str(size)
+
+    def timed(case, stage, fn, **counts):
+        best = None
+        for _ in range(args.repeat):
+            with prof.stage(stage, case = case, **counts):
+                value = fn()
+            wall = prof.records[-1]["wall_s"]
+            best = wall if best is None else min(best, wall)
+        results.setdefault(case, {})[stage] = best
+        return value
+
+    pixels = size * size
+    timed(case, "evh_to_meters", lambda: ssd_engine.evh_to_meters(evh), pixels = pixels)
+    slope = timed(case, "slope", lambda: ssd_engine.slope_percent(dtm, CELLSIZE), pixels = pixels)
+    cls = timed(case, "slope_class", lambda: ssd_engine.slope_class(slope), pixels = pixels)
+    ssd = timed(case, "ssd_from_class", lambda: ssd_engine.compute_ssd_from_class(evh, cls, mfl), pixels = pixels)
+    if "numpy" in args.engines:
+        timed(case, "ssd_numpy", lambda: ssd_engine.compute_ssd_from_dtm(evh, dtm, CELLSIZE, mfl = mfl), pixels = pixels)
+    if "tiled" in args.engines:
+        timed(case, "ssd_tiled", lambda: run_tiled(evh, dtm, mfl, args.tile_size, args.workers), pixels = pixels)
+    if "scenarios" in args.engines:
+        timed(case, "ssd_scenarios", lambda: ssd_engine.compute_ssd_scenarios_from_class(evh, cls), pixels = pixels * 9)
+    del slope, cls
+    if "index" in args.engines:
+        pyramid = timed(case, "index_build", lambda: ssd_index.MaxPyramid.build(ssd), pixels = pixels)
+
+    # safety zones grow with the raster
+    for zone_frac in args.zones:
+        radius = max(1, int(size * zone_frac))
+        sz_mask = synthetic_zone(size, size, radius)
+        zone_case = case + ",zone=" + str(zone_frac)
+        dist = timed(zone_case, "zone_distance", lambda: pssd_engine.zone_distance(sz_mask, CELLSIZE), pixels = pixels)
+        def small_donut():
+            max_ssd = np.nanmax(np.where(pssd_engine.donut_mask(dist, pssd_engine.MAX_SSD), ssd, np.nan), initial=0)
+            return pssd_engine.donut_mask(dist, max_ssd)
+        donut = timed(zone_case, "donut", small_donut, pixels = pixels)
+        if "index" in args.engines:
+            sz_rows, sz_cols = np.nonzero(sz_mask)
+            timed(zone_case, "donut_max_index", lambda: pyramid.max_within(sz_rows, sz_cols, pssd_engine.MAX_SSD, CELLSIZE),
+                  pixels = pixels)
+        ssd_donut = np.where(donut, ssd, np.nan)
+        if "segmentation" in args.engines:
+            timed(zone_case, "segment_numpy", lambda: segmentation.segment_ssd(ssd_donut),
+                  pixels = int(np.isfinite(ssd_donut).sum()))
+        for nsegments in args.segments:
+            labels = synthetic_segments(donut, nsegments, seed)
+            seg_case = zone_case + ",segments=" + str(nsegments)
+            sz_cells = int(sz_mask.sum())
+            if "kdtree" in args.engines:
+                timed(seg_case, "pssd_kdtree", lambda: pssd_engine.minimum_pssd_kdtree(
+                    labels, ssd_donut, sz_mask, CELLSIZE), pixels = sz_cells, segments = nsegments)
+            if "pruned" in args.engines:
+                timed(seg_case, "pssd_pruned", lambda: pssd_engine.minimum_pssd_kdtree(
+                    labels, ssd_donut, sz_mask, CELLSIZE, prune = True), pixels = sz_cells, segments = nsegments)
+            if "pyramid" in args.engines:
+                timed(seg_case, "pssd_pyramid", lambda: pssd_engine.minimum_pssd_pyramid(
+                    labels, ssd_donut, sz_mask, CELLSIZE), pixels = sz_cells, segments = nsegments)
+            if "parallel" in args.engines:
+                timed(seg_case, "pssd_parallel", lambda: pssd_engine.minimum_pssd_parallel(
+                    labels, ssd_donut, sz_mask, CELLSIZE, workers = args.workers), pixels = sz_cells, segments = nsegments)
+
+
+##############################
+##   baselines              ##
+##############################
+def machine_info():
+    return {"python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "processor": platform.processor(),
+            "cpus": os.cpu_count()}
+
+
+# (case, stage, baseline s, current s, ratio) for every stage slower than threshold x
+# the baseline. Stages under min_seconds in both runs are too noisy to judge.
+def regressions(baseline, results, threshold, min_seconds):
+    slower = []
+    for case, stages in results.items():
+        for stage, seconds in stages.items():
+            base = baseline.get(case, {}).get(stage)
+            if base is None or max(base, seconds) < min_seconds:
+                continue
+            ratio = seconds / base if base > 0 else float("inf")
+            if ratio > threshold:
+                slower.append((case, stage, base, seconds, ratio))
+    return slower
+
+
+def parse_list(text, kind):
+    return [kind(v) for v in text.split(",") if v.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description = "Benchmark the SSD/SSDE array engines on synthetic data.")
+    parser.add_argument("--sizes", default = "256,512,1024", help = "raster sizes (cells per side)")
+    parser.add_argument("--zones", default = "0.01,0.03", help = "safety zone radius as a fraction of the raster size")
+    parser.add_argument("--segments", default = "50,500", help = "segment counts around each safety zone")
+    parser.add_argument("--engines", default = "numpy,tiled,scenarios,segmentation,index,kdtree,pruned,pyramid")
+    parser.add_argument("--scenario", type = int, default = 8, help = "index into ssd_engine.SCENARIOS")
+    parser.add_argument("--repeat", type = int, default = 3)
+    parser.add_argument("--seed", type = int, default = 20240601)
+    parser.add_argument("--tile-size", type = int, default = 512)
+    parser.add_argument("--workers", type = int, default = max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--save-baseline", help = "write the results to this JSON file")
+    parser.add_argument("--compare", help = "baseline JSON file to compare against")
+    parser.add_argument("--threshold", type = float, default = 1.25, help = "slowdown ratio that counts as a regression")
+    parser.add_argument("--min-seconds", type = float, default = 0.01)
+    parser.add_argument("--trace", default = "0", help = "folder for a JSON-lines trace of every timed run")
+    args = parser.parse_args(argv)
+    args.sizes = parse_list(args.sizes, int)
+    args.zones = parse_list(args.zones, float)
+    args.segments = parse_list(args.segments, int)
+    args.engines = parse_list(args.engines.lower(), str)
+
+    prof = profiling.Profiler("benchmark", trace_dir = args.trace)
+    results = {}
+    for size in args.sizes:
+        print("size " + str(size) + "...", flush = True)
+        bench_size(size, args, prof, results)
+
+    print("%-42s %-16s %10s" % ("case", "stage", "seconds"))
+    for case, stages in results.items():
+        for stage, seconds in stages.items():
+            print("%-42s %-16s %10.4f" % (case, stage, seconds))
+    if prof.trace_path is not None:
+        print("Trace written to " + prof.trace_path)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"created": time.strftime("%Y-%m-%d %H:%M:%S"), "machine": machine_info(),
+                       "seed": args.seed, "results": results}, f, indent = 1)
+        print("Baseline saved to " + args.save_baseline)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("seed") != args.seed:
+            print("Warning: baseline was made with seed " + str(baseline.get("seed")) + ".")
+        if baseline.get("machine") != machine_info():
+            print("Warning: baseline was made on a different machine or software versions.")
+        slower = regressions(baseline["results"], results, args.threshold, args.min_seconds)
+        for case, stage, base, seconds, ratio in slower:
+            print("REGRESSION %s %s: %.4f s -> %.4f s (%.2fx)" % (case, stage, base, seconds, ratio))
+        if slower:
+            return 1
+        print("No regressions against " + args.compare + ".")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
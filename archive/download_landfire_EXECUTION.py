@@ -15,130 +15,176 @@
 
 # import relevant packages
 import arcpy
-import requests
-import re
-import time
-import zipfile
+import math
+import queue
 import os
+import shutil
 import sys
+from concurrent.futures import ThreadPoolExecutor, wait
+import landfire_client
+import landfire_tiles
+import raster_io
+import ssd_engine
 
 
 # define parameters
 sz = sys.argv[1]
 save_path = sys.argv[2]
+email = sys.argv[3] # the LFPS API requires an email
+# optional: 'true' to download EVH first and request the DTM only out to an upper
+# bound of the SSD around the polygon instead of the worst case 9280 m
+adaptive = len(sys.argv) > 4 and sys.argv[4] == "true"
+
+# WGS 84 extent (xmin, ymin, xmax, ymax) of the polygon buffered by distance. The
+# buffer is only needed for its extent, so it's held in memory and deleted after.
+def buffered_extent(distance, name):
+    buf = "memory\\" + name
+    buf_wgs = buf + "_reproj"
+    try:
+        # buffer to largest possible SZ buffer
+        arcpy.analysis.Buffer(sz, buf, distance, "FULL", "ROUND", "ALL")
+        
+        # check if spatial ref is WGS 84, if not convert (epsg = 4326)
+        sr_bufsz = arcpy.Describe(buf).SpatialReference.factoryCode
+        ext_fc = buf
+        if sr_bufsz != 4326:
+            arcpy.management.Project(buf, buf_wgs, arcpy.SpatialReference(4326))
+            ext_fc = buf_wgs
+        
+        # get the extent of the buffered SZ
+        sz_ext = arcpy.Describe(ext_fc).extent
+    finally:
+        for item in (buf, buf_wgs):
+            if arcpy.Exists(item):
+                arcpy.management.Delete(item)
+    return sz_ext.XMin, sz_ext.YMin, sz_ext.XMax, sz_ext.YMax # lon W, lat S, lon E, lat N
 
 ############# get extent ##############
 try: 
-    # buffer to largest possible SZ buffer
-    arcpy.analysis.Buffer(sz, "sz_with_lrg_donut_fc.shp", "9280 Meters", "FULL", "ROUND", "ALL")
-    
-    # check if spatial ref is WGS 84, if not convert (epsg = 4326)
-    sr_bufsz = arcpy.Describe("sz_with_lrg_donut_fc.shp").SpatialReference.factoryCode
-    if sr_bufsz != 4326:
-        arcpy.management.Project("sz_with_lrg_donut_fc.shp", "sz_buf_reproj.shp", arcpy.SpatialReference(4326))
-        sz = "sz_buf_reproj.shp"
-    else:
-        sz = "sz_with_lrg_donut_fc.shp"
-    
-    
-    # get the extent of the buffered SZ
-    sz_ext = arcpy.Describe(sz).extent
-    sz_ext_xmin = sz_ext.XMin #lon, W
-    sz_ext_xmax = sz_ext.XMax #lon, E
-    sz_ext_ymin = sz_ext.YMin #lat, S
-    sz_ext_ymax = sz_ext.YMax #lat, N
-
+    sz_ext_xmin, sz_ext_ymin, sz_ext_xmax, sz_ext_ymax = buffered_extent("9280 Meters", "sz_with_lrg_donut_fc")
 except:
     arcpy.AddError("Could not retrieve extent. Check input polygon.")
     sys.exit()
     
 ###########################
 
-for rastype in ["EVH", "DTM"]:
-    arcpy.AddMessage("Downloading LANDFIRE " + rastype + "...")
-    
-    if rastype == "EVH":
-        ras_type = "200EVH"
-    if rastype =="DTM":
-        ras_type = "ELEV2020"
-    
-    try:
-        # submit landfire request
-        url = "https://lfps.usgs.gov/arcgis/rest/services/LandfireProductService/GPServer/LandfireProductService/submitJob?Layer_list=" + ras_type + "&Area_of_Interest=" + str(sz_ext_xmax) + "%20" +  str(sz_ext_ymin) + "%20" + str(sz_ext_xmin) + "%20" + str(sz_ext_ymax) 
-        response = requests.get(url)
-        open(save_path + "//landfire.txt", "wb").write(response.content)
-    except:
-        arcpy.AddError("Could not submit LANDFIRE request from URL: " + url)
-        sys.exit()
-    
-    # get the job ID and wait a certain amount of time
-    # then use below link with jobID to download the zip
-    
-    # open request HTML to find unique job ID
-    with open(save_path + "//landfire.txt", "r") as file:
-        for line in file.readlines():                                   # for every line in the job html
-            match = re.search(r"(?:<\/b>)([\s\S]*?)(?=<br/>)", line)    # search for HTML that bounds the jobID
-            #print(type(jobid))         
-            if match is not None:                                       # most of the lines will return None     
-                if "esri" in match.group():                             # lines with esri have other text we're not interested in
-                    pass                                                # pass on them
-                else:
-                    jobid = match.group()[5:]                           # the line we want has 5 chars before the jobID that we aren't interested in
-                    print(jobid)
-    
-    # check status of job
-    job_url = "https://lfps.usgs.gov/arcgis/rest/services/LandfireProductService/GPServer/LandfireProductService/jobs/" + jobid
-    status = 'esriJobSubmitted'
-    while status != 'esriJobSucceeded':
-        if status == 'esriJobFailed':
-            # end the script if your API request fails
+# layers (or tiles) are requested at the same time, each one on its own worker thread.
+# arcpy isn't thread safe so workers only queue their messages and this thread
+# prints them while it waits.
+messages = queue.Queue()
+client = landfire_client.LandfireClient(email, log = messages.put)
+store = landfire_tiles.get_store()
+
+def print_messages():
+    while not messages.empty():
+        arcpy.AddMessage(messages.get())
+
+def wait_for(futures):
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout = 1)
+        print_messages()
+    print_messages()
+
+# final name for each layer, existing files are not overwritten
+names = {}
+for rastype in landfire_client.LAYERS:
+    extract_dir = save_path + "//" + rastype
+    newName = rastype
+    i=1
+    while arcpy.Exists(os.path.join(extract_dir, newName + ".tif")):
+        newName = f"{rastype}_{i}"
+        i += 1
+    names[rastype] = (extract_dir, newName)
+# final rasters by type, ffs_tools.download_landfire returns these
+outputs = {rastype: os.path.join(extract_dir, newName + ".tif") for rastype, (extract_dir, newName) in names.items()}
+
+# download the layers in rastypes (e.g. ["EVH", "DTM"]) over a WGS 84 extent.
+# Jobs (a layer, or a piece of it) run on worker threads, at most MAX_JOBS at a time,
+# and a failed job is resubmitted on its own without holding up the others.
+def download(rastypes, xmin, ymin, xmax, ymax):
+    layers = {rastype: landfire_client.LAYERS[rastype] for rastype in rastypes}
+    aoi = landfire_client.LandfireClient.aoi(xmin, ymin, xmax, ymax)
+    retries = landfire_tiles.JOB_RETRIES
+    # tifs to mosaic into each layer, nothing to mosaic for a layer downloaded in one job
+    pieces = {}
+    with ThreadPoolExecutor(max_workers = landfire_tiles.MAX_JOBS) as pool:
+        jobs = {}
+        if store is None:
+            # no tile store, one job per layer unless the extent is too big for LFPS,
+            # then one job per piece of it. files are unzipped with the jobID, the final
+            # name is picked up front so the tif can be streamed straight to it.
+            parts = landfire_tiles.split_extent(xmin, ymin, xmax, ymax)
+            if len(parts) > 1:
+                arcpy.AddMessage("Area of interest is split into " + str(len(parts)) + " pieces.")
+            for rastype, ras_type in layers.items():
+                extract_dir, newName = names[rastype]
+                if len(parts) == 1:
+                    jobs[rastype] = pool.submit(client.fetch, ras_type, aoi, extract_dir, newName, retries)
+                    continue
+                part_dir = os.path.join(extract_dir, newName + "_parts")
+                shutil.rmtree(part_dir, ignore_errors = True)
+                pieces[rastype] = []
+                for i, part in enumerate(parts):
+                    stem = "part_" + str(i)
+                    jobs[(rastype, i)] = pool.submit(client.fetch, ras_type, client.aoi(*part), part_dir, stem, retries)
+                    pieces[rastype].append(os.path.join(part_dir, stem + ".tif"))
+            wait_for(jobs.values())
+        else:
+            # only the grid tiles that aren't stored yet are downloaded, then the tiles
+            # are mosaicked and clipped to the extent
+            tiles = store.tiles(xmin, ymin, xmax, ymax)
+            keep = [(ras_type, tile) for ras_type in layers.values() for tile in tiles]
+            for rastype, ras_type in layers.items():
+                missing = store.missing(ras_type, tiles)
+                arcpy.AddMessage(rastype + ": " + str(len(tiles) - len(missing)) + " of " + str(len(tiles)) +
+                                 " tiles already downloaded.")
+                for tile in missing:
+                    jobs[(rastype, tile)] = pool.submit(store.fetch, client, ras_type, tile, keep, retries)
+            wait_for(jobs.values())
+
+    for job in jobs.values():
+        try:
+            job.result()
+        except landfire_client.LandfireError as e:
+            arcpy.AddError(str(e))
             arcpy.AddError("LANDFIRE download failed. Try: \n (1) Make sure your polygon is covered by LANDFIRE data (US and insular areas) \n (2) Try a smaller polygon \n (3) Check landfire.gov for scheduled maintenance.")
             sys.exit()
-        arcpy.AddMessage("File processing...")
-        time.sleep(10)
-        # open the job status URL
-        response = requests.get(job_url)
-        open(save_path + "//landfire_processing.txt", "wb").write(response.content)
-        # parse for the specific line
-        with open(save_path + "//landfire_processing.txt", "r") as file:
-            lines = file.readlines()
-            job_status = lines[41]
-            match = re.search(r"(?<=</b>)(.*?)(?=<br/>)", job_status) # find the job status
-            status = match.group().strip()                            # set job status to eventually exit the loop
-            arcpy.AddMessage(status)
-    # when esriJobSubmitted go to zip URL
-    # open the zip URL, write it to file:            
-    zip_url = "https://lfps.usgs.gov/arcgis/rest/directories/arcgisjobs/landfireproductservice_gpserver/" + jobid + "/scratch/" + jobid + ".zip"    # URL seems to be the same for each zip request
-    response = requests.get(zip_url)
-    open(save_path + "//landfire_" + rastype + ".zip", "wb").write(response.content) # save zipped folder in predefined folder
-    
-    # now unzip the zipped file 
-    with zipfile.ZipFile(save_path + "//landfire_" + rastype + ".zip", 'r') as zip_ref:
-        zip_ref.extractall(save_path + "//landfire_" + rastype)
-    
-    # rename file 
-    counter = 0 
-    tf = True
-    while tf == True:
+
+    if store is not None:
+        for rastype, ras_type in layers.items():
+            pieces[rastype] = [store.lookup(ras_type, tile) for tile in tiles]
+
+    # pieces/tiles are mosaicked block by block and clipped to the extent
+    aoi_extent = arcpy.Extent(xmin, ymin, xmax, ymax, spatial_reference = arcpy.SpatialReference(4326))
+    for rastype, tifs in pieces.items():
+        extract_dir, newName = names[rastype]
+        os.makedirs(extract_dir, exist_ok = True)
         try:
-            arcpy.management.Rename(save_path + "//landfire_" + rastype + "//" + jobid + ".tif", save_path + "//landfire_" + rastype + "//" + rastype + ".tif")
-            tf = False # stope here because the save worked
-        except: # otherwise try naming with the counter
-            try:
-                arcpy.management.Rename(save_path + "//landfire_" + rastype + "//" + jobid + ".tif", save_path + "//landfire_" + rastype + "//" + rastype + str(counter) + ".tif")
-                tf = False # stop here if that worked
-            except:
-                counter = counter + 1
-                # now tf is still true so it should go back through with counter increased by one and try again... 
-                
-    
-        
-# clean up files
-try:
-    os.remove(save_path + "//landfire_EVH.zip")
-    os.remove(save_path + "//landfire_DTM.zip")
-    os.remove(save_path + "//landfire.txt")
-    os.remove(save_path + "//landfire_processing.txt")
-    
-except: 
-        arcpy.AddWarning("Temporary files could not be deleted.")
+            raster_io.mosaic_blocks(tifs, os.path.join(extract_dir, newName + ".tif"), aoi_extent)
+        except:
+            arcpy.AddError("Could not mosaic the LANDFIRE " + rastype + " tiles.")
+            sys.exit()
+        if store is None:
+            shutil.rmtree(os.path.join(extract_dir, newName + "_parts"), ignore_errors = True)
+    for rastype in rastypes:
+        arcpy.AddMessage("Saved LANDFIRE " + rastype + " to " + outputs[rastype])
+
+arcpy.AddMessage("Downloading LANDFIRE EVH and DTM...")
+if not adaptive:
+    download(["EVH", "DTM"], sz_ext_xmin, sz_ext_ymin, sz_ext_xmax, sz_ext_ymax)
+else:
+    # EVH over the worst case extent gives the radius, the DTM is only needed out to it.
+    # the radius uses the largest factor of every scenario so the data works for any
+    # wind speed/burning condition later on.
+    download(["EVH"], sz_ext_xmin, sz_ext_ymin, sz_ext_xmax, sz_ext_ymax)
+    extract_dir, newName = names["EVH"]
+    max_factor = max(max(mfl) for mfl in ssd_engine.MFL_TABLE.values())
+    radius = raster_io.zone_radius(sz, os.path.join(extract_dir, newName + ".tif"), max_factor)
+    arcpy.AddMessage("Processing radius around the polygon: " + str(int(math.ceil(radius))) + " m.")
+    try:
+        dtm_ext = buffered_extent(str(int(math.ceil(radius))) + " Meters", "sz_with_sml_donut_fc")
+    except:
+        arcpy.AddError("Could not retrieve extent. Check input polygon.")
+        sys.exit()
+    download(["DTM"], *dtm_ext)
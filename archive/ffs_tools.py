@@ -0,0 +1,204 @@
+## The University of Utah and the operator of this website (along with their employees or agents) are not responsible
+## for any decisions or results of the decisions that you make. You assume all risk arising from reliance on this
+## website and, by using this website you agree to hold the University of Utah and the operation of the website harmless
+## for damages arising out of your actions, whether or not in reliance on information provided through the website.
+
+## The information provided through the website application is given “as is”. To the maximum extent permitted by applicable
+## law, the University of Utah and the operator of the website disclaim all representations and warranties, expressed or
+## implied, with respect to such information, services, products, and materials, including without limitation any implied
+## warranties or merchantability, fitness for a particular purpose and noninfringement. In no event will the University of
+## Utah or website operator be liable for any consequential, indirect, incidental, special, or punitive damages, however
+## caused and under any theory of liability (including negligence), arising from your use of the website or the provision
+## of the information, services, products, and materials provided to or by the University of Utah or the website operator,
+## even if the University of Utah or website operator has been advised of the possibility of such damages.
+
+
+
+## headless API for the toolbox: compute_ssd, evaluate_safety_zone and download_landfire
+## run the same EXECUTION scripts the ArcGIS Pro tools do, from Python or the command line.
+##
+##   import ffs_tools
+##   ffs_tools.compute_ssd("EVH.tif", "DTM.tif", "Moderate", "Extreme", "C:/work", "C:/work/SSD.tif", engine = "NUMPY")
+##
+##   python ffs_tools.py ssd EVH.tif DTM.tif --wind Moderate --burning Extreme --workspace C:/work --out C:/work/SSD.tif
+##   python ffs_tools.py ssde sz.shp EVH.tif DTM.tif --wind High --burning Low --workspace C:/work
+##   python ffs_tools.py download sz.shp C:/data you@example.com
+##
+## Nothing heavy is imported until a tool runs: arcpy (and the Spatial Analyst
+## checkout) load with the first run and stay loaded, so a script doing many runs
+## in one process pays the arcpy start-up once.
+##
+## The scripts read their parameters from sys.argv, so runs are serialized: calls from
+## several threads wait for each other. Use processes to run tools side by side.
+
+## import relevant packages
+import os
+import runpy
+import sys
+import threading
+from typing import Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# held while a script runs with its parameters in sys.argv
+_run_lock = threading.Lock()
+
+
+class ToolError(Exception):
+    pass
+
+
+# full tool values for a wind speed and burning condition, short names ("Light") work too
+def _scenario(wind_speed, burning_condition):
+    import ssd_engine
+    return ssd_engine.find_scenario(wind_speed, burning_condition)
+
+
+def _optional(value):
+    if value is None:
+        return "#"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+# run one of the EXECUTION scripts in this process with argv as its tool parameters,
+# returns the script's globals. One script runs at a time, see _run_lock.
+def _run_script(script, argv):
+    with _run_lock:
+        saved = sys.argv
+        sys.argv = [os.path.join(HERE, script)] + [str(a) for a in argv]
+        if HERE not in sys.path:
+            sys.path.insert(0, HERE)
+        try:
+            return runpy.run_path(sys.argv[0], run_name = "__main__")
+        except SystemExit as e:
+            # the scripts sys.exit() after reporting an error with arcpy.AddError
+            if e.code not in (None, 0):
+                raise ToolError(script + " failed: " + _messages())
+            raise ToolError(script + " stopped: " + _messages())
+        finally:
+            sys.argv = saved
+
+
+def _messages():
+    try:
+        import arcpy
+        return arcpy.GetMessages(2) or arcpy.GetMessages()
+    except ImportError:
+        return ""
+
+
+##############################
+##   SSD                    ##
+##############################
+# SSD raster for the whole extent of vh/dtm, written to out_ssd. Returns out_ssd.
+def compute_ssd(vh: str, dtm: str, wind_speed: str, burning_condition: str, workspace: str, out_ssd: str,
+                engine: str = "ARCPY", tile_size: Optional[int] = None, workers: Optional[int] = None,
+                reprojection: str = "COPY") -> str:
+    wc, bc = _scenario(wind_speed, burning_condition)
+    _run_script("ssd_EXECUTION.py", [
+        "true", vh, dtm, wc, bc, workspace, out_ssd,
+        engine.upper(), _optional(tile_size), _optional(workers), reprojection.upper()])
+    return out_ssd
+
+
+##############################
+##   SSDE                   ##
+##############################
+# evaluate the safety zone polygon(s) in safety_zone. Outputs default to pSSD.tif,
+# SSD_met.tif and safest_point.shp in workspace. Returns the output paths by name.
+def evaluate_safety_zone(safety_zone: str, vh: str, dtm: str, wind_speed: str, burning_condition: str,
+                         workspace: str, out_pssd: Optional[str] = None, out_ssd_met: Optional[str] = None,
+                         out_safest_point: Optional[str] = None, pssd_method: str = "ARCPY",
+                         adaptive: bool = False, seg_method: str = "MEANSHIFT", workers: Optional[int] = None,
+                         out_segment: Optional[str] = None) -> dict:
+    outputs = {
+        "pssd": out_pssd or os.path.join(workspace, "pSSD.tif"),
+        "ssd_met": out_ssd_met or os.path.join(workspace, "SSD_met.tif"),
+        "safest_point": out_safest_point or os.path.join(workspace, "safest_point.shp"),
+    }
+    if out_segment is not None:
+        outputs["segment"] = out_segment
+    wc, bc = _scenario(wind_speed, burning_condition)
+    _run_script("ssde_EXECUTION.py", [
+        "true", safety_zone, vh, dtm, wc, bc, workspace,
+        outputs["pssd"], outputs["ssd_met"], outputs["safest_point"], pssd_method.upper(),
+        _optional(adaptive), seg_method.upper(), _optional(workers), _optional(out_segment)])
+    return outputs
+
+
+##############################
+##   LANDFIRE download      ##
+##############################
+# download LANDFIRE EVH and DTM around polygon into out_dir/EVH and out_dir/DTM.
+# Returns the downloaded .tif paths by type (EVH_1.tif etc. when earlier downloads are there).
+def download_landfire(polygon: str, out_dir: str, email: str, adaptive: bool = False) -> dict:
+    result = _run_script("download_landfire_EXECUTION.py", [polygon, out_dir, email, _optional(adaptive)])
+    return dict(result["outputs"])
+
+
+##############################
+##   command line           ##
+##############################
+def main(argv=None):
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description = "Firefighter safety tools without ArcGIS Pro's tool dialogs.")
+    commands = parser.add_subparsers(dest = "command", required = True)
+
+    ssd = commands.add_parser("ssd", help = "safe separation distance raster")
+    ssd.add_argument("vh")
+    ssd.add_argument("dtm")
+    ssd.add_argument("--wind", required = True, help = "Light, Moderate or High")
+    ssd.add_argument("--burning", required = True, help = "Low, Moderate or Extreme")
+    ssd.add_argument("--workspace", required = True)
+    ssd.add_argument("--out", required = True)
+    ssd.add_argument("--engine", default = "ARCPY", help = "ARCPY, NUMPY, TILED or SCENARIOS")
+    ssd.add_argument("--tile-size", type = int)
+    ssd.add_argument("--workers", type = int)
+    ssd.add_argument("--reprojection", default = "COPY", help = "COPY or WINDOW")
+
+    ssde = commands.add_parser("ssde", help = "safe separation distance evaluator for a safety zone")
+    ssde.add_argument("safety_zone")
+    ssde.add_argument("vh")
+    ssde.add_argument("dtm")
+    ssde.add_argument("--wind", required = True, help = "Light, Moderate or High")
+    ssde.add_argument("--burning", required = True, help = "Low, Moderate or Extreme")
+    ssde.add_argument("--workspace", required = True)
+    ssde.add_argument("--out-pssd")
+    ssde.add_argument("--out-ssd-met")
+    ssde.add_argument("--out-safest-point")
+    ssde.add_argument("--out-segment")
+    ssde.add_argument("--pssd-method", default = "ARCPY", help = "ARCPY, KDTREE, PRUNED, PYRAMID or PARALLEL")
+    ssde.add_argument("--seg-method", default = "MEANSHIFT", help = "MEANSHIFT, NUMPY or COMPARE")
+    ssde.add_argument("--adaptive", action = "store_true")
+    ssde.add_argument("--workers", type = int)
+
+    download = commands.add_parser("download", help = "download LANDFIRE EVH and DTM around a polygon")
+    download.add_argument("polygon")
+    download.add_argument("out_dir")
+    download.add_argument("email")
+    download.add_argument("--adaptive", action = "store_true")
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "ssd":
+            result = compute_ssd(args.vh, args.dtm, args.wind, args.burning, args.workspace, args.out,
+                                 args.engine, args.tile_size, args.workers, args.reprojection)
+        elif args.command == "ssde":
+            result = evaluate_safety_zone(args.safety_zone, args.vh, args.dtm, args.wind, args.burning,
+                                          args.workspace, args.out_pssd, args.out_ssd_met, args.out_safest_point,
+                                          args.pssd_method, args.adaptive, args.seg_method, args.workers,
+                                          args.out_segment)
+        else:
+            result = download_landfire(args.polygon, args.out_dir, args.email, args.adaptive)
+    except (ToolError, ValueError) as e:
+        print(str(e), file = sys.stderr)
+        return 1
+    print(json.dumps(result, indent = 2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
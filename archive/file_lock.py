@@ -0,0 +1,63 @@
+## The University of Utah and the operator of this website (along with their employees or agents) are not responsible
+## for any decisions or results of the decisions that you make. You assume all risk arising from reliance on this
+## website and, by using this website you agree to hold the University of Utah and the operation of the website harmless
+## for damages arising out of your actions, whether or not in reliance on information provided through the website.
+
+## The information provided through the website application is given “as is”. To the maximum extent permitted by applicable
+## law, the University of Utah and the operator of the website disclaim all representations and warranties, expressed or
+## implied, with respect to such information, services, products, and materials, including without limitation any implied
+## warranties or merchantability, fitness for a particular purpose and noninfringement. In no event will the University of
+## Utah or website operator be liable for any consequential, indirect, incidental, special, or punitive damages, however
+## caused and under any theory of liability (including negligence), arising from your use of the website or the provision
+## of the information, services, products, and materials provided to or by the University of Utah or the website operator,
+## even if the University of Utah or website operator has been advised of the possibility of such damages.
+
+
+## lock file shared between processes, for the index.json of the raster cache and
+## the LANDFIRE tile store (several tool runs can use the same folder at once).
+##
+##   with file_lock.FileLock(index_path + ".lock"):
+##       ... read, change and write the index ...
+##
+## The lock is a file created with O_EXCL, so it works on local and network folders
+## on Windows and Linux alike. A lock file older than stale seconds is left over from
+## a process that died while holding it and is taken over.
+
+## import relevant packages
+import os
+import time
+
+
+class FileLock:
+    def __init__(self, path, timeout=60.0, stale=300.0):
+        self.path = path
+        self.timeout = timeout
+        self.stale = stale
+
+    def __enter__(self):
+        start = time.monotonic()
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > self.stale:
+                        os.remove(self.path)
+                        continue
+                except OSError:
+                    # released (or taken over) in the meantime
+                    continue
+                if time.monotonic() - start > self.timeout:
+                    raise TimeoutError("Could not lock " + self.path + " within " + str(int(self.timeout)) + " seconds.")
+                time.sleep(0.05)
+                continue
+            os.write(fd, str(os.getpid()).encode("ascii"))
+            os.close(fd)
+            return self
+
+    def __exit__(self, *exc):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        return False
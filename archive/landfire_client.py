@@ -0,0 +1,311 @@
+## The University of Utah and the operator of this website (along with their employees or agents) are not responsible
+## for any decisions or results of the decisions that you make. You assume all risk arising from reliance on this
+## website and, by using this website you agree to hold the University of Utah and the operation of the website harmless
+## for damages arising out of your actions, whether or not in reliance on information provided through the website.
+
+## The information provided through the website application is given “as is”. To the maximum extent permitted by applicable
+## law, the University of Utah and the operator of the website disclaim all representations and warranties, expressed or
+## implied, with respect to such information, services, products, and materials, including without limitation any implied
+## warranties or merchantability, fitness for a particular purpose and noninfringement. In no event will the University of
+## Utah or website operator be liable for any consequential, indirect, incidental, special, or punitive damages, however
+## caused and under any theory of liability (including negligence), arising from your use of the website or the provision
+## of the information, services, products, and materials provided to or by the University of Utah or the website operator,
+## even if the University of Utah or website operator has been advised of the possibility of such damages.
+
+
+## client for the LANDFIRE Product Service (LFPS) job API used by download_landfire_EXECUTION.py
+## submit a job, poll its JSON status with exponential backoff, download the output zip.
+## No arcpy in here so several jobs can run on worker threads at once.
+##
+## LFPS_URL  base URL of the API (default https://lfps.usgs.gov/api), point it at
+##           lfps_standin_server.py to try the downloader without the real service
+
+## import relevant packages
+import os
+import struct
+import time
+import zlib
+from urllib.parse import quote, urlencode
+import requests
+from requests.adapters import HTTPAdapter
+
+LFPS_URL = "https://lfps.usgs.gov/api"
+
+# LANDFIRE layer IDs for each raster the tools use
+LAYERS = {"EVH": "200EVH", "DTM": "ELEV2020"}
+
+
+# bytes read from the download stream at a time. A dropped connection loses at most
+# the chunk being read, the download resumes from the end of the last whole chunk.
+CHUNK_SIZE = 64 * 1024
+
+
+class LandfireError(Exception):
+    pass
+
+
+##############################################
+##   unzip while the download streams in    ##
+##############################################
+# Reads a zip archive front to back from the local file headers, so every member
+# can be written to its final path as the bytes arrive instead of saving the zip
+# and extracting it afterwards. Each member's CRC-32 is checked as it's written.
+# rename(name) gives the file name to use for a member (None skips the member).
+class ZipStreamExtractor:
+    LOCAL_HEADER = 0x04034b50
+    DESCRIPTOR = 0x08074b50
+
+    def __init__(self, extract_dir, rename=None):
+        self.extract_dir = extract_dir
+        self.rename = rename or (lambda name: os.path.basename(name))
+        self.reset()
+
+    # forget everything written so far (the download is starting over)
+    def reset(self):
+        if getattr(self, "out", None) is not None:
+            self.out.close()
+            os.remove(self.out.name)
+        self.buf = bytearray()
+        self.state = "header"
+        self.out = None
+        self.done = False
+        self.extracted = []
+
+    def feed(self, data):
+        self.buf += data
+        while not self.done:
+            if self.state == "header" and not self._read_header():
+                return
+            if self.state == "data" and not self._read_data():
+                return
+            if self.state == "descriptor" and not self._read_descriptor():
+                return
+
+    def _read_header(self):
+        if len(self.buf) < 4:
+            return False
+        if struct.unpack("<I", self.buf[:4])[0] != self.LOCAL_HEADER:
+            # central directory, nothing left to extract
+            self.done = True
+            return False
+        if len(self.buf) < 30:
+            return False
+        (_, _, flags, method, _, _, crc, csize, usize,
+         name_len, extra_len) = struct.unpack("<IHHHHHIIIHH", self.buf[:30])
+        if len(self.buf) < 30 + name_len + extra_len:
+            return False
+        name = bytes(self.buf[30:30 + name_len]).decode("utf-8", "replace")
+        extra = bytes(self.buf[30 + name_len:30 + name_len + extra_len])
+        del self.buf[:30 + name_len + extra_len]
+        zip64 = False
+        # zip64 sizes live in extra field 0x0001
+        pos = 0
+        while pos + 4 <= len(extra):
+            tag, size = struct.unpack("<HH", extra[pos:pos + 4])
+            if tag == 0x0001 and size >= 16:
+                usize, csize = struct.unpack("<QQ", extra[pos + 4:pos + 20])
+                zip64 = True
+            pos += 4 + size
+        if method not in (0, 8):
+            raise LandfireError("Unsupported compression in LANDFIRE zip: " + str(method))
+        if method == 0 and flags & 0x08:
+            raise LandfireError("Can't stream stored zip member without sizes: " + name)
+        self.member = {"name": name, "method": method, "crc": crc, "csize": csize,
+                       "descriptor": bool(flags & 0x08), "zip64": zip64}
+        self.remaining = csize
+        self.crc = 0
+        self.inflate = zlib.decompressobj(-15) if method == 8 else None
+        target = None if name.endswith("/") else self.rename(name)
+        if target is not None:
+            path = os.path.join(self.extract_dir, target)
+            self.out = open(path + ".part", "wb")
+            self.target = path
+        self.state = "data"
+        return True
+
+    def _write(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        if self.out is not None:
+            self.out.write(data)
+
+    def _read_data(self):
+        if self.inflate is not None:
+            data = bytes(self.buf)
+            self.buf = bytearray()
+            try:
+                data = self.inflate.decompress(data)
+            except zlib.error as e:
+                name = self.member["name"]
+                self.reset()
+                raise LandfireError("Corrupt LANDFIRE download: " + name + " (" + str(e) + ")")
+            self._write(data)
+            if not self.inflate.eof:
+                return False
+            self.buf = bytearray(self.inflate.unused_data)
+        else:
+            n = min(self.remaining, len(self.buf))
+            self._write(bytes(self.buf[:n]))
+            del self.buf[:n]
+            self.remaining -= n
+            if self.remaining:
+                return False
+        self.state = "descriptor" if self.member["descriptor"] else "header"
+        if self.state == "header":
+            self._finish_member()
+        return True
+
+    def _read_descriptor(self):
+        if len(self.buf) < 4:
+            return False
+        signed = struct.unpack("<I", self.buf[:4])[0] == self.DESCRIPTOR
+        size = (4 if signed else 0) + (20 if self.member["zip64"] else 12)
+        if len(self.buf) < size:
+            return False
+        self.member["crc"] = struct.unpack("<I", self.buf[4 if signed else 0:(4 if signed else 0) + 4])[0]
+        del self.buf[:size]
+        self.state = "header"
+        self._finish_member()
+        return True
+
+    def _finish_member(self):
+        if self.crc != self.member["crc"]:
+            # drop the .part file of the bad member
+            name = self.member["name"]
+            self.reset()
+            raise LandfireError("Checksum mismatch in LANDFIRE download: " + name)
+        if self.out is not None:
+            self.out.close()
+            os.replace(self.out.name, self.target)
+            self.extracted.append(self.target)
+            self.out = None
+
+
+class LandfireClient:
+    # email is required by the LFPS API. log is called with progress messages
+    # (it may be called from worker threads).
+    def __init__(self, email, base_url=None, log=None, poll_initial=2.0, poll_max=30.0,
+                 poll_factor=1.5, timeout=1800.0):
+        self.email = email
+        self.base_url = (base_url or os.environ.get("LFPS_URL", LFPS_URL)).rstrip("/")
+        self.log = log or (lambda message: None)
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self.poll_factor = poll_factor
+        self.timeout = timeout
+        # one pooled session for every request, connections get reused between polls
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections = 4, pool_maxsize = 16)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    # area of interest in the "xmax ymin xmin ymax" order the tools have always sent
+    @staticmethod
+    def aoi(xmin, ymin, xmax, ymax):
+        return str(xmax) + " " + str(ymin) + " " + str(xmin) + " " + str(ymax)
+
+    # submit a job and return its job ID
+    def submit(self, layer, aoi):
+        # every value is percent encoded (spaces as %20, like the service's examples)
+        url = self.base_url + "/job/submit?" + urlencode(
+            {"Layer_List": layer, "Area_of_Interest": aoi, "Email": self.email}, quote_via = quote)
+        try:
+            response = self.session.get(url, timeout = 60)
+            response.raise_for_status()
+            job_id = response.json()["jobId"]
+        except (requests.RequestException, ValueError, KeyError) as e:
+            raise LandfireError("Could not submit LANDFIRE " + layer + " request (" + str(e) + ")")
+        self.log("Submitted LANDFIRE " + layer + " job with id: " + job_id)
+        return job_id
+
+    def status(self, job_id):
+        response = self.session.get(self.base_url + "/job/status", params = {"JobId": job_id}, timeout = 60)
+        response.raise_for_status()
+        return response.json()
+
+    # poll until the job has an output file and return its URL. The wait between
+    # polls starts short and grows, so quick jobs finish fast and long ones
+    # don't hammer the service.
+    def wait(self, job_id):
+        delay = self.poll_initial
+        start = time.monotonic()
+        last = None
+        while True:
+            try:
+                status_json = self.status(job_id)
+            except (requests.RequestException, ValueError) as e:
+                # a dropped poll isn't a failed job, try again after the backoff
+                status_json = {"status": "Unreachable (" + str(e) + ")"}
+            status = status_json.get("status")
+            if status != last:
+                self.log("LANDFIRE job " + job_id + ": " + str(status))
+                last = status
+            if status == "Succeeded" and status_json.get("outputFile"):
+                return status_json["outputFile"]
+            if status in ("Failed", "Canceled", "Cancelled"):
+                raise LandfireError("LANDFIRE job " + job_id + " " + status + ". " + str(status_json.get("messages", "")))
+            if time.monotonic() - start > self.timeout:
+                raise LandfireError("LANDFIRE job " + job_id + " did not finish within " + str(int(self.timeout)) + " seconds.")
+            time.sleep(delay)
+            delay = min(self.poll_max, delay * self.poll_factor)
+
+    # stream the zip at url and unzip it into extract_dir on the fly (see
+    # ZipStreamExtractor). If the connection drops (or the server answers with a 5xx)
+    # the download picks up where it stopped with an HTTP Range request, up to
+    # retries times. Any other failure is a LandfireError.
+    def download_extract(self, url, extract_dir, rename=None, retries=5):
+        extractor = ZipStreamExtractor(extract_dir, rename)
+        offset = 0
+        attempt = 0
+        while True:
+            headers = {"Range": "bytes=" + str(offset) + "-"} if offset else {}
+            try:
+                with self.session.get(url, headers = headers, stream = True, timeout = 60) as response:
+                    response.raise_for_status()
+                    if offset and response.status_code != 206:
+                        # the server ignored the range, start over
+                        extractor.reset()
+                        offset = 0
+                    for chunk in response.iter_content(chunk_size = CHUNK_SIZE):
+                        extractor.feed(chunk)
+                        offset += len(chunk)
+                        if extractor.done:
+                            break
+                if extractor.done:
+                    return extractor.extracted
+                raise requests.ConnectionError("download ended early")
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                server_error = isinstance(e, requests.HTTPError) and e.response is not None and e.response.status_code >= 500
+                attempt += 1
+                if (isinstance(e, requests.HTTPError) and not server_error) or attempt > retries:
+                    raise LandfireError("Could not download " + url + " (" + str(e) + ")")
+                self.log("Download interrupted after " + str(offset) + " bytes, resuming...")
+                time.sleep(min(self.poll_max, self.poll_initial * 2 ** attempt))
+            except requests.RequestException as e:
+                raise LandfireError("Could not download " + url + " (" + str(e) + ")")
+
+    # submit, wait and download one layer into extract_dir. Files in the zip named
+    # after the job ID are renamed to stem (e.g. <jobId>.tif -> EVH.tif).
+    # A failed job is submitted again, up to retries times.
+    def fetch(self, layer, aoi, extract_dir, stem, retries=0):
+        attempt = 0
+        while True:
+            try:
+                job_id = self.submit(layer, aoi)
+                url = self.wait(job_id)
+                break
+            except LandfireError as e:
+                attempt += 1
+                if attempt > retries:
+                    raise
+                self.log(str(e) + " Resubmitting (" + str(attempt) + " of " + str(retries) + ")...")
+                time.sleep(min(self.poll_max, self.poll_initial * 2 ** attempt))
+        def rename(name):
+            name = os.path.basename(name)
+            if name.startswith(job_id):
+                name = stem + name[len(job_id):]
+            return name
+        os.makedirs(extract_dir, exist_ok = True)
+        files = self.download_extract(url, extract_dir, rename)
+        self.log("Downloaded LANDFIRE " + layer + ".")
+        return files
@@ -0,0 +1,189 @@
+## The University of Utah and the operator of this website (along with their employees or agents) are not responsible
+## for any decisions or results of the decisions that you make. You assume all risk arising from reliance on this
+## website and, by using this website you agree to hold the University of Utah and the operation of the website harmless
+## for damages arising out of your actions, whether or not in reliance on information provided through the website.
+
+## The information provided through the website application is given “as is”. To the maximum extent permitted by applicable
+## law, the University of Utah and the operator of the website disclaim all representations and warranties, expressed or
+## implied, with respect to such information, services, products, and materials, including without limitation any implied
+## warranties or merchantability, fitness for a particular purpose and noninfringement. In no event will the University of
+## Utah or website operator be liable for any consequential, indirect, incidental, special, or punitive damages, however
+## caused and under any theory of liability (including negligence), arising from your use of the website or the provision
+## of the information, services, products, and materials provided to or by the University of Utah or the website operator,
+## even if the University of Utah or website operator has been advised of the possibility of such damages.
+
+
+## local store of downloaded LANDFIRE data on a fixed geographic grid, so
+## overlapping areas of interest (e.g. neighbouring safety zones on the same fire)
+## reuse what was already downloaded and only request the tiles that are missing.
+##
+## Tiles are TILE_DEG x TILE_DEG degree cells of a grid anchored at 0,0 (WGS 84).
+## Each tile is downloaded as its own LFPS job and kept under
+## <store>/<layer ID>/<tile>/ so different products (200EVH, ELEV2020, ...) never
+## mix. index.json records which tiles of which products are present, their size
+## and when they were last used; least recently used tiles are deleted when the
+## store goes over its size cap. index.json is only changed under a lock file so tool
+## runs sharing the store don't lose each other's tiles. No arcpy in here, tiles are
+## fetched on worker threads.
+##
+## Whole tiles are downloaded, so a first run pulls more than the area of interest;
+## the store is off unless LANDFIRE_TILE_CACHE_MB is set.
+## LANDFIRE_TILE_CACHE     store folder (default: <user home>/.ffs_tools_landfire)
+## LANDFIRE_TILE_CACHE_MB  size cap in MB (default 0, the store is off; e.g. 4096)
+##
+## Without the store, areas of interest bigger than LFPS takes in one job are split
+## into pieces (split_extent) that are downloaded separately and mosaicked.
+## LANDFIRE_MAX_AOI_DEG    largest side of one job's area of interest in degrees (default 1.0)
+## LANDFIRE_MAX_JOBS       jobs in flight at once (default 4)
+## LANDFIRE_JOB_RETRIES    times a failed job is resubmitted on its own (default 2)
+
+## import relevant packages
+import json
+import math
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+import file_lock
+
+TILE_DEG = 0.25
+DEFAULT_BUDGET_MB = 0
+# largest side (degrees) of an area of interest sent as one job when there's no store
+MAX_AOI_DEG = float(os.environ.get("LANDFIRE_MAX_AOI_DEG", 1.0))
+# LFPS jobs in flight at once, and how many times a failed job is resubmitted
+MAX_JOBS = int(os.environ.get("LANDFIRE_MAX_JOBS", 4))
+JOB_RETRIES = int(os.environ.get("LANDFIRE_JOB_RETRIES", 2))
+
+
+# (row, col) of every grid tile touching the extent, rows are latitude, cols longitude
+def tiles_for_extent(xmin, ymin, xmax, ymax, tile_deg=TILE_DEG):
+    rows = range(int(math.floor(ymin / tile_deg)), int(math.floor(ymax / tile_deg)) + 1)
+    cols = range(int(math.floor(xmin / tile_deg)), int(math.floor(xmax / tile_deg)) + 1)
+    return [(row, col) for row in rows for col in cols]
+
+
+# an extent cut into an even grid of pieces no more than max_deg on a side, so each
+# piece is small enough for one LFPS job. Pieces are (xmin, ymin, xmax, ymax).
+def split_extent(xmin, ymin, xmax, ymax, max_deg=MAX_AOI_DEG):
+    nx = max(1, int(math.ceil((xmax - xmin) / max_deg - 1e-9)))
+    ny = max(1, int(math.ceil((ymax - ymin) / max_deg - 1e-9)))
+    dx = (xmax - xmin) / nx
+    dy = (ymax - ymin) / ny
+    return [(xmin + i * dx, ymin + j * dy, xmin + (i + 1) * dx, ymin + (j + 1) * dy)
+            for j in range(ny) for i in range(nx)]
+
+
+# geographic extent (xmin, ymin, xmax, ymax) of a tile
+def tile_extent(tile, tile_deg=TILE_DEG):
+    row, col = tile
+    return (col * tile_deg, row * tile_deg, (col + 1) * tile_deg, (row + 1) * tile_deg)
+
+
+# folder/file stem of a tile, e.g. (161, -441) -> "r161_c-441"
+def tile_name(tile):
+    return "r" + str(tile[0]) + "_c" + str(tile[1])
+
+
+class LandfireTileStore:
+    def __init__(self, store_dir, budget_mb, tile_deg=TILE_DEG):
+        self.store_dir = store_dir
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.tile_deg = tile_deg
+        self.index_path = os.path.join(store_dir, "index.json")
+        # tiles are committed from worker threads
+        self.lock = threading.Lock()
+        os.makedirs(store_dir, exist_ok = True)
+        self.index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        if index.get("tile_deg") != self.tile_deg:
+            # a different grid, none of the recorded tiles line up with it
+            index = {"tile_deg": self.tile_deg, "tiles": {}}
+        return index
+
+    def _save_index(self):
+        tmp = self.index_path + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_path)
+
+    # the index as it is on disk, locked against other threads and processes, saved when done
+    @contextmanager
+    def locked(self):
+        with self.lock, file_lock.FileLock(self.index_path + ".lock"):
+            self.index = self._load_index()
+            yield self.index
+            self._save_index()
+
+    def tiles(self, xmin, ymin, xmax, ymax):
+        return tiles_for_extent(xmin, ymin, xmax, ymax, self.tile_deg)
+
+    def tile_extent(self, tile):
+        return tile_extent(tile, self.tile_deg)
+
+    def tile_dir(self, layer, tile):
+        return os.path.join(self.store_dir, layer, tile_name(tile))
+
+    # the tif of a stored tile, or None if the tile isn't in the store
+    def lookup(self, layer, tile):
+        with self.locked() as index:
+            entry = index["tiles"].get(layer, {}).get(tile_name(tile))
+            path = os.path.join(self.tile_dir(layer, tile), tile_name(tile) + ".tif")
+            if entry is None or not os.path.exists(path):
+                return None
+            entry["last_used"] = time.time()
+            return path
+
+    # tiles of an extent that still have to be downloaded
+    def missing(self, layer, tiles):
+        return [tile for tile in tiles if self.lookup(layer, tile) is None]
+
+    # record a tile downloaded into tile_dir(layer, tile). keep is a list of
+    # (layer, tile) that must not be evicted (the ones the current run needs).
+    def commit(self, layer, tile, keep=()):
+        folder = self.tile_dir(layer, tile)
+        with self.locked() as index:
+            index["tiles"].setdefault(layer, {})[tile_name(tile)] = {
+                "size": sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder)),
+                "last_used": time.time()}
+            self.evict(keep = [(l, tile_name(t)) for l, t in keep] + [(layer, tile_name(tile))])
+
+    # delete least recently used tiles until the store fits in its size cap
+    # (called with the index locked)
+    def evict(self, keep=()):
+        entries = [(layer, name, entry) for layer, tiles in self.index["tiles"].items()
+                   for name, entry in tiles.items()]
+        total = sum(entry["size"] for _, _, entry in entries)
+        for layer, name, entry in sorted(entries, key = lambda e: e[2]["last_used"]):
+            if total <= self.budget:
+                break
+            if (layer, name) in keep:
+                continue
+            shutil.rmtree(os.path.join(self.store_dir, layer, name), ignore_errors = True)
+            del self.index["tiles"][layer][name]
+            total -= entry["size"]
+
+    # download one tile with a LandfireClient and add it to the store
+    def fetch(self, client, layer, tile, keep=(), retries=0):
+        folder = self.tile_dir(layer, tile)
+        # anything left over from an interrupted download
+        shutil.rmtree(folder, ignore_errors = True)
+        xmin, ymin, xmax, ymax = self.tile_extent(tile)
+        client.fetch(layer, client.aoi(xmin, ymin, xmax, ymax), folder, tile_name(tile), retries)
+        self.commit(layer, tile, keep)
+        return os.path.join(folder, tile_name(tile) + ".tif")
+
+
+# the store configured by LANDFIRE_TILE_CACHE / LANDFIRE_TILE_CACHE_MB, or None if it's turned off
+def get_store():
+    budget_mb = float(os.environ.get("LANDFIRE_TILE_CACHE_MB", DEFAULT_BUDGET_MB))
+    if budget_mb <= 0:
+        return None
+    store_dir = os.environ.get("LANDFIRE_TILE_CACHE", os.path.join(os.path.expanduser("~"), ".ffs_tools_landfire"))
+    return LandfireTileStore(store_dir, budget_mb)
@@ -0,0 +1,114 @@
+## Local stand-in for the LANDFIRE Product Service job API, for trying the downloader
+## without waiting on (or loading) the real service.
+##
+##   python lfps_standin_server.py [port] [--flaky]
+##   set LFPS_URL=http://localhost:<port>/api      (then run the downloader)
+##
+## Jobs report "Pending" and "Executing" for a few polls, then "Succeeded" with an
+## outputFile URL for a zip holding <jobId>.tif. Layer_List values containing "FAIL"
+## give a "Failed" job. Downloads honor HTTP Range requests, and with --flaky the
+## first download of every job is cut off halfway through.
+
+## import relevant packages
+import io
+import json
+import sys
+import threading
+import uuid
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# polls a job spends in each state before it succeeds
+POLLS_PENDING = 2
+POLLS_EXECUTING = 2
+
+jobs = {}
+jobs_lock = threading.Lock()
+flaky = False
+
+
+def job_zip(job_id):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr(job_id + ".tif", b"II*\x00" + job_id.encode("ascii") * 65536)
+        z.writestr(job_id + ".tfw", b"30.0\n0.0\n0.0\n-30.0\n0.0\n0.0\n")
+    return buf.getvalue()
+
+
+class Handler(BaseHTTPRequestHandler):
+    def send_json(self, obj, code=200):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/api/job/submit":
+            job_id = uuid.uuid4().hex
+            with jobs_lock:
+                jobs[job_id] = {"layer": query.get("Layer_List", [""])[0], "polls": 0,
+                                "aoi": query.get("Area_of_Interest", [""])[0], "email": query.get("Email", [""])[0]}
+            self.send_json({"jobId": job_id})
+        elif url.path == "/api/job/status":
+            job_id = query.get("JobId", [""])[0]
+            with jobs_lock:
+                job = jobs.get(job_id)
+                if job is None:
+                    self.send_json({"status": "Unknown"}, 404)
+                    return
+                job["polls"] += 1
+                polls = job["polls"]
+            if "FAIL" in job["layer"]:
+                self.send_json({"jobId": job_id, "status": "Failed", "messages": ["stand-in failure"]})
+            elif polls <= POLLS_PENDING:
+                self.send_json({"jobId": job_id, "status": "Pending"})
+            elif polls <= POLLS_PENDING + POLLS_EXECUTING:
+                self.send_json({"jobId": job_id, "status": "Executing"})
+            else:
+                host = self.headers.get("Host")
+                self.send_json({"jobId": job_id, "status": "Succeeded",
+                                "outputFile": "http://" + host + "/download/" + job_id + ".zip"})
+        elif url.path.startswith("/download/") and url.path.endswith(".zip"):
+            job_id = url.path[len("/download/"):-len(".zip")]
+            body = job_zip(job_id)
+            start = 0
+            byte_range = self.headers.get("Range")
+            if byte_range and byte_range.startswith("bytes="):
+                start = int(byte_range[len("bytes="):].split("-")[0])
+                self.send_response(206)
+                self.send_header("Content-Range", "bytes " + str(start) + "-" + str(len(body) - 1) + "/" + str(len(body)))
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", "application/zip")
+            self.send_header("Content-Length", str(len(body) - start))
+            self.send_header("Accept-Ranges", "bytes")
+            self.end_headers()
+            with jobs_lock:
+                job = jobs.setdefault(job_id, {"layer": "", "polls": 0})
+                cut = flaky and not job.get("cut")
+                job["cut"] = True
+            if cut:
+                # send half and drop the connection
+                self.wfile.write(body[start:start + (len(body) - start) // 2])
+                self.close_connection = True
+                return
+            self.wfile.write(body[start:])
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != "--flaky"]
+    flaky = "--flaky" in sys.argv[1:]
+    port = int(args[0]) if args else 8765
+    server = ThreadingHTTPServer(("localhost", port), Handler)
+    print("LFPS stand-in listening on http://localhost:" + str(port) + "/api")
+    server.serve_forever()
@@ -0,0 +1,152 @@
+## The University of Utah and the operator of this website (along with their employees or agents) are not responsible
+## for any decisions or results of the decisions that you make. You assume all risk arising from reliance on this
+## website and, by using this website you agree to hold the University of Utah and the operation of the website harmless
+## for damages arising out of your actions, whether or not in reliance on information provided through the website.
+
+## The information provided through the website application is given “as is”. To the maximum extent permitted by applicable
+## law, the University of Utah and the operator of the website disclaim all representations and warranties, expressed or
+## implied, with respect to such information, services, products, and materials, including without limitation any implied
+## warranties or merchantability, fitness for a particular purpose and noninfringement. In no event will the University of
+## Utah or website operator be liable for any consequential, indirect, incidental, special, or punitive damages, however
+## caused and under any theory of liability (including negligence), arising from your use of the website or the provision
+## of the information, services, products, and materials provided to or by the University of Utah or the website operator,
+## even if the University of Utah or website operator has been advised of the possibility of such damages.
+
+
+## per-stage timing and memory for the SSD/SSDE scripts.
+##
+##   prof = profiling.Profiler("ssde")
+##   with prof.stage("slope") as s:
+##       ...
+##       s["pixels"] = n
+##   prof.report(arcpy.AddMessage)
+##
+## Every stage records wall time, CPU time, resident memory at the end of the stage
+## and the peak resident memory of the process so far (the stage where the peak
+## jumps is the one that used the memory), plus any pixel/segment counts the script
+## sets (and the zone, for stages that run once per safety zone). Each finished
+## stage is appended to a JSON-lines trace right away, so a run that fails still
+## leaves a trace up to the failing stage.
+##
+## Traces are only written when FFS_TOOLS_TRACE is set, and only the newest
+## MAX_TRACES of each tool are kept.
+## FFS_TOOLS_TRACE  1 for traces in <user home>/.ffs_tools_traces, or the folder for
+##                  them (default: not set, only the summary table is printed)
+
+## import relevant packages
+import json
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+# traces kept per tool, older ones are deleted when a new run starts
+MAX_TRACES = 50
+
+
+# (resident MB, peak resident MB) of this process, None where the platform doesn't say
+def memory_mb():
+    rss = peak = None
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        rss = info.rss / 1048576.0
+        # peak_wset is Windows only
+        if getattr(info, "peak_wset", None) is not None:
+            return rss, info.peak_wset / 1048576.0
+    except ImportError:
+        if os.path.exists("/proc/self/statm"):
+            with open("/proc/self/statm") as f:
+                rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576.0
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        peak = peak / (1048576.0 if sys.platform == "darwin" else 1024.0)
+    except ImportError:
+        pass
+    return rss, peak
+
+
+class Profiler:
+    def __init__(self, tool, trace_dir=None):
+        self.tool = tool
+        self.run_id = time.strftime("%Y%m%d_%H%M%S") + "_" + uuid.uuid4().hex[:6]
+        self.records = []
+        if trace_dir is None:
+            trace_dir = os.environ.get("FFS_TOOLS_TRACE", "0")
+            if trace_dir == "1":
+                trace_dir = os.path.join(os.path.expanduser("~"), ".ffs_tools_traces")
+        self.trace_path = None
+        if trace_dir not in ("", "0"):
+            try:
+                os.makedirs(trace_dir, exist_ok = True)
+                self._prune(trace_dir)
+                self.trace_path = os.path.join(trace_dir, tool + "_" + self.run_id + ".jsonl")
+            except OSError:
+                # no trace is no reason to fail the tool
+                self.trace_path = None
+
+    # delete this tool's oldest traces so there's room for one more within MAX_TRACES
+    def _prune(self, trace_dir):
+        # run IDs start with the date and time, so names sort oldest first
+        traces = sorted(f for f in os.listdir(trace_dir) if f.startswith(self.tool + "_2") and f.endswith(".jsonl"))
+        for f in traces[:max(0, len(traces) - (MAX_TRACES - 1))]:
+            try:
+                os.remove(os.path.join(trace_dir, f))
+            except OSError:
+                pass
+
+    # time the code in the with block as stage name. The yielded dict takes counts
+    # (pixels, segments, ...) that go in the record with the timings.
+    @contextmanager
+    def stage(self, name, **counts):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        start = time.time()
+        status = "ok"
+        try:
+            yield counts
+        except BaseException:
+            status = "failed"
+            raise
+        finally:
+            rss, peak = memory_mb()
+            record = {"run": self.run_id, "tool": self.tool, "stage": name, "status": status,
+                      "start": start, "wall_s": time.perf_counter() - wall,
+                      "cpu_s": time.process_time() - cpu, "rss_mb": rss, "peak_rss_mb": peak}
+            record.update(counts)
+            self.records.append(record)
+            self._write(record)
+
+    def _write(self, record):
+        if self.trace_path is None:
+            return
+        try:
+            with open(self.trace_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError:
+            self.trace_path = None
+
+    # summary table of every stage so far, one string per line
+    def summary(self):
+        def num(value, fmt):
+            return "" if value is None else fmt % value
+        lines = ["%-22s %9s %9s %9s %10s %12s %9s" % ("stage", "wall s", "cpu s", "rss MB", "peak MB", "pixels", "segments")]
+        for r in self.records:
+            lines.append("%-22s %9.2f %9.2f %9s %10s %12s %9s" % (
+                r["stage"] + (" " + str(r["zone"]) if "zone" in r else "") + ("" if r["status"] == "ok" else " (failed)"),
+                r["wall_s"], r["cpu_s"],
+                num(r["rss_mb"], "%.0f"), num(r["peak_rss_mb"], "%.0f"),
+                num(r.get("pixels"), "%d"), num(r.get("segments"), "%d")))
+        lines.append("%-22s %9.2f %9.2f" % ("total", sum(r["wall_s"] for r in self.records),
+                                            sum(r["cpu_s"] for r in self.records)))
+        return lines
+
+    # send the summary table to log (e.g. arcpy.AddMessage) and say where the trace is
+    def report(self, log=print):
+        for line in self.summary():
+            log(line)
+        if self.trace_path is not None:
+            log("Stage trace written to " + self.trace_path)
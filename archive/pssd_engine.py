@@ -0,0 +1,436 @@
+## The University of Utah and the operator of this website (along with their employees or agents) are not responsible
+## for any decisions or results of the decisions that you make. You assume all risk arising from reliance on this
+## website and, by using this website you agree to hold the University of Utah and the operation of the website harmless
+## for damages arising out of your actions, whether or not in reliance on information provided through the website.
+
+## The information provided through the website application is given “as is”. To the maximum extent permitted by applicable
+## law, the University of Utah and the operator of the website disclaim all representations and warranties, expressed or
+## implied, with respect to such information, services, products, and materials, including without limitation any implied
+## warranties or merchantability, fitness for a particular purpose and noninfringement. In no event will the University of
+## Utah or website operator be liable for any consequential, indirect, incidental, special, or punitive damages, however
+## caused and under any theory of liability (including negligence), arising from your use of the website or the provision
+## of the information, services, products, and materials provided to or by the University of Utah or the website operator,
+## even if the University of Utah or website operator has been advised of the possibility of such damages.
+
+
+## NumPy version of the pSSD step in ssde_EXECUTION.py
+## pSSD of a safety zone (SZ) cell = min over segments of (distance to segment / mean SSD of segment)
+## All arrays are on the same grid: segment labels (NaN = no segment), SSD and a
+## boolean SZ mask.
+
+## import relevant packages
+import numpy as np
+
+
+##############################
+##   segments               ##
+##############################
+# turn segment raster values into 0..n-1 ids (-1 where there is no segment).
+# cells with the same raster value are one segment, like SetNull("VALUE <> id") does.
+def segment_ids(labels):
+    labels = np.asarray(labels)
+    valid = np.isfinite(labels)
+    ids = np.full(labels.shape, -1, dtype=np.int64)
+    values, ids[valid] = np.unique(labels[valid], return_inverse=True)
+    return ids, values
+
+
+# mean SSD of every segment (NaN if none of its cells have SSD)
+def segment_means(ids, ssd, nsegments):
+    valid = (ids >= 0) & np.isfinite(ssd)
+    sums = np.bincount(ids[valid], weights=ssd[valid], minlength=nsegments)
+    counts = np.bincount(ids[valid], minlength=nsegments)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
+
+# cells of each segment that touch a cell of another segment (or no segment).
+# For any cell outside a segment the closest segment cell is always one of these,
+# so they are the only ones that need to go in the spatial index.
+def segment_edges(ids):
+    pad = np.pad(ids, 1, mode="constant", constant_values=-1)
+    center = pad[1:-1, 1:-1]
+    edge = np.zeros(ids.shape, dtype=bool)
+    for dr, dc in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+        edge |= pad[1 + dr:pad.shape[0] - 1 + dr, 1 + dc:pad.shape[1] - 1 + dc] != center
+    return edge & (ids >= 0)
+
+
+# edge cell coordinates (in map units, relative to the array origin) sorted by segment id,
+# with where each segment's points start (segment i is points[starts[i]:starts[i + 1]])
+def segment_edge_table(ids, cellsize_x, cellsize_y, nsegments):
+    rows, cols = np.nonzero(segment_edges(ids))
+    seg = ids[rows, cols]
+    order = np.argsort(seg, kind="stable")
+    rows, cols, seg = rows[order], cols[order], seg[order]
+    points = np.column_stack((cols * cellsize_x, rows * cellsize_y)).astype(np.float64)
+    starts = np.searchsorted(seg, np.arange(nsegments + 1))
+    return points, starts
+
+
+# edge cell coordinates (in map units, relative to the array origin) grouped by segment id
+def segment_edge_points(ids, cellsize_x, cellsize_y, nsegments):
+    points, starts = segment_edge_table(ids, cellsize_x, cellsize_y, nsegments)
+    return np.split(points, starts[1:-1])
+
+
+# bounding box of each segment in cells: (row min, row max, col min, col max)
+def segment_boxes(ids, nsegments):
+    rows, cols = np.nonzero(ids >= 0)
+    seg = ids[rows, cols]
+    boxes = np.empty((nsegments, 4), dtype=np.int64)
+    boxes[:, 0] = boxes[:, 2] = np.iinfo(np.int64).max
+    boxes[:, 1] = boxes[:, 3] = -1
+    np.minimum.at(boxes[:, 0], seg, rows)
+    np.maximum.at(boxes[:, 1], seg, rows)
+    np.minimum.at(boxes[:, 2], seg, cols)
+    np.maximum.at(boxes[:, 3], seg, cols)
+    return boxes
+
+
+# smallest possible distance (map units) between each segment box and one other box
+def box_distances(boxes, box, cellsize_x, cellsize_y):
+    dr = np.maximum(0, np.maximum(boxes[:, 0] - box[1], box[0] - boxes[:, 1])) * cellsize_y
+    dc = np.maximum(0, np.maximum(boxes[:, 2] - box[3], box[2] - boxes[:, 3])) * cellsize_x
+    return np.sqrt(dr.astype(np.float64)**2 + dc.astype(np.float64)**2)
+
+
+##############################
+##   pSSD calculations      ##
+##############################
+# minimum pSSD over all segments for every SZ cell (NaN outside the SZ).
+# Each segment's edge cells go in a KD-tree and every SZ cell queries it, so the
+# work is (SZ cells x log(segment cells)) per segment instead of a distance
+# raster over the whole donut per segment. Segments with a mean SSD of 0 are
+# skipped, the same as the NoData that dividing by 0 gives CellStatistics.
+#
+# With prune=True segments are visited in order of an optimistic lower bound
+# (distance from the segment's box to the SZ box / mean SSD). Once that bound is
+# at least the largest pSSD currently held by any SZ cell, no remaining segment
+# can lower any cell and the rest are skipped. If a dict is passed as stats it
+# gets the number of segments, evaluated segments and pruned segments.
+# With return_segment=True the label value of the segment that gives each SZ cell
+# its pSSD is returned too.
+def minimum_pssd_kdtree(labels, ssd, sz_mask, cellsize_x, cellsize_y=None, prune=False, stats=None,
+                        return_segment=False):
+    from scipy.spatial import cKDTree
+    if cellsize_y is None:
+        cellsize_y = cellsize_x
+    ids, values = segment_ids(labels)
+    nsegments = values.size
+    means = segment_means(ids, ssd, nsegments)
+    edges = segment_edge_points(ids, cellsize_x, cellsize_y, nsegments)
+
+    sz_rows, sz_cols = np.nonzero(sz_mask)
+    sz_points = np.column_stack((sz_cols * cellsize_x, sz_rows * cellsize_y)).astype(np.float64)
+    best = np.full(sz_points.shape[0], np.inf)
+    best_seg = np.full(sz_points.shape[0], -1)
+
+    usable = np.array([means[seg] > 0 and edges[seg].shape[0] > 0 for seg in range(nsegments)], dtype=bool)
+    order = np.nonzero(usable)[0]
+    bounds = None
+    if prune and sz_points.shape[0]:
+        sz_box = (sz_rows.min(), sz_rows.max(), sz_cols.min(), sz_cols.max())
+        # segments with a mean of 0 aren't in order, their inf bound is never used
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bounds = box_distances(segment_boxes(ids, nsegments), sz_box, cellsize_x, cellsize_y) / means
+        order = order[np.argsort(bounds[order], kind="stable")]
+
+    evaluated = 0
+    for seg in order:
+        if bounds is not None and bounds[seg] >= best.max():
+            break
+        dist, _ = cKDTree(edges[seg]).query(sz_points)
+        pssd = dist / means[seg]
+        closer = pssd < best
+        best[closer] = pssd[closer]
+        best_seg[closer] = seg
+        evaluated += 1
+
+    if stats is not None:
+        stats["segments"] = nsegments
+        stats["evaluated"] = evaluated
+        stats["pruned"] = int(usable.sum()) - evaluated
+
+    out = np.full(sz_mask.shape, np.nan)
+    best[np.isinf(best)] = np.nan
+    out[sz_rows, sz_cols] = best
+    if return_segment:
+        # label value of the segment each cell's pSSD comes from
+        segment = np.full(sz_mask.shape, np.nan)
+        found = best_seg >= 0
+        segment[sz_rows[found], sz_cols[found]] = values[best_seg[found]]
+        return out, segment
+    return out
+
+
+# minimum pSSD like minimum_pssd_kdtree, evaluated coarse to fine. The SZ is cut
+# into block x block cell blocks and pSSD is evaluated exactly at one cell of each
+# block. A cell within r of that cell is within r of its distance to every segment,
+# so its pSSD lies between min over segments of (distance - r) / mean and
+# (distance + r) / mean, r being the farthest cell of the block. A block is split in four and
+# evaluated again only if its bounds reach the largest pSSD found so far (it could
+# hold the safest point) or straddle threshold (SSD met/not met could change inside
+# it); the cells of every other block get the value of their evaluated cell.
+# The maximum, the cells that have it and which cells are above threshold are
+# exactly what minimum_pssd_kdtree gives; the other values are within their block's
+# bound. If a dict is passed as stats it gets the number of SZ cells and evaluated cells.
+def minimum_pssd_pyramid(labels, ssd, sz_mask, cellsize_x, cellsize_y=None, block=16, threshold=1.0, stats=None):
+    from scipy.spatial import cKDTree
+    if cellsize_y is None:
+        cellsize_y = cellsize_x
+    ids, values = segment_ids(labels)
+    nsegments = values.size
+    means = segment_means(ids, ssd, nsegments)
+    edges = segment_edge_points(ids, cellsize_x, cellsize_y, nsegments)
+
+    rows, cols = np.nonzero(sz_mask)
+    points = np.column_stack((cols * cellsize_x, rows * cellsize_y)).astype(np.float64)
+    vals = np.full(rows.size, np.nan)
+    evaluated = 0
+
+    # segments closest (for their mean) to the SZ box first, like prune=True above
+    usable = np.nonzero((means > 0) & np.array([edges[seg].shape[0] > 0 for seg in range(nsegments)], dtype=bool))[0]
+    box_dist = np.zeros(nsegments)
+    if rows.size:
+        box_dist = box_distances(segment_boxes(ids, nsegments), (rows.min(), rows.max(), cols.min(), cols.max()),
+                                 cellsize_x, cellsize_y)
+    usable = usable[np.argsort(box_dist[usable] / means[usable], kind="stable")]
+    trees = {}
+
+    # exact pSSD of cells idx and its bounds for cells within reach of them.
+    # No SZ cell is closer to a segment than box_dist, so once that bound passes
+    # every upper bound the remaining segments can't change anything.
+    def evaluate(idx, reach=0.0):
+        best = np.full(idx.size, np.inf)
+        lo = np.full(idx.size, np.inf)
+        hi = np.full(idx.size, np.inf)
+        for seg in usable:
+            if box_dist[seg] / means[seg] >= hi.max():
+                break
+            if seg not in trees:
+                trees[seg] = cKDTree(edges[seg])
+            dist, _ = trees[seg].query(points[idx])
+            np.minimum(best, dist / means[seg], out=best)
+            np.minimum(lo, np.maximum(dist - reach, box_dist[seg]) / means[seg], out=lo)
+            np.minimum(hi, (dist + reach) / means[seg], out=hi)
+        return best, lo, hi
+
+    if usable.size and rows.size:
+        largest = -np.inf
+        cells = np.arange(rows.size)
+        size = max(1, int(block))
+        while cells.size:
+            if size == 1:
+                vals[cells] = evaluate(cells)[0]
+                evaluated += cells.size
+                break
+            # group the cells still to do by block
+            key = (rows[cells] // size) * (sz_mask.shape[1] // size + 1) + cols[cells] // size
+            # the cell closest to the block center is evaluated
+            center_r = (rows[cells] // size) * size + (size - 1) / 2.0
+            center_c = (cols[cells] // size) * size + (size - 1) / 2.0
+            to_center = ((rows[cells] - center_r) * cellsize_y)**2 + ((cols[cells] - center_c) * cellsize_x)**2
+            order = np.lexsort((to_center, key))
+            cells, key = cells[order], key[order]
+            first = np.ones(cells.size, dtype=bool)
+            first[1:] = key[1:] != key[:-1]
+            starts = np.nonzero(first)[0]
+            group = np.cumsum(first) - 1
+            reps = cells[starts]
+            # farthest cell of each block from its evaluated cell
+            reach = np.sqrt(((points[cells] - points[reps[group]])**2).sum(axis=1))
+            reach = np.maximum.reduceat(reach, starts) * (1 + 1e-9) + 1e-9
+            v, lo, hi = evaluate(reps, reach)
+            evaluated += reps.size
+            vals[reps] = v
+            largest = max(largest, v.max())
+            refine = (hi >= largest) | ((lo <= threshold) & (hi > threshold))
+            keep = refine[group]
+            done = ~keep
+            vals[cells[done]] = v[group[done]]
+            keep[starts] = False
+            cells = cells[keep]
+            size //= 2
+
+    if stats is not None:
+        stats["cells"] = int(rows.size)
+        stats["evaluated"] = int(evaluated)
+
+    out = np.full(sz_mask.shape, np.nan)
+    vals[np.isinf(vals)] = np.nan
+    out[rows, cols] = vals
+    return out
+
+
+##############################
+##   process pool pSSD      ##
+##############################
+# minimum_pssd_kdtree spread over worker processes. The segment means, segment edge
+# points and SZ cell coordinates are worked out once and go into shared memory; each
+# worker attaches to them and keeps a running minimum over the segments it's given
+# in its own row of a shared (workers x SZ cells) array. The rows are reduced with
+# np.min at the end, so the result doesn't depend on which worker got which segments.
+# If a dict is passed as stats it gets the number of segments and workers used.
+def minimum_pssd_parallel(labels, ssd, sz_mask, cellsize_x, cellsize_y=None, workers=None, stats=None):
+    import multiprocessing
+    import os
+    if cellsize_y is None:
+        cellsize_y = cellsize_x
+    workers = int(workers or os.cpu_count() or 1)
+    ids, values = segment_ids(labels)
+    nsegments = values.size
+    nsz = int(np.count_nonzero(sz_mask))
+    if workers <= 1 or nsegments < 2 or nsz == 0:
+        return minimum_pssd_kdtree(labels, ssd, sz_mask, cellsize_x, cellsize_y, stats=stats)
+    workers = min(workers, nsegments)
+
+    # deal the segments out round robin, biggest first, a few chunks per worker
+    sizes = np.bincount(ids[ids >= 0], minlength=nsegments)
+    by_size = np.argsort(-sizes, kind="stable")
+    chunks = [by_size[i::workers * 4] for i in range(min(nsegments, workers * 4))]
+
+    # segment means and edge points are worked out once here, the workers only
+    # get what they query: the edge points, the means and the SZ cell coordinates
+    means = segment_means(ids, ssd, nsegments)
+    edge_points, edge_starts = segment_edge_table(ids, cellsize_x, cellsize_y, nsegments)
+    rows, cols = np.nonzero(sz_mask)
+    sz_points = np.column_stack((cols * cellsize_x, rows * cellsize_y)).astype(np.float64)
+
+    shared = []
+    try:
+        specs = {}
+        for name, arr in (("means", means), ("edge_points", edge_points), ("edge_starts", edge_starts),
+                          ("sz_points", sz_points)):
+            shared.append(_shared_array(arr))
+            specs[name] = (shared[-1].name, arr.shape, arr.dtype.str)
+        partial = np.full((workers, nsz), np.inf)
+        shared.append(_shared_array(partial))
+        specs["partial"] = (shared[-1].name, partial.shape, partial.dtype.str)
+
+        ctx = _pool_context()
+        slots = ctx.Queue()
+        for slot in range(workers):
+            slots.put(slot)
+        with _hidden_main():
+            pool = ctx.Pool(workers, _pool_init, (specs, slots))
+        try:
+            pool.map(_pool_chunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+        best = np.ndarray(partial.shape, dtype=partial.dtype, buffer=shared[-1].buf).min(axis=0)
+    finally:
+        for shm in shared:
+            shm.close()
+            shm.unlink()
+
+    if stats is not None:
+        stats["segments"] = nsegments
+        stats["evaluated"] = nsegments
+        stats["workers"] = workers
+
+    out = np.full(sz_mask.shape, np.nan)
+    best[np.isinf(best)] = np.nan
+    out[np.nonzero(sz_mask)] = best
+    return out
+
+
+# copy arr into a new shared memory block
+def _shared_array(arr):
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    return shm
+
+
+# spawned workers everywhere (like Windows), with python.exe rather than ArcGISPro.exe
+# when running inside Pro
+def _pool_context():
+    import multiprocessing
+    import os
+    import sys
+    ctx = multiprocessing.get_context("spawn")
+    if os.name == "nt" and os.path.basename(sys.executable).lower() not in ("python.exe", "pythonw.exe"):
+        ctx.set_executable(os.path.join(sys.exec_prefix, "python.exe"))
+    return ctx
+
+
+# spawned workers normally re-import the main script first, which for the tool
+# scripts means importing arcpy and running the whole tool again. The workers only
+# need this module, so hide the main script while they start.
+class _hidden_main:
+    def __enter__(self):
+        import sys
+        self.main = sys.modules["__main__"]
+        self.saved = {k: self.main.__dict__.pop(k) for k in ("__file__", "__spec__") if k in self.main.__dict__}
+        self.main.__spec__ = None
+
+    def __exit__(self, *exc):
+        self.main.__dict__.pop("__spec__", None)
+        self.main.__dict__.update(self.saved)
+
+
+_worker = {}
+
+
+# map the shared arrays, nothing is recomputed per worker
+def _pool_init(specs, slots):
+    from multiprocessing import shared_memory
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker.setdefault("shm", []).append(shm)
+        _worker[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _worker["best"] = _worker["partial"][slots.get()]
+
+
+def _pool_chunk(segments):
+    from scipy.spatial import cKDTree
+    means, points, starts, best = _worker["means"], _worker["edge_points"], _worker["edge_starts"], _worker["best"]
+    for seg in segments:
+        edges = points[starts[seg]:starts[seg + 1]]
+        if means[seg] > 0 and edges.shape[0] > 0:
+            dist, _ = cKDTree(edges).query(_worker["sz_points"])
+            np.minimum(best, dist / means[seg], out=best)
+    return len(segments)
+
+
+##############################
+##   safety zone distance   ##
+##############################
+# largest possible SSD (meters), the radius of the "9280 Meters" buffers
+MAX_SSD = 9280.0
+
+
+# distance (map units) from every cell center to the closest SZ cell center, 0 inside the SZ
+def zone_distance(sz_mask, cellsize_x, cellsize_y=None):
+    from scipy.ndimage import distance_transform_edt
+    if cellsize_y is None:
+        cellsize_y = cellsize_x
+    return distance_transform_edt(~np.asarray(sz_mask, dtype=bool), sampling=(cellsize_y, cellsize_x))
+
+
+# cells outside the SZ but within radius of it, like an OUTSIDE_ONLY buffer
+def donut_mask(dist, radius):
+    return (dist > 0) & (dist <= radius)
+
+
+# processing radius (map units) around a SZ that no SSD can reach past.
+# A cell's SSD is at most 8 * EVH meters * max_factor (the largest multiplicative
+# factor of the mfl row), so starting at radius the radius shrinks to the largest
+# such bound among the cells inside it (+ margin), until it stops shrinking. A cell
+# whose bound reaches back to the SZ is inside every radius along the way, so it is
+# never cut off. dist is zone_distance, evh_m vegetation height in meters (NaN = NoData).
+def adaptive_radius(dist, evh_m, max_factor, radius=MAX_SSD, margin=0.0):
+    donut = (dist > 0) & (dist <= radius)
+    order = np.argsort(dist[donut], kind="stable")
+    dists = dist[donut][order]
+    bound = np.nan_to_num(8.0 * max_factor * np.asarray(evh_m, dtype=np.float64)[donut][order])
+    # largest bound among all cells out to each distance
+    reach = np.maximum.accumulate(bound) if bound.size else bound
+    while True:
+        n = np.searchsorted(dists, radius, side="right")
+        new = (reach[n - 1] if n else 0.0) + margin
+        if new >= radius:
+            return radius
+        radius = new
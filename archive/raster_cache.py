@@ -0,0 +1,248 @@
+## The University of Utah and the operator of this website (along with their employees or agents) are not responsible
+## for any decisions or results of the decisions that you make. You assume all risk arising from reliance on this
+## website and, by using this website you agree to hold the University of Utah and the operation of the website harmless
+## for damages arising out of your actions, whether or not in reliance on information provided through the website.
+
+## The information provided through the website application is given “as is”. To the maximum extent permitted by applicable
+## law, the University of Utah and the operator of the website disclaim all representations and warranties, expressed or
+## implied, with respect to such information, services, products, and materials, including without limitation any implied
+## warranties or merchantability, fitness for a particular purpose and noninfringement. In no event will the University of
+## Utah or website operator be liable for any consequential, indirect, incidental, special, or punitive damages, however
+## caused and under any theory of liability (including negligence), arising from your use of the website or the provision
+## of the information, services, products, and materials provided to or by the University of Utah or the website operator,
+## even if the University of Utah or website operator has been advised of the possibility of such damages.
+
+
+## persistent cache for reprojected rasters and slope so repeat runs over the same
+## incident data skip straight to the SSD math.
+##
+## Entries are keyed by a hash of the input raster's bytes plus whatever else changes
+## the result (UTM EPSG, resampling method, extent...). Each entry is a folder under
+## the cache folder, and the least recently used entries are deleted when the cache
+## goes over its size budget. index.json is only changed under a lock file, so tool
+## runs sharing the cache folder don't lose each other's entries.
+##
+## An entry is built in a folder of its own (build_<key>_...) and renamed into place
+## when it's committed, so two runs missing on the same key never write into the same
+## files. Entries used in the last GRACE_SECONDS aren't evicted, another run may still
+## be reading them; the cache can go over its budget until they age out.
+##
+## The cache is off unless FFS_TOOLS_CACHE_MB is set.
+## FFS_TOOLS_CACHE     cache folder (default: <user home>/.ffs_tools_cache)
+## FFS_TOOLS_CACHE_MB  size budget in MB (default 0, the cache is off; e.g. 2048)
+
+## import relevant packages
+import arcpy
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+import file_lock
+
+DEFAULT_BUDGET_MB = 0
+
+# entries used (and build folders touched) this recently are never deleted
+GRACE_SECONDS = 3600
+BUILD_PREFIX = "build_"
+
+
+class RasterCache:
+    def __init__(self, cache_dir, budget_mb):
+        self.cache_dir = cache_dir
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.index_path = os.path.join(cache_dir, "index.json")
+        os.makedirs(cache_dir, exist_ok = True)
+        self.index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault("entries", {})
+        index.setdefault("hashes", {})
+        return index
+
+    def _save_index(self):
+        tmp = self.index_path + "." + str(os.getpid()) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_path)
+
+    # the index as it is on disk, locked against other processes, saved when done
+    @contextmanager
+    def locked(self):
+        with file_lock.FileLock(self.index_path + ".lock"):
+            self.index = self._load_index()
+            yield self.index
+            self._save_index()
+
+    # sha256 of a raster's file(s). The hash of a file is remembered against its
+    # size and modified time so unchanged inputs are only read once.
+    def raster_hash(self, raster):
+        path = arcpy.Describe(raster).catalogPath
+        files = [path]
+        if os.path.isdir(path):
+            # grids and other folder based rasters
+            files = sorted(os.path.join(root, f) for root, _, names in os.walk(path) for f in names)
+        elif not os.path.isfile(path):
+            # geodatabase rasters etc., fall back on the path
+            return hashlib.sha256(path.encode("utf-8")).hexdigest()
+        h = hashlib.sha256()
+        new = {}
+        for f in files:
+            st = os.stat(f)
+            memo_key = os.path.abspath(f)
+            memo = self.index["hashes"].get(memo_key)
+            if memo is None or memo[0] != st.st_size or memo[1] != st.st_mtime:
+                fh = hashlib.sha256()
+                with open(f, "rb") as src:
+                    for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                        fh.update(chunk)
+                memo = [st.st_size, st.st_mtime, fh.hexdigest()]
+                new[memo_key] = memo
+            h.update(memo[2].encode("ascii"))
+        if new:
+            # files are hashed without holding the lock, only the result is recorded under it
+            with self.locked() as index:
+                index["hashes"].update(new)
+        return h.hexdigest()
+
+    def key(self, *parts):
+        return hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:32]
+
+    # path to build name in for key, in a new folder that commit moves into place
+    def build_path(self, key, name):
+        return os.path.join(tempfile.mkdtemp(prefix = BUILD_PREFIX + key + "_", dir = self.cache_dir), name)
+
+    # path of a cached raster, or None if it isn't cached
+    def lookup(self, key, name):
+        with self.locked() as index:
+            entry = index["entries"].get(key)
+            path = os.path.join(self.cache_dir, key, name)
+            if entry is None or name not in entry["files"] or not os.path.exists(path):
+                return None
+            entry["last_used"] = time.time()
+            return path
+
+    # move a raster written to build_path(key, name) into the cache as key's entry and
+    # evict old entries if over budget. Returns the cached path; if another run
+    # committed key first, its entry is used and this build is deleted.
+    def commit(self, key, built):
+        build_dir, name = os.path.split(built)
+        folder = os.path.join(self.cache_dir, key)
+        with self.locked() as index:
+            entry = index["entries"].get(key)
+            if entry is not None and name in entry["files"] and os.path.exists(os.path.join(folder, name)):
+                shutil.rmtree(build_dir, ignore_errors = True)
+                entry["last_used"] = time.time()
+                return os.path.join(folder, name)
+            # an unrecorded folder is left over from a run that stopped part way
+            shutil.rmtree(folder, ignore_errors = True)
+            try:
+                os.replace(build_dir, folder)
+            except OSError:
+                # still open somewhere (e.g. a raster dataset arcpy holds), use it uncached
+                index["entries"].pop(key, None)
+                return built
+            index["entries"][key] = {"files": [name], "last_used": time.time(),
+                                     "size": sum(os.path.getsize(os.path.join(root, f))
+                                                 for root, _, names in os.walk(folder) for f in names)}
+            self.evict(keep = key)
+        return os.path.join(folder, name)
+
+    # remove what a failed build left in its build folder
+    def discard(self, built):
+        shutil.rmtree(os.path.dirname(built), ignore_errors = True)
+
+    # delete least recently used entries until the cache fits in its budget, leaving
+    # entries used in the last GRACE_SECONDS alone (called with the index locked)
+    def evict(self, keep=None):
+        now = time.time()
+        entries = self.index["entries"]
+        total = sum(e["size"] for e in entries.values())
+        for key in sorted(entries, key = lambda k: entries[k]["last_used"]):
+            if total <= self.budget or now - entries[key]["last_used"] < GRACE_SECONDS:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors = True)
+            total -= entries.pop(key)["size"]
+        # build folders of runs that died before committing
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(BUILD_PREFIX) and now - os.path.getmtime(path) > GRACE_SECONDS:
+                shutil.rmtree(path, ignore_errors = True)
+
+
+_cache = None
+
+# the cache configured by FFS_TOOLS_CACHE / FFS_TOOLS_CACHE_MB, or None if it's turned off
+def get_cache():
+    global _cache
+    budget_mb = float(os.environ.get("FFS_TOOLS_CACHE_MB", DEFAULT_BUDGET_MB))
+    if budget_mb <= 0:
+        return None
+    if _cache is None:
+        cache_dir = os.environ.get("FFS_TOOLS_CACHE", os.path.join(os.path.expanduser("~"), ".ffs_tools_cache"))
+        _cache = RasterCache(cache_dir, budget_mb)
+    return _cache
+
+
+def extent_key(extent):
+    if extent is None:
+        return "None"
+    return "%.3f %.3f %.3f %.3f" % (extent.XMin, extent.YMin, extent.XMax, extent.YMax)
+
+
+# raster called name built by build(path) from inputs. key_parts are hashed with
+# the content hash of every input raster; on a cache hit build isn't called.
+def cached(inputs, key_parts, name, build):
+    cache = get_cache()
+    if cache is None:
+        build(name)
+        return name
+    key = cache.key(*([cache.raster_hash(r) for r in inputs] + list(key_parts) + [name]))
+    path = cache.lookup(key, name)
+    if path is not None:
+        arcpy.AddMessage(name + " loaded from cache.")
+        return path
+    path = cache.build_path(key, name)
+    try:
+        build(path)
+    except:
+        cache.discard(path)
+        raise
+    return cache.commit(key, path)
+
+
+# ProjectRaster through the cache, keyed on the input, target SR, resampling method,
+# cell size, processing extent and snap raster
+def project_raster(in_raster, out_name, out_sr, method, cell_size=None):
+    snap = arcpy.env.snapRaster
+    def build(path):
+        arcpy.management.ProjectRaster(in_raster, path, out_sr, method, cell_size)
+    return cached([in_raster] + ([snap] if snap else []),
+                  [out_sr.factoryCode, method, cell_size, extent_key(arcpy.env.extent)], out_name, build)
+
+
+# slope class array (0-3, -1 for NoData) of dtm over a window, through the cache
+def slope_class_array(dtm, window, spatial_reference):
+    import numpy as np
+    import raster_io
+    import ssd_engine
+    def build(path):
+        # one cell halo so the edge cells get the same slope as a whole-raster Slope
+        slope = ssd_engine.slope_percent(raster_io.read_array(dtm, window.grow(1)),
+                                         window.cellsize_x, window.cellsize_y)[1:-1, 1:-1]
+        cls = ssd_engine.slope_class(slope).astype(np.float32)
+        cls[cls < 0] = np.nan
+        raster_io.write_array(cls, window, path, spatial_reference)
+    path = cached([dtm], [extent_key(window.extent), window.cellsize_x, window.cellsize_y],
+                  "slope_class.tif", build)
+    cls = raster_io.read_array(path, window)
+    return np.where(np.isnan(cls), -1, cls).astype(np.int8)
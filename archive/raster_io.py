@@ -0,0 +1,362 @@
+## The University of Utah and the operator of this website (along with their employees or agents) are not responsible
+## for any decisions or results of the decisions that you make. You assume all risk arising from reliance on this
+## website and, by using this website you agree to hold the University of Utah and the operation of the website harmless
+## for damages arising out of your actions, whether or not in reliance on information provided through the website.
+
+## The information provided through the website application is given “as is”. To the maximum extent permitted by applicable
+## law, the University of Utah and the operator of the website disclaim all representations and warranties, expressed or
+## implied, with respect to such information, services, products, and materials, including without limitation any implied
+## warranties or merchantability, fitness for a particular purpose and noninfringement. In no event will the University of
+## Utah or website operator be liable for any consequential, indirect, incidental, special, or punitive damages, however
+## caused and under any theory of liability (including negligence), arising from your use of the website or the provision
+## of the information, services, products, and materials provided to or by the University of Utah or the website operator,
+## even if the University of Utah or website operator has been advised of the possibility of such damages.
+
+
+## helpers for moving rasters in and out of NumPy arrays for the array engines
+##
+## Tool outputs (SSD, pSSD, SSD met) are written with save_output / write_array(kind=...),
+## configured with environment variables:
+## FFS_TOOLS_ENCODING     FLOAT32 (default) or UINT16 (SSD in 0.2 m steps, pSSD in 0.001 steps
+##                        up to 65.534)
+## FFS_TOOLS_MASK         UINT8 (default, 255 = NoData) or 1BIT (no NoData, outside is 0)
+## FFS_TOOLS_COMPRESSION  DEFLATE (default), ZSTD, LZW or NONE
+## FFS_TOOLS_COG          1 (default) Cloud Optimized GeoTIFF with internal overviews,
+##                        0 tiled GeoTIFF with .ovr overviews
+
+## import relevant packages
+import arcpy
+import numpy as np
+import math
+import os
+import uuid
+
+# value written to NoData cells of float outputs
+OUT_NODATA = -9999.0
+
+# UINT16 outputs: stored value = round(value * scale), 65535 = NoData
+UINT16_SCALES = {"ssd": 5.0, "pssd": 1000.0}
+UINT16_NODATA = 65535
+UINT8_NODATA = 255
+
+# RasterInfo pixel types of the array dtypes written by array_raster
+PIXEL_TYPES = {"float32": "F32", "uint8": "U8", "uint16": "U16"}
+
+
+# a window on the grid of a reference raster
+class Window:
+    def __init__(self, xmin, ymax, cellsize_x, cellsize_y, ncols, nrows):
+        self.xmin = xmin
+        self.ymax = ymax
+        self.cellsize_x = cellsize_x
+        self.cellsize_y = cellsize_y
+        self.ncols = ncols
+        self.nrows = nrows
+
+    @property
+    def lower_left(self):
+        return arcpy.Point(self.xmin, self.ymax - self.nrows * self.cellsize_y)
+
+    # same window grown by n cells on every side
+    def grow(self, n):
+        return Window(self.xmin - n * self.cellsize_x, self.ymax + n * self.cellsize_y,
+                      self.cellsize_x, self.cellsize_y, self.ncols + 2 * n, self.nrows + 2 * n)
+
+    # sub-window starting at (row, col) cells of this window
+    def sub(self, row, col, nrows, ncols):
+        return Window(self.xmin + col * self.cellsize_x, self.ymax - row * self.cellsize_y,
+                      self.cellsize_x, self.cellsize_y, ncols, nrows)
+
+    @property
+    def extent(self):
+        return arcpy.Extent(self.xmin, self.ymax - self.nrows * self.cellsize_y,
+                            self.xmin + self.ncols * self.cellsize_x, self.ymax)
+
+
+# check that two rasters share cell size and cell alignment
+def is_aligned(ref, other, tol=1e-6):
+    d1 = arcpy.Describe(ref)
+    d2 = arcpy.Describe(other)
+    cw, ch = d1.meanCellWidth, d1.meanCellHeight
+    if abs(d2.meanCellWidth - cw) > tol * cw or abs(d2.meanCellHeight - ch) > tol * ch:
+        return False
+    off_x = ((d2.extent.XMin - d1.extent.XMin) / cw) % 1
+    off_y = ((d2.extent.YMax - d1.extent.YMax) / ch) % 1
+    return min(off_x, 1 - off_x) < 1e-3 and min(off_y, 1 - off_y) < 1e-3
+
+
+# number of cells in a raster (rows x columns, NoData included)
+def pixel_count(raster):
+    ras = raster if isinstance(raster, arcpy.Raster) else arcpy.Raster(raster)
+    return ras.width * ras.height
+
+
+# the part of ref's grid covered by all the rasters (like map algebra's intersection extent),
+# and by extent (an arcpy.Extent in ref's coordinate system) if there is one
+def common_window(ref, *others, extent=None):
+    d = arcpy.Describe(ref)
+    cw, ch = d.meanCellWidth, d.meanCellHeight
+    ext = d.extent
+    xmin, ymin, xmax, ymax = ext.XMin, ext.YMin, ext.XMax, ext.YMax
+    for e in [arcpy.Describe(other).extent for other in others] + ([extent] if extent is not None else []):
+        xmin, ymin = max(xmin, e.XMin), max(ymin, e.YMin)
+        xmax, ymax = min(xmax, e.XMax), min(ymax, e.YMax)
+    col0 = math.ceil((xmin - ext.XMin) / cw - 1e-6)
+    col1 = math.floor((xmax - ext.XMin) / cw + 1e-6)
+    row0 = math.ceil((ext.YMax - ymax) / ch - 1e-6)
+    row1 = math.floor((ext.YMax - ymin) / ch + 1e-6)
+    if col1 <= col0 or row1 <= row0:
+        raise ValueError("Input rasters do not overlap.")
+    return Window(ext.XMin + col0 * cw, ext.YMax - row0 * ch, cw, ch, col1 - col0, row1 - row0)
+
+
+# window on a raster's grid covering an extent (may run off the raster)
+def window_for_extent(raster, xmin, ymin, xmax, ymax):
+    d = arcpy.Describe(raster)
+    cw, ch = d.meanCellWidth, d.meanCellHeight
+    ext = d.extent
+    col0 = math.floor((xmin - ext.XMin) / cw + 1e-6)
+    col1 = math.ceil((xmax - ext.XMin) / cw - 1e-6)
+    row0 = math.floor((ext.YMax - ymax) / ch + 1e-6)
+    row1 = math.ceil((ext.YMax - ymin) / ch - 1e-6)
+    return Window(ext.XMin + col0 * cw, ext.YMax - row0 * ch, cw, ch, col1 - col0, row1 - row0)
+
+
+# read a window of a raster as float64 (or dtype) with NoData (and cells off the raster) as NaN
+def read_array(raster, window, dtype=np.float64):
+    ras = raster if isinstance(raster, arcpy.Raster) else arcpy.Raster(raster)
+    nodata = ras.noDataValue
+    if nodata is None:
+        nodata = OUT_NODATA
+    arr = arcpy.RasterToNumPyArray(ras, window.lower_left, window.ncols, window.nrows,
+                                   nodata_to_value = nodata).astype(dtype)
+    arr[arr == nodata] = np.nan
+    return arr
+
+
+# the cells of arr (an array on window) that fall on other, a window on the same grid.
+# Cells of other off window get fill.
+def crop_array(arr, window, other, fill=0):
+    r0 = int(round((window.ymax - other.ymax) / window.cellsize_y))
+    c0 = int(round((other.xmin - window.xmin) / window.cellsize_x))
+    out = np.full((other.nrows, other.ncols), fill, dtype=arr.dtype)
+    rs, cs = max(0, -r0), max(0, -c0)
+    re, ce = min(other.nrows, window.nrows - r0), min(other.ncols, window.ncols - c0)
+    if re > rs and ce > cs:
+        out[rs:re, cs:ce] = arr[r0 + rs:r0 + re, c0 + cs:c0 + ce]
+    return out
+
+
+# boolean array of the window cells whose centers fall inside the polygon(s),
+# the same cells ExtractByMask keeps for a polygon mask
+def polygon_mask(fc, window, out_raster="poly_mask.tif"):
+    oid = arcpy.Describe(fc).OIDFieldName
+    with arcpy.EnvManager(extent = window.extent, snapRaster = None, cellSize = window.cellsize_x):
+        arcpy.conversion.PolygonToRaster(fc, oid, out_raster, "CELL_CENTER", "", window.cellsize_x)
+    return np.isfinite(read_array(out_raster, window, np.float32))
+
+
+# raster of arr on window, arr is (rows, cols) or a band-first (bands, rows, cols) stack
+# like NumPyArrayToRaster takes. With a spatial reference it's built from a RasterInfo
+# that already has it, so whatever is saved or copied from the raster is defined on write
+def array_raster(arr, window, nodata, spatial_reference=None):
+    if spatial_reference is None:
+        return arcpy.NumPyArrayToRaster(arr, window.lower_left, window.cellsize_x, window.cellsize_y,
+                                        value_to_nodata = nodata)
+    info = arcpy.RasterInfo()
+    info.setBandCount(arr.shape[0] if arr.ndim == 3 else 1)
+    info.setPixelType(PIXEL_TYPES[arr.dtype.name])
+    if nodata is not None:
+        info.setNoDataValues([nodata])
+    info.setCellSize((window.cellsize_x, window.cellsize_y))
+    info.setExtent(window.extent)
+    info.setSpatialReference(spatial_reference)
+    ras = arcpy.Raster(info)
+    # Raster.write takes multiband arrays as (rows, cols, bands)
+    ras.write(np.moveaxis(arr, 0, -1) if arr.ndim == 3 else arr)
+    return ras
+
+
+# raster saved to out_raster (e.g. a scratch.Workspace path) that is 1 where mask is True
+# and NoData elsewhere, to use as an ExtractByMask mask without going through a feature class
+def mask_raster(mask, window, spatial_reference, out_raster):
+    ras = array_raster(np.asarray(mask, dtype=np.uint8), window, 0, spatial_reference)
+    ras.save(out_raster)
+    return arcpy.Raster(out_raster)
+
+
+# write a float array on a window to a raster dataset, NaN becomes NoData.
+# With kind ("ssd", "pssd", "mask" or "id") it's written as a tool output, see save_output.
+def write_array(arr, window, out_raster, spatial_reference=None, kind=None):
+    if kind is None:
+        out, nodata = np.where(np.isnan(arr), OUT_NODATA, arr).astype(np.float32), OUT_NODATA
+    else:
+        out, pixel_type, nodata = encode_array(arr, kind)
+    ras = array_raster(out, window, nodata, spatial_reference)
+    if kind is None:
+        ras.save(out_raster)
+    else:
+        copy_output(ras, out_raster, kind, pixel_type, nodata)
+    return out_raster
+
+
+# writes a float32 raster one block at a time so the whole output never has to be in memory
+class BlockWriter:
+    def __init__(self, window, spatial_reference, template):
+        info = arcpy.Raster(template).getRasterInfo()
+        info.setBandCount(1)
+        info.setPixelType("F32")
+        info.setNoDataValues([OUT_NODATA])
+        info.setCellSize((window.cellsize_x, window.cellsize_y))
+        info.setExtent(window.extent)
+        info.setSpatialReference(spatial_reference)
+        self.window = window
+        self.raster = arcpy.Raster(info)
+
+    # arr goes at (row, col) cells of the writer's window, NaN becomes NoData
+    def write(self, arr, row, col):
+        out = np.where(np.isnan(arr), OUT_NODATA, arr).astype(np.float32)
+        self.raster.write(out, (col, row))
+
+    def save(self, out_raster, kind=None):
+        if kind is None:
+            self.raster.save(out_raster)
+        else:
+            save_output(self.raster, out_raster, kind)
+        return out_raster
+
+
+# mosaic rasters on the same grid (e.g. LANDFIRE download tiles) into out_raster one
+# block at a time, so only a block of the output and of one input is in memory at once.
+# Where inputs overlap the first one with data wins. extent (an arcpy.Extent in any
+# spatial reference) limits the output, otherwise it covers all the inputs.
+def mosaic_blocks(rasters, out_raster, extent=None, block=2048):
+    ref = arcpy.Raster(rasters[0])
+    sr = ref.spatialReference
+    for other in rasters[1:]:
+        if not is_aligned(rasters[0], other):
+            raise ValueError("Rasters to mosaic are not on the same grid: " + str(other))
+    exts = [arcpy.Describe(r).extent for r in rasters]
+    xmin, ymin = min(e.XMin for e in exts), min(e.YMin for e in exts)
+    xmax, ymax = max(e.XMax for e in exts), max(e.YMax for e in exts)
+    if extent is not None:
+        clip = extent.projectAs(sr) if extent.spatialReference is not None else extent
+        xmin, ymin = max(xmin, clip.XMin), max(ymin, clip.YMin)
+        xmax, ymax = min(xmax, clip.XMax), min(ymax, clip.YMax)
+    window = window_for_extent(rasters[0], xmin, ymin, xmax, ymax)
+    nodata = ref.noDataValue
+    if nodata is None:
+        nodata = OUT_NODATA
+    info = ref.getRasterInfo()
+    info.setBandCount(1)
+    info.setNoDataValues([nodata])
+    info.setExtent(window.extent)
+    out = arcpy.Raster(info)
+    dtype = arcpy.RasterToNumPyArray(ref, ncols = 1, nrows = 1).dtype
+    for row in range(0, window.nrows, block):
+        for col in range(0, window.ncols, block):
+            sub = window.sub(row, col, min(block, window.nrows - row), min(block, window.ncols - col))
+            sub_ext = sub.extent
+            arr = np.full((sub.nrows, sub.ncols), np.nan)
+            for r, e in zip(rasters, exts):
+                if e.XMin >= sub_ext.XMax or e.XMax <= sub_ext.XMin or e.YMin >= sub_ext.YMax or e.YMax <= sub_ext.YMin:
+                    continue
+                fill = np.isnan(arr)
+                if not fill.any():
+                    break
+                arr[fill] = read_array(r, sub)[fill]
+            out.write(np.where(np.isnan(arr), nodata, arr).astype(dtype), (col, row))
+    out.save(out_raster)
+    return out_raster
+
+
+##############################
+##   output encodings       ##
+##############################
+def output_encoding(kind):
+    if kind == "mask":
+        return os.environ.get("FFS_TOOLS_MASK", "UINT8").upper()
+    if kind == "id":
+        return "FLOAT32"
+    return os.environ.get("FFS_TOOLS_ENCODING", "FLOAT32").upper()
+
+
+# array ready for NumPyArrayToRaster in the configured encoding of kind,
+# with the CopyRaster pixel type and NoData value to go with it
+def encode_array(arr, kind):
+    arr = np.asarray(arr)
+    encoding = output_encoding(kind)
+    missing = np.isnan(arr)
+    if kind == "mask":
+        if encoding == "1BIT":
+            return np.where(missing, 0, arr).astype(np.uint8), "1_BIT", None
+        return np.where(missing, UINT8_NODATA, arr).astype(np.uint8), "8_BIT_UNSIGNED", UINT8_NODATA
+    if encoding == "UINT16":
+        scaled = np.clip(np.round(np.where(missing, 0, arr) * UINT16_SCALES[kind]), 0, UINT16_NODATA - 1)
+        return np.where(missing, UINT16_NODATA, scaled).astype(np.uint16), "16_BIT_UNSIGNED", UINT16_NODATA
+    return np.where(missing, OUT_NODATA, arr).astype(np.float32), "32_BIT_FLOAT", OUT_NODATA
+
+
+# save a map algebra raster as a tool output of kind in the configured encoding
+def save_output(raster, out_raster, kind):
+    ras = raster if isinstance(raster, arcpy.Raster) else arcpy.Raster(raster)
+    encoding = output_encoding(kind)
+    if kind == "mask":
+        if encoding == "1BIT":
+            ras = arcpy.sa.Con(arcpy.sa.IsNull(ras), 0, ras)
+            return copy_output(ras, out_raster, kind, "1_BIT", None)
+        return copy_output(ras, out_raster, kind, "8_BIT_UNSIGNED", UINT8_NODATA)
+    if encoding == "UINT16":
+        scaled = ras * UINT16_SCALES[kind]
+        ras = arcpy.sa.Int(arcpy.sa.Con(scaled > UINT16_NODATA - 1, UINT16_NODATA - 1, scaled) + 0.5)
+        return copy_output(ras, out_raster, kind, "16_BIT_UNSIGNED", UINT16_NODATA)
+    return copy_output(ras, out_raster, kind, "32_BIT_FLOAT", OUT_NODATA)
+
+
+# CopyRaster with the configured compression, 512 x 512 tiles and overviews
+# (internal for COG), resampled with nearest neighbor for masks and IDs
+def copy_output(ras, out_raster, kind, pixel_type, nodata):
+    compression = os.environ.get("FFS_TOOLS_COMPRESSION", "DEFLATE").upper()
+    cog = os.environ.get("FFS_TOOLS_COG", "1") != "0"
+    resampling = "NEAREST" if kind in ("mask", "id") else "BILINEAR"
+    with arcpy.EnvManager(compression = compression, tileSize = "512 512",
+                          pyramid = "PYRAMIDS -1 " + resampling + " DEFAULT 75 NO_SKIP"):
+        arcpy.management.CopyRaster(ras, out_raster, nodata_value = "" if nodata is None else str(nodata),
+                                    pixel_type = pixel_type, format = "COG" if cog else "TIFF")
+    if output_encoding(kind) == "UINT16":
+        arcpy.AddMessage(os.path.basename(out_raster) + " is stored as 16 bit integers, divide by " +
+                         str(UINT16_SCALES[kind]) + " for " + kind.upper() + ".")
+    return out_raster
+
+
+# adaptive processing radius in meters around the polygon(s) in fc, from the
+# vegetation height codes in vh (see pssd_engine.adaptive_radius). Falls back on
+# max_radius if vh isn't in a projected coordinate system. Its intermediates are
+# held in the memory workspace and deleted before it returns.
+def zone_radius(fc, vh, max_factor, max_radius=None):
+    import pssd_engine
+    import ssd_engine
+    if max_radius is None:
+        max_radius = pssd_engine.MAX_SSD
+    sr = arcpy.Describe(vh).spatialReference
+    if sr.type != "Projected":
+        return max_radius
+    prefix = "memory\\r" + uuid.uuid4().hex[:8] + "_"
+    zone, mask = prefix + "radius_zone", prefix + "radius_mask"
+    try:
+        if arcpy.Describe(fc).spatialReference.name != sr.name:
+            arcpy.management.Project(fc, zone, sr)
+            fc = zone
+        mpu = sr.metersPerUnit
+        ext = arcpy.Describe(fc).extent
+        pad = max_radius / mpu
+        window = window_for_extent(vh, ext.XMin - pad, ext.YMin - pad, ext.XMax + pad, ext.YMax + pad)
+        evh_m = ssd_engine.evh_to_meters(read_array(vh, window, np.float32))
+        sz_mask = polygon_mask(fc, window, mask)
+    finally:
+        for item in (zone, mask):
+            if arcpy.Exists(item):
+                arcpy.management.Delete(item)
+    cx, cy = window.cellsize_x * mpu, window.cellsize_y * mpu
+    dist = pssd_engine.zone_distance(sz_mask, cx, cy)
+    return pssd_engine.adaptive_radius(dist, evh_m, max_factor, max_radius, margin = math.hypot(cx, cy))
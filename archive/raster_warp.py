@@ -0,0 +1,172 @@
+## The University of Utah and the operator of this website (along with their employees or agents) are not responsible
+## for any decisions or results of the decisions that you make. You assume all risk arising from reliance on this
+## website and, by using this website you agree to hold the University of Utah and the operation of the website harmless
+## for damages arising out of your actions, whether or not in reliance on information provided through the website.
+
+## The information provided through the website application is given “as is”. To the maximum extent permitted by applicable
+## law, the University of Utah and the operator of the website disclaim all representations and warranties, expressed or
+## implied, with respect to such information, services, products, and materials, including without limitation any implied
+## warranties or merchantability, fitness for a particular purpose and noninfringement. In no event will the University of
+## Utah or website operator be liable for any consequential, indirect, incidental, special, or punitive damages, however
+## caused and under any theory of liability (including negligence), arising from your use of the website or the provision
+## of the information, services, products, and materials provided to or by the University of Utah or the website operator,
+## even if the University of Utah or website operator has been advised of the possibility of such damages.
+
+
+## reproject a window of a raster into UTM in memory, without writing a full
+## *_reproj.tif copy first.
+##
+## The output grid is a raster_io.Window in the target coordinate system. Only the
+## block of the source raster under that window is read (RasterToNumPyArray with a
+## lower left corner and size), then every output cell is sampled from it. Where each
+## output cell falls on the source comes from a coarse grid of projected control
+## points (one every STEP cells) interpolated to every cell; the control grids are
+## kept in memory and in the raster cache, so repeat runs and neighbouring tiles over
+## the same window skip the projection calls.
+
+## import relevant packages
+import arcpy
+import math
+import numpy as np
+import raster_io
+import raster_cache
+
+# cells between projected control points
+STEP = 32
+
+# control grids of this run, by key
+_grids = {}
+
+
+##############################
+##   output grid            ##
+##############################
+# cell size in meters of a raster (approximate for geographic rasters)
+def cellsize_meters(raster):
+    d = arcpy.Describe(raster)
+    sr = d.spatialReference
+    if sr.type == "Projected":
+        return d.meanCellWidth * sr.metersPerUnit
+    lat = (d.extent.YMin + d.extent.YMax) / 2.0
+    return d.meanCellWidth * 111320.0 * math.cos(math.radians(lat))
+
+
+# window on a grid in out_sr (aligned to multiples of cellsize) covering extent.
+# The extent's outline is densified before projecting so curved edges are covered.
+def target_window(extent, out_sr, cellsize, densify=32):
+    xs = np.linspace(extent.XMin, extent.XMax, densify + 1)
+    ys = np.linspace(extent.YMin, extent.YMax, densify + 1)
+    ring = ([(x, extent.YMin) for x in xs] + [(extent.XMax, y) for y in ys] +
+            [(x, extent.YMax) for x in xs[::-1]] + [(extent.XMin, y) for y in ys[::-1]])
+    mp = arcpy.Multipoint(arcpy.Array([arcpy.Point(x, y) for x, y in ring]), extent.spatialReference)
+    ext = mp.projectAs(out_sr).extent
+    xmin = math.floor(ext.XMin / cellsize) * cellsize
+    ymax = math.ceil(ext.YMax / cellsize) * cellsize
+    ncols = int(math.ceil((ext.XMax - xmin) / cellsize))
+    nrows = int(math.ceil((ymax - ext.YMin) / cellsize))
+    return raster_io.Window(xmin, ymax, cellsize, cellsize, ncols, nrows)
+
+
+##############################
+##   coordinate transform   ##
+##############################
+# source coordinates of control points every STEP cells (plus the last row/column)
+# of window, projected from window_sr to src_sr
+def _control_grid(window, window_sr, src_sr, step):
+    rows = np.unique(np.append(np.arange(0, window.nrows, step), window.nrows - 1))
+    cols = np.unique(np.append(np.arange(0, window.ncols, step), window.ncols - 1))
+    xs = window.xmin + (cols + 0.5) * window.cellsize_x
+    ys = window.ymax - (rows + 0.5) * window.cellsize_y
+    points = arcpy.Array([arcpy.Point(x, y) for y in ys for x in xs])
+    projected = arcpy.Multipoint(points, window_sr).projectAs(src_sr)
+    coords = np.array([(p.X, p.Y) for p in projected], dtype=np.float64)
+    return rows, cols, coords[:, 0].reshape(rows.size, cols.size), coords[:, 1].reshape(rows.size, cols.size)
+
+
+def control_grid(window, window_sr, src_sr, step=STEP):
+    key_parts = ("transform", window_sr.exportToString(), src_sr.exportToString(), window.xmin, window.ymax,
+                 window.cellsize_x, window.cellsize_y, window.ncols, window.nrows, step)
+    if key_parts in _grids:
+        return _grids[key_parts]
+    cache = raster_cache.get_cache()
+    grid = None
+    if cache is not None:
+        key = cache.key(*key_parts)
+        path = cache.lookup(key, "grid.npz")
+        if path is not None:
+            with np.load(path) as f:
+                grid = (f["rows"], f["cols"], f["x"], f["y"])
+    if grid is None:
+        grid = _control_grid(window, window_sr, src_sr, step)
+        if cache is not None:
+            path = cache.build_path(key, "grid.npz")
+            np.savez(path, rows = grid[0], cols = grid[1], x = grid[2], y = grid[3])
+            cache.commit(key, path)
+    _grids[key_parts] = grid
+    return grid
+
+
+# linear interpolation of a control grid value to every cell
+def interpolate_grid(rows, cols, values, nrows, ncols):
+    # along each control row first, then between control rows
+    c = np.arange(ncols, dtype=np.float64)
+    by_row = np.array([np.interp(c, cols, v) for v in values])
+    if rows.size == 1:
+        return np.repeat(by_row, nrows, axis=0)
+    r = np.arange(nrows, dtype=np.float64)
+    k = np.clip(np.searchsorted(rows, r, side="right") - 1, 0, rows.size - 2)
+    t = ((r - rows[k]) / (rows[k + 1] - rows[k]))[:, None]
+    return by_row[k] * (1 - t) + by_row[k + 1] * t
+
+
+##############################
+##   sampling               ##
+##############################
+# sample src (array on src_window) at map coordinates x, y. NEAREST takes the cell the
+# point falls in, BILINEAR the four closest cell centers (NaN if any of them is
+# NoData, the nearest cell past the outermost cell centers).
+def sample(src, src_window, x, y, method):
+    col_f = (x - src_window.xmin) / src_window.cellsize_x
+    row_f = (src_window.ymax - y) / src_window.cellsize_y
+    nrows, ncols = src.shape
+    col = np.floor(col_f).astype(np.int64)
+    row = np.floor(row_f).astype(np.int64)
+    inside = (row >= 0) & (row < nrows) & (col >= 0) & (col < ncols)
+    out = np.full(x.shape, np.nan)
+    out[inside] = src[row[inside], col[inside]]
+    if method == "NEAREST":
+        return out
+    col_f = col_f - 0.5
+    row_f = row_f - 0.5
+    col = np.floor(col_f).astype(np.int64)
+    row = np.floor(row_f).astype(np.int64)
+    inside = (row >= 0) & (row < nrows - 1) & (col >= 0) & (col < ncols - 1)
+    r, c = row[inside], col[inside]
+    tc, tr = (col_f - col)[inside], (row_f - row)[inside]
+    out[inside] = ((src[r, c] * (1 - tc) + src[r, c + 1] * tc) * (1 - tr) +
+                   (src[r + 1, c] * (1 - tc) + src[r + 1, c + 1] * tc) * tr)
+    return out
+
+
+# read raster reprojected onto window (a grid in window_sr) as float64, NoData and
+# cells off the raster as NaN. Rasters already in window_sr are read directly when
+# they share the grid.
+def read_reprojected(raster, window, window_sr, method="NEAREST"):
+    d = arcpy.Describe(raster)
+    src_sr = d.spatialReference
+    if src_sr.name == window_sr.name:
+        off_x = ((window.xmin - d.extent.XMin) / d.meanCellWidth) % 1
+        off_y = ((d.extent.YMax - window.ymax) / d.meanCellHeight) % 1
+        if (abs(d.meanCellWidth - window.cellsize_x) < 1e-6 * window.cellsize_x and
+                min(off_x, 1 - off_x) < 1e-3 and min(off_y, 1 - off_y) < 1e-3):
+            return raster_io.read_array(raster, window)
+    rows, cols, gx, gy = control_grid(window, window_sr, src_sr)
+    x = interpolate_grid(rows, cols, gx, window.nrows, window.ncols)
+    y = interpolate_grid(rows, cols, gy, window.nrows, window.ncols)
+    # only the block of the source under the window is read, with a cell of slack
+    # for bilinear neighbours
+    pad_x, pad_y = d.meanCellWidth, d.meanCellHeight
+    src_window = raster_io.window_for_extent(raster, np.nanmin(x) - pad_x, np.nanmin(y) - pad_y,
+                                             np.nanmax(x) + pad_x, np.nanmax(y) + pad_y)
+    src = raster_io.read_array(raster, src_window)
+    return sample(src, src_window, x, y, method)
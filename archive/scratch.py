@@ -0,0 +1,135 @@
+## The University of Utah and the operator of this website (along with their employees or agents) are not responsible
+## for any decisions or results of the decisions that you make. You assume all risk arising from reliance on this
+## website and, by using this website you agree to hold the University of Utah and the operation of the website harmless
+## for damages arising out of your actions, whether or not in reliance on information provided through the website.
+
+## The information provided through the website application is given “as is”. To the maximum extent permitted by applicable
+## law, the University of Utah and the operator of the website disclaim all representations and warranties, expressed or
+## implied, with respect to such information, services, products, and materials, including without limitation any implied
+## warranties or merchantability, fitness for a particular purpose and noninfringement. In no event will the University of
+## Utah or website operator be liable for any consequential, indirect, incidental, special, or punitive damages, however
+## caused and under any theory of liability (including negligence), arising from your use of the website or the provision
+## of the information, services, products, and materials provided to or by the University of Utah or the website operator,
+## even if the University of Utah or website operator has been advised of the possibility of such damages.
+
+
+## intermediate storage for the EXECUTION scripts, instead of a processing folder
+## inside the tool's workspace (which may be on a network share).
+##
+##   ws = scratch.Workspace(workspace, "SSDE_processing")
+##   try:
+##       arcpy.management.Project(sz, ws.features("sz_reproj.shp"), utm_sr)
+##       raster_io.write_array(arr, window, ws.raster("pssd.tif", window), utm_sr)
+##       best = ws.array((nrows, ncols), np.float32)
+##   finally:
+##       ws.close()
+##
+## Feature classes and rasters go to the arcpy memory workspace while the rasters held
+## there fit in the memory budget; rasters that would go over it spill to a scratch
+## folder on local disk. NumPy work arrays over the budget are memory-mapped temporary
+## files in the same folder. The scratch folder is also arcpy.env.workspace, so
+## anything still written by name (e.g. reprojected rasters when the raster cache is
+## off) lands there too. close() deletes all of it; it's also run at exit so a run
+## that stops early doesn't leave intermediates behind. Memory workspace names get a
+## prefix of their own per Workspace, so runs in one process don't overwrite each
+## other's intermediates, and close() only deletes what this Workspace handed out.
+##
+## FFS_TOOLS_MEMORY_MB  memory budget for intermediates in MB (default 1024, 0 puts
+##                      everything on disk)
+## FFS_TOOLS_SCRATCH    folder the scratch folder is made in (default: the system temp
+##                      folder), PROJECT for the tool's workspace like before
+
+## import relevant packages
+import arcpy
+import atexit
+import numpy as np
+import os
+import shutil
+import tempfile
+import uuid
+
+DEFAULT_BUDGET_MB = 1024
+
+# bytes per cell assumed for intermediate rasters (float32)
+CELL_BYTES = 4
+
+
+class Workspace:
+    def __init__(self, project_dir, name, budget_mb=None):
+        if budget_mb is None:
+            budget_mb = float(os.environ.get("FFS_TOOLS_MEMORY_MB", DEFAULT_BUDGET_MB))
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.used = 0
+        root = os.environ.get("FFS_TOOLS_SCRATCH", "")
+        if root.upper() == "PROJECT":
+            self.folder = os.path.join(project_dir, name)
+            os.makedirs(self.folder, exist_ok = True)
+        else:
+            # a new folder per run, so runs at the same time don't share intermediates
+            self.folder = tempfile.mkdtemp(prefix = name + "_", dir = root or None)
+        # memory workspace datasets to delete on close, named with this run's prefix
+        self.prefix = "t" + uuid.uuid4().hex[:8] + "_"
+        self.held = []
+        self.closed = False
+        arcpy.env.workspace = self.folder
+        arcpy.env.scratchWorkspace = self.folder
+        atexit.register(self.close)
+
+    # path in the scratch folder
+    def disk(self, name):
+        return os.path.join(self.folder, name)
+
+    # path for an intermediate of about nbytes, in memory if it fits in the budget.
+    # Asking for a name again gives the same path, it's only counted once.
+    def path(self, name, nbytes=0):
+        out = "memory\\" + self.prefix + os.path.splitext(name)[0]
+        if out in self.held:
+            return out
+        if self.used + nbytes > self.budget:
+            return self.disk(name)
+        self.used += nbytes
+        self.held.append(out)
+        return out
+
+    # intermediate feature class (small, always fits)
+    def features(self, name):
+        return self.path(name)
+
+    # intermediate raster covering a raster_io.Window (or cells cells)
+    def raster(self, name, window=None, cells=None):
+        if cells is None:
+            cells = window.nrows * window.ncols
+        return self.path(name, cells * CELL_BYTES)
+
+    # uninitialized work array, memory-mapped to a temporary file when it doesn't fit
+    # in the budget. The file is deleted by the OS once the array is gone.
+    def array(self, shape, dtype=np.float32):
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if self.used + nbytes <= self.budget:
+            self.used += nbytes
+            return np.empty(shape, dtype = dtype)
+        return np.memmap(tempfile.TemporaryFile(dir = self.folder), dtype = dtype, mode = "w+", shape = shape)
+
+    # delete everything, safe to call more than once. The atexit handler is only a
+    # fallback, so it's dropped here and runs in one process don't pile them up.
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+        for item in self.held:
+            try:
+                if arcpy.Exists(item):
+                    arcpy.management.Delete(item)
+            except Exception:
+                pass
+        self.held = []
+        if arcpy.env.workspace == self.folder:
+            arcpy.env.workspace = None
+            arcpy.env.scratchWorkspace = None
+        try:
+            arcpy.management.Delete(self.folder)
+        except Exception:
+            pass
+        # anything arcpy didn't remove (e.g. files it doesn't know about)
+        shutil.rmtree(self.folder, ignore_errors = True)
@@ -0,0 +1,158 @@
+## The University of Utah and the operator of this website (along with their employees or agents) are not responsible
+## for any decisions or results of the decisions that you make. You assume all risk arising from reliance on this
+## website and, by using this website you agree to hold the University of Utah and the operation of the website harmless
+## for damages arising out of your actions, whether or not in reliance on information provided through the website.
+
+## The information provided through the website application is given “as is”. To the maximum extent permitted by applicable
+## law, the University of Utah and the operator of the website disclaim all representations and warranties, expressed or
+## implied, with respect to such information, services, products, and materials, including without limitation any implied
+## warranties or merchantability, fitness for a particular purpose and noninfringement. In no event will the University of
+## Utah or website operator be liable for any consequential, indirect, incidental, special, or punitive damages, however
+## caused and under any theory of liability (including negligence), arising from your use of the website or the provision
+## of the information, services, products, and materials provided to or by the University of Utah or the website operator,
+## even if the University of Utah or website operator has been advised of the possibility of such damages.
+
+
+## NumPy segmentation of the SSD donut, a faster stand-in for SegmentMeanShift
+## (spectral_detail 8, spatial_detail 8, min_segment_size 20) in the SSDE tools:
+##   1. SSD is quantized into levels equal-width classes over its range
+##   2. connected cells of the same class become a segment (4-connected)
+##   3. segments smaller than min_segment_size are merged into the neighbouring
+##      segment with the closest mean SSD, until none are left (or they have no
+##      neighbours to merge into)
+## Labels and per-segment stats stay in memory, nothing is written to disk.
+## Segment shapes differ from mean shift, segment_agreement() measures by how much.
+
+## import relevant packages
+import numpy as np
+
+MIN_SEGMENT_SIZE = 20
+LEVELS = 16
+
+
+# quantized SSD class of every cell (-1 where SSD is NaN)
+def quantize(ssd, levels=LEVELS):
+    valid = np.isfinite(ssd)
+    cls = np.full(ssd.shape, -1, dtype=np.int32)
+    if not valid.any():
+        return cls
+    lo, hi = np.min(ssd[valid]), np.max(ssd[valid])
+    scale = levels / (hi - lo) if hi > lo else 0.0
+    cls[valid] = np.clip(((ssd[valid] - lo) * scale).astype(np.int32), 0, levels - 1)
+    return cls
+
+
+# 0..n-1 ids of the connected same-class regions (-1 where cls is -1)
+def connected_regions(cls):
+    from scipy.ndimage import label
+    ids = np.full(cls.shape, -1, dtype=np.int64)
+    n = 0
+    for c in np.unique(cls[cls >= 0]):
+        regions, count = label(cls == c)
+        found = regions > 0
+        ids[found] = regions[found] - 1 + n
+        n += count
+    return ids, n
+
+
+# unique (a, b) pairs of different ids that touch (4-connected), a < b
+def adjacent_pairs(ids):
+    n = int(ids.max()) + 1
+    keys = []
+    for a, b in ((ids[:, :-1], ids[:, 1:]), (ids[:-1, :], ids[1:, :])):
+        touch = (a != b) & (a >= 0) & (b >= 0)
+        keys.append(np.minimum(a[touch], b[touch]) * n + np.maximum(a[touch], b[touch]))
+    # one int64 key per pair so the unique is 1-d
+    keys = np.unique(np.concatenate(keys))
+    return np.column_stack((keys // n, keys % n))
+
+
+# count, mean, min and max SSD of every segment id
+def segment_stats(ids, ssd, nsegments):
+    valid = (ids >= 0) & np.isfinite(ssd)
+    count = np.bincount(ids[valid], minlength=nsegments)
+    sums = np.bincount(ids[valid], weights=ssd[valid], minlength=nsegments)
+    lo = np.full(nsegments, np.inf)
+    hi = np.full(nsegments, -np.inf)
+    np.minimum.at(lo, ids[valid], ssd[valid])
+    np.maximum.at(hi, ids[valid], ssd[valid])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = sums / count
+    return {"count": count, "mean": mean, "min": lo, "max": hi}
+
+
+# merge segments under min_size cells into their closest-mean neighbour, returns
+# the new ids (renumbered 0..n-1) and n
+def merge_small(ids, ssd, nsegments, min_size=MIN_SEGMENT_SIZE):
+    while True:
+        stats = segment_stats(ids, ssd, nsegments)
+        small = stats["count"] < min_size
+        if not small.any():
+            break
+        pairs = adjacent_pairs(ids)
+        # both directions, only pairs starting at a small segment
+        edges = np.concatenate((pairs, pairs[:, ::-1]))
+        edges = edges[small[edges[:, 0]]]
+        if edges.size == 0:
+            break
+        diff = np.abs(stats["mean"][edges[:, 0]] - stats["mean"][edges[:, 1]])
+        diff = np.nan_to_num(diff, nan=np.inf)
+        # closest neighbour of each small segment (ties to the bigger neighbour)
+        order = np.lexsort((-stats["count"][edges[:, 1]], diff, edges[:, 0]))
+        edges = edges[order]
+        first = np.ones(edges.shape[0], dtype=bool)
+        first[1:] = edges[1:, 0] != edges[:-1, 0]
+        target = np.arange(nsegments)
+        target[edges[first, 0]] = edges[first, 1]
+        # follow chains (a -> b -> c) and break 2-cycles (a -> b -> a) toward the larger id
+        for _ in range(nsegments):
+            nxt = target[target]
+            cycle = nxt == np.arange(nsegments)
+            nxt[cycle] = np.maximum(np.arange(nsegments), target)[cycle]
+            if np.array_equal(nxt, target):
+                break
+            target = nxt
+        kept, remap = np.unique(target, return_inverse=True)
+        valid = ids >= 0
+        ids = ids.copy()
+        ids[valid] = remap[ids[valid]]
+        if kept.size == nsegments:
+            break
+        nsegments = kept.size
+    return ids, nsegments
+
+
+# segment an SSD array (NaN outside the donut). Returns labels as float (1..n, NaN
+# where there's no segment, like a segment raster read with raster_io.read_array)
+# and the stats of each segment (index i is label i + 1).
+def segment_ssd(ssd, levels=LEVELS, min_segment_size=MIN_SEGMENT_SIZE):
+    ssd = np.asarray(ssd, dtype=np.float64)
+    ids, n = connected_regions(quantize(ssd, levels))
+    ids, n = merge_small(ids, ssd, n, min_segment_size)
+    labels = np.where(ids >= 0, ids + 1, np.nan)
+    return labels, segment_stats(ids, ssd, n)
+
+
+# how well two segmentations of the same cells agree: adjusted Rand index over the
+# cells both label (1 = identical partitions, about 0 = no better than chance) and
+# the segment count of each
+def segment_agreement(labels_a, labels_b):
+    both = np.isfinite(labels_a) & np.isfinite(labels_b)
+    _, a = np.unique(labels_a[both], return_inverse=True)
+    _, b = np.unique(labels_b[both], return_inverse=True)
+    n = a.size
+    out = {"cells": int(n), "segments_a": int(np.unique(labels_a[np.isfinite(labels_a)]).size),
+           "segments_b": int(np.unique(labels_b[np.isfinite(labels_b)]).size)}
+    if n < 2:
+        out["adjusted_rand"] = 1.0
+        return out
+    # pair counts from the contingency table
+    _, joint = np.unique(a * (b.max() + 1) + b, return_counts=True)
+    comb = lambda x: (x * (x - 1) / 2.0).sum()
+    index = comb(joint.astype(np.float64))
+    sum_a = comb(np.bincount(a).astype(np.float64))
+    sum_b = comb(np.bincount(b).astype(np.float64))
+    expected = sum_a * sum_b / comb(np.array([n], dtype=np.float64))
+    top = (sum_a + sum_b) / 2.0
+    out["adjusted_rand"] = float((index - expected) / (top - expected)) if top != expected else 1.0
+    return out
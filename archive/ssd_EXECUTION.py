@@ -24,6 +24,14 @@ from time import time
 import os
 import math
 import shutil
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+import ssd_engine
+import raster_io
+import raster_cache
+import raster_warp
+import profiling
+import scratch
 
 arcpy.env.overwriteOutput = True
 arcpy.env.parallelProcessingFactor = "50%"
@@ -38,18 +46,16 @@ except:
 ##############################
 ## create processing folder ##
 ##############################
+# intermediates are held in memory or a local scratch folder (see scratch.py)
 try: 
-    processing_dir = sys.argv[6] + "//processing"
-    if not os.path.exists(processing_dir):
-            os.mkdir(processing_dir)
-    
-    arcpy.env.workspace = processing_dir
-    arcpy.env.scratchWorkspace = processing_dir
-    TempFolders = processing_dir
+    ws = scratch.Workspace(sys.argv[6], "processing")
 except: 
     arcpy.AddError("Could not create temporary processing folder.")
     sys.exit()
 
+# wall/CPU time and memory of every stage, reported when the run is done
+prof = profiling.Profiler("ssd")
+
 
 def run_ssd():
     ##############################
@@ -62,6 +68,26 @@ def run_ssd():
         dtm = sys.argv[3]
         wc = sys.argv[4]
         bc = sys.argv[5]
+    # optional: which engine does the SSD math, "ARCPY" (Spatial Analyst, default), "NUMPY",
+    # "TILED" (NumPy, one block at a time so memory doesn't grow with the raster) or
+    # "SCENARIOS" (NumPy, 9 band SSD with every wind speed/burning condition, wc and bc are ignored)
+    engine = "ARCPY"
+    if len(sys.argv) > 8 and sys.argv[8] not in ("", "#"):
+        engine = sys.argv[8].upper()
+    # optional for TILED: tile size in cells and number of worker threads
+    tile_size = 2048
+    if len(sys.argv) > 9 and sys.argv[9] not in ("", "#"):
+        tile_size = int(sys.argv[9])
+    workers = max(1, (os.cpu_count() or 2) // 2)
+    if len(sys.argv) > 10 and sys.argv[10] not in ("", "#"):
+        workers = int(sys.argv[10])
+    # optional for the NumPy engines: "WINDOW" reprojects only the cells the engine
+    # reads, in memory, instead of writing full reprojected copies with ProjectRaster
+    reprojection = "COPY"
+    if len(sys.argv) > 11 and sys.argv[11] not in ("", "#"):
+        reprojection = sys.argv[11].upper()
+    if engine == "ARCPY":
+        reprojection = "COPY"
     
     ###############################################
     ##   set processing for sr conversion        ##
@@ -89,28 +115,55 @@ def run_ssd():
     epsg_code = utm_num + 26900
     utm_sr = arcpy.SpatialReference(epsg_code)
     
-    # make sure the rasters aren't already in UTM
-    # if they are not, convert them, and rename variable to reprojected raster.
-    sr1 = arcpy.Describe(vh).spatialReference
-    sr2 = arcpy.Describe(dtm).spatialReference
-    if sr1.name != utm_sr.name:
-        arcpy.management.ProjectRaster(vh, 'vh_reproj.tif', utm_sr, "NEAREST") # these need to be written to file, can't just be held in memory.
-        vh = 'vh_reproj.tif'
-        arcpy.AddMessage("Vegetation height raster converted to UTM coordinates.")
-    else:
-        arcpy.AddMessage("Vegetation height raster in UTM coordinates.")
-    if sr2.name != utm_sr.name:
-        arcpy.management.ProjectRaster(dtm, 'dtm_reproj.tif', utm_sr, "BILINEAR")
-        dtm = 'dtm_reproj.tif'
-        arcpy.AddMessage("DTM raster converted to UTM coordinates.")
+    window = None
+    if reprojection == "WINDOW":
+        # output grid in UTM at the vegetation height cell size. nothing is read yet,
+        # the engines read the windows they need through raster_warp
+        with prof.stage("reprojection") as s:
+            if arcpy.Describe(vh).spatialReference.name == utm_sr.name:
+                window = raster_io.common_window(vh)
+            else:
+                window = raster_warp.target_window(arcpy.Describe(vh).extent, utm_sr, raster_warp.cellsize_meters(vh))
+            s["pixels"] = window.nrows * window.ncols
+        arcpy.AddMessage("Reprojecting to UTM in memory.")
     else:
-        arcpy.AddMessage("DTM raster in UTM coordinates.")
+        # make sure the rasters aren't already in UTM
+        # if they are not, convert them, and rename variable to reprojected raster.
+        with prof.stage("reprojection") as s:
+            sr1 = arcpy.Describe(vh).spatialReference
+            sr2 = arcpy.Describe(dtm).spatialReference
+            if sr1.name != utm_sr.name:
+                # these need to be written to file, can't just be held in memory. they go through
+                # the raster cache so a repeat run with the same inputs skips the reprojection
+                vh = raster_cache.project_raster(vh, 'vh_reproj.tif', utm_sr, "NEAREST")
+                arcpy.AddMessage("Vegetation height raster converted to UTM coordinates.")
+            else:
+                arcpy.AddMessage("Vegetation height raster in UTM coordinates.")
+            if sr2.name != utm_sr.name:
+                dtm = raster_cache.project_raster(dtm, 'dtm_reproj.tif', utm_sr, "BILINEAR")
+                arcpy.AddMessage("DTM raster converted to UTM coordinates.")
+            else:
+                arcpy.AddMessage("DTM raster in UTM coordinates.")
+            s["pixels"] = raster_io.pixel_count(vh)
     
     arcpy.AddMessage(ctime() + ": Done.")
     
     # clear the extent to allow geoprocessing to determine appropriate extents
     arcpy.env.extent = None
     
+    if engine == "NUMPY":
+        run_ssd_numpy(vh, dtm, wc, bc, utm_sr, window)
+        arcpy.CheckInExtension("spatial")
+        return
+    if engine == "SCENARIOS":
+        run_ssd_scenarios(vh, dtm, utm_sr, window)
+        arcpy.CheckInExtension("spatial")
+        return
+    if engine == "TILED":
+        run_ssd_tiled(vh, dtm, wc, bc, utm_sr, tile_size, workers, window)
+        arcpy.CheckInExtension("spatial")
+        return
+    
     ###############################
     ##   get slope               ##
     ###############################
@@ -118,8 +171,11 @@ def run_ssd():
     # first get a slope raster from the DTM
     # get units
     dtm_linearunit = (arcpy.Describe(dtm).spatialReference.linearUnitName.upper())
-    # get slope raster 
-    slope = Slope(dtm, output_measurement = "PERCENT_RISE", z_unit = dtm_linearunit)
+    # get slope raster (cached with the DTM it came from)
+    with prof.stage("slope") as s:
+        slope = Raster(raster_cache.cached([dtm], ["PERCENT_RISE", dtm_linearunit], "slope.tif",
+                                           lambda path: Slope(dtm, output_measurement = "PERCENT_RISE", z_unit = dtm_linearunit).save(path)))
+        s["pixels"] = raster_io.pixel_count(slope)
     
     arcpy.AddMessage(ctime() + ": Done.")
     
@@ -133,24 +189,7 @@ def run_ssd():
     # slope is PER pixel, other two are constant across landscape
     
     ## make a list of multiplactive factor (mf) values to pull from
-    if wc == "Light (0-10 mph)" and bc == "Low":
-        mfl = [0.8, 1, 1, 2]
-    if wc == "Light (0-10 mph)" and bc == "Moderate":
-        mfl = [1,1,1.5,2]
-    if wc == "Light (0-10 mph)" and bc == "Extreme":
-        mfl = [1,1.5,1.5,3]
-    if wc == "Moderate (11-20 mph)" and bc == "Low":
-        mfl = [1.5,2,3,4]
-    if wc == "Moderate (11-20 mph)" and bc == "Moderate":
-        mfl = [2,2,4,6]
-    if wc == "Moderate (11-20 mph)" and bc == "Extreme":
-        mfl = [2,2.5,5,6]
-    if wc == "High (>20 mph)" and bc == "Low":
-        mfl = [2.5,3,4,6]
-    if wc == "High (>20 mph)" and bc == "Moderate":
-        mfl = [3,3,5,7]
-    if wc == "High (>20 mph)" and bc == "Extreme":
-        mfl = [3,4,5,10]
+    mfl = ssd_engine.get_mfl(wc, bc)
     arcpy.AddMessage(ctime() + ": Done.")
     ## use Con to reclassify slope into the delta value for SSD calculation
     arcpy.AddMessage(ctime() + ": Calculating slope/wind factor...")
@@ -159,10 +198,12 @@ def run_ssd():
     where_clause1 = "Value >= 7.5 And Value < 22.5"    #mlf[1]
     where_clause2 = "Value >= 22.5 And Value < 41"     #mlf[2]
     where_clause3 = "Value >= 41"                       #mlf[3]
-    slope_remap = Con(in_conditional_raster, mfl[0],
-        Con(in_conditional_raster, mfl[1],
-            Con(in_conditional_raster, mfl[2],
-                Con(in_conditional_raster, mfl[3], where_clause = where_clause3), where_clause2), where_clause1), where_clause0)
+    with prof.stage("remap") as s:
+        slope_remap = Con(in_conditional_raster, mfl[0],
+            Con(in_conditional_raster, mfl[1],
+                Con(in_conditional_raster, mfl[2],
+                    Con(in_conditional_raster, mfl[3], where_clause = where_clause3), where_clause2), where_clause1), where_clause0)
+        s["pixels"] = raster_io.pixel_count(slope_remap)
     
     arcpy.AddMessage(ctime() + ": Done.")
     
@@ -170,26 +211,15 @@ def run_ssd():
     ##   Change landfire EVH classified values into continous meters     ##
     #######################################################################
     arcpy.AddMessage(ctime() + ": Reclassify LANDFIRE EVH to meters...")
-    # GENERATE REMAP VALUE LIST
+    # GENERATE REMAP VALUE LIST (shared with the NumPy engines, see ssd_engine.py)
     # calculations done on NUMERIC, all final values must be INTEGERS
-    # initiate empty list first
-    vals = []
-    # values 11 thru 100 ==> 0
-    for x in range(11,101):
-        vals.append([x,0])
-    # 101 thru 199 ==> value - 100 meters
-    for x in range(101, 200):
-        vals.append([x, (x-100)*100])
-    # 201 (NO 200) - 230 ==> value - 200 / 10
-    for x in range(201, 231):
-        vals.append([x, int(((x-200)/10.0)*100)])
-    # 301-310 ==> value - 300 / 10
-    for x in range(301,311):
-        vals.append([x,int(((x-300)/10.0)*100)])
+    vals = ssd_engine.evh_remap_values()
     
     ## next need to reclassify EVH to actually be meters
-    vh_reclass = Reclassify(in_raster = vh,  reclass_field = "Value", remap = RemapValue(vals))
-    vh_meters = Raster(vh_reclass)/100.0
+    with prof.stage("reclass") as s:
+        vh_reclass = Reclassify(in_raster = vh,  reclass_field = "Value", remap = RemapValue(vals))
+        vh_meters = Raster(vh_reclass)/100.0
+        s["pixels"] = raster_io.pixel_count(vh_meters)
     
     # if you get an error on Reclassify (999999) close Arc and close the python shell if its open. 
     arcpy.AddMessage(ctime() + ": Done.")
@@ -199,21 +229,128 @@ def run_ssd():
     #########################
     arcpy.AddMessage(ctime() + ": Calculating SSD...")
     ## for the entire input safety zone
-    ssd = 8 * vh_meters * slope_remap
-    
-    ssd.save(sys.argv[7])
+    with prof.stage("ssd") as s:
+        ssd = 8 * vh_meters * slope_remap
+        raster_io.save_output(ssd, sys.argv[7], "ssd")
+        s["pixels"] = raster_io.pixel_count(ssd)
     arcpy.AddMessage(ctime() + ": Done.")
     # check in sa extension
     arcpy.CheckInExtension("spatial")
 
-# run SSD function
-run_ssd()
+# snap the DTM to the vegetation height cells if it isn't already, the array engines
+# need both rasters on the same grid
+def align_dtm(vh, dtm, utm_sr):
+    if not raster_io.is_aligned(vh, dtm):
+        arcpy.env.snapRaster = vh
+        dtm = raster_cache.project_raster(dtm, 'dtm_snap.tif', utm_sr, "BILINEAR", arcpy.Describe(vh).meanCellWidth)
+        arcpy.env.snapRaster = None
+    return dtm
 
-# clean up files 
-def delete_files():
-    arcpy.Delete_management(processing_dir)
+# grid and EVH codes for the array engines. Without a window the DTM is snapped to the
+# vegetation height grid, with one (WINDOW reprojection) EVH is reprojected onto it
+# in memory.
+def read_evh(vh, dtm, utm_sr, window=None):
+    if window is None:
+        dtm = align_dtm(vh, dtm, utm_sr)
+        window = raster_io.common_window(vh, dtm)
+        return window, dtm, raster_io.read_array(vh, window, np.float32)
+    return window, dtm, raster_warp.read_reprojected(vh, window, utm_sr, "NEAREST")
+
+def read_slope_class(dtm, window, utm_sr, reproject=False):
+    if not reproject:
+        # slope class comes from the cache when this DTM has been seen before
+        return raster_cache.slope_class_array(dtm, window, utm_sr)
+    # one cell halo so the edge cells get the same slope as a whole-raster Slope
+    dtm_arr = raster_warp.read_reprojected(dtm, window.grow(1), utm_sr, "BILINEAR")
+    slope = ssd_engine.slope_percent(dtm_arr, window.cellsize_x, window.cellsize_y)[1:-1, 1:-1]
+    return ssd_engine.slope_class(slope)
+
+def run_ssd_numpy(vh, dtm, wc, bc, utm_sr, window=None):
+    #########################################
+    ##   Calculate SSD with NumPy arrays   ##
+    #########################################
+    # same SSD as the Slope/Con/Reclassify chain, but EVH and DTM are read as arrays
+    # and slope, slope class, EVH meters and SSD are done in one pass
+    arcpy.AddMessage(ctime() + ": Calculating SSD (NumPy engine)...")
+    mfl = ssd_engine.get_mfl(wc, bc)
+    reproject = window is not None
+    with prof.stage("read") as s:
+        window, dtm, evh = read_evh(vh, dtm, utm_sr, window)
+        s["pixels"] = evh.size
+    with prof.stage("slope", pixels = evh.size):
+        cls = read_slope_class(dtm, window, utm_sr, reproject)
+    with prof.stage("ssd", pixels = evh.size):
+        ssd = ssd_engine.compute_ssd_from_class(evh, cls, mfl)
+    with prof.stage("write", pixels = ssd.size):
+        raster_io.write_array(ssd, window, sys.argv[7], utm_sr, kind = "ssd")
+    arcpy.AddMessage(ctime() + ": Done.")
+
+def run_ssd_scenarios(vh, dtm, utm_sr, window=None):
+    ###############################################
+    ##   SSD for all 9 wind/burning scenarios    ##
+    ###############################################
+    # slope class and vegetation height are calculated once and each band only
+    # swaps in a different row of multiplicative factors
+    arcpy.AddMessage(ctime() + ": Calculating SSD for every scenario (NumPy engine)...")
+    reproject = window is not None
+    with prof.stage("read") as s:
+        window, dtm, evh = read_evh(vh, dtm, utm_sr, window)
+        s["pixels"] = evh.size
+    with prof.stage("slope", pixels = evh.size):
+        cls = read_slope_class(dtm, window, utm_sr, reproject)
+    with prof.stage("ssd", pixels = evh.size):
+        stack = ssd_engine.compute_ssd_scenarios_from_class(evh, cls)
+    with prof.stage("write", pixels = stack.size):
+        raster_io.write_array(stack, window, sys.argv[7], utm_sr, kind = "ssd")
+    for band, (wc, bc) in enumerate(ssd_engine.SCENARIOS):
+        arcpy.AddMessage("Band " + str(band + 1) + ": " + wc + ", " + bc)
+    arcpy.AddMessage(ctime() + ": Done.")
+
+def run_ssd_tiled(vh, dtm, wc, bc, utm_sr, tile_size, workers, window=None):
+    #########################################
+    ##   Calculate SSD tile by tile        ##
+    #########################################
+    # EVH and DTM are read in tile_size x tile_size blocks (DTM with a one cell halo
+    # for the slope kernel), SSD is computed on a pool of worker threads and each
+    # block is written straight into the output raster. Only a few tiles are in
+    # memory at once, no matter how big the rasters are.
+    arcpy.AddMessage(ctime() + ": Calculating SSD (tiled, " + str(tile_size) + " cell tiles, " + str(workers) + " workers)...")
+    mfl = ssd_engine.get_mfl(wc, bc)
+    reproject = window is not None
+    if not reproject:
+        dtm = align_dtm(vh, dtm, utm_sr)
+        window = raster_io.common_window(vh, dtm)
+    writer = raster_io.BlockWriter(window, utm_sr, vh)
+    tiles = list(ssd_engine.iter_tiles(window.nrows, window.ncols, tile_size))
+    
+    def read_tile(tile):
+        row, col, nrows, ncols = tile
+        sub = window.sub(row, col, nrows, ncols)
+        if reproject:
+            # each tile is reprojected on its own, only its part of the sources is read
+            return (raster_warp.read_reprojected(vh, sub, utm_sr, "NEAREST"),
+                    raster_warp.read_reprojected(dtm, sub.grow(1), utm_sr, "BILINEAR"))
+        return raster_io.read_array(vh, sub, np.float32), raster_io.read_array(dtm, sub.grow(1))
+    
+    # reads and writes stay on this thread, the pool only does the math.
+    # at most 2 tiles per worker are queued at a time to keep memory bounded.
+    with prof.stage("ssd_tiled", pixels = window.nrows * window.ncols), ThreadPoolExecutor(max_workers = workers) as pool:
+        pending = []
+        for n, tile in enumerate(tiles):
+            evh, dtm_arr = read_tile(tile)
+            pending.append((tile, pool.submit(ssd_engine.compute_ssd_tile, evh, dtm_arr,
+                                              window.cellsize_x, window.cellsize_y, mfl)))
+            del evh, dtm_arr
+            while len(pending) >= 2 * workers or (n == len(tiles) - 1 and pending):
+                (row, col, nrows, ncols), future = pending.pop(0)
+                writer.write(future.result(), row, col)
+    with prof.stage("write", pixels = window.nrows * window.ncols):
+        writer.save(sys.argv[7], kind = "ssd")
+    arcpy.AddMessage(ctime() + ": Done.")
+
+# run SSD function, the intermediates are deleted even if it stops early
 try:
-    delete_files()
-except:
-    arcpy.AddError("Could not delete temporary files.")
-    sys.exit()
+    run_ssd()
+    prof.report(arcpy.AddMessage)
+finally:
+    ws.close()
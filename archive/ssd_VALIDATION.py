@@ -23,6 +23,10 @@
             self.params[4].enabled = True
             self.params[5].enabled = True
             self.params[6].enabled = True
+            self.params[7].enabled = True
+            self.params[8].enabled = True
+            self.params[9].enabled = True
+            self.params[10].enabled = True
             self.params[1].enabled = True
         else:
             self.params[2].enabled = False
@@ -30,6 +34,10 @@
             self.params[4].enabled = False
             self.params[5].enabled = False
             self.params[6].enabled = False
+            self.params[7].enabled = False
+            self.params[8].enabled = False
+            self.params[9].enabled = False
+            self.params[10].enabled = False
             self.params[1].enabled = False
             
         return
@@ -0,0 +1,216 @@
+## The University of Utah and the operator of this website (along with their employees or agents) are not responsible
+## for any decisions or results of the decisions that you make. You assume all risk arising from reliance on this
+## website and, by using this website you agree to hold the University of Utah and the operation of the website harmless
+## for damages arising out of your actions, whether or not in reliance on information provided through the website.
+
+## The information provided through the website application is given “as is”. To the maximum extent permitted by applicable
+## law, the University of Utah and the operator of the website disclaim all representations and warranties, expressed or
+## implied, with respect to such information, services, products, and materials, including without limitation any implied
+## warranties or merchantability, fitness for a particular purpose and noninfringement. In no event will the University of
+## Utah or website operator be liable for any consequential, indirect, incidental, special, or punitive damages, however
+## caused and under any theory of liability (including negligence), arising from your use of the website or the provision
+## of the information, services, products, and materials provided to or by the University of Utah or the website operator,
+## even if the University of Utah or website operator has been advised of the possibility of such damages.
+
+
+## NumPy version of the SSD calculation in ssd_EXECUTION.py / ssde_EXECUTION.py
+## SSD = 8 * VH * (delta), same as the Reclassify/Con chain but done on arrays
+## in one pass instead of building a Spatial Analyst raster for every step.
+
+## import relevant packages
+import numpy as np
+
+
+##############################################
+##   multiplicative factor (mf) values      ##
+##############################################
+# one list per wind speed/burning condition, one value per slope class
+MFL_TABLE = {
+    ("Light (0-10 mph)", "Low"):          [0.8, 1, 1, 2],
+    ("Light (0-10 mph)", "Moderate"):     [1, 1, 1.5, 2],
+    ("Light (0-10 mph)", "Extreme"):      [1, 1.5, 1.5, 3],
+    ("Moderate (11-20 mph)", "Low"):      [1.5, 2, 3, 4],
+    ("Moderate (11-20 mph)", "Moderate"): [2, 2, 4, 6],
+    ("Moderate (11-20 mph)", "Extreme"):  [2, 2.5, 5, 6],
+    ("High (>20 mph)", "Low"):            [2.5, 3, 4, 6],
+    ("High (>20 mph)", "Moderate"):       [3, 3, 5, 7],
+    ("High (>20 mph)", "Extreme"):        [3, 4, 5, 10],
+}
+
+# slope (percent rise) class breaks, same as where_clause0..3:
+# [0, 7.5) -> mfl[0], [7.5, 22.5) -> mfl[1], [22.5, 41) -> mfl[2], >= 41 -> mfl[3]
+SLOPE_BREAKS = np.array([7.5, 22.5, 41.0])
+
+
+# every wind speed/burning condition combination, in band order for scenario stacks
+SCENARIOS = list(MFL_TABLE.keys())
+
+
+# short name for a scenario, e.g. "Moderate_Extreme" for ("Moderate (11-20 mph)", "Extreme")
+def scenario_name(wc, bc):
+    return wc.split(" ")[0] + "_" + bc
+
+
+# scenario key for a wind speed and burning condition given by their full tool values
+# or short names, e.g. ("High", "low") -> ("High (>20 mph)", "Low")
+def find_scenario(wc, bc):
+    def short(value):
+        return str(value).split(" ")[0].lower()
+    for scenario in SCENARIOS:
+        if short(scenario[0]) == short(wc) and short(scenario[1]) == short(bc):
+            return scenario
+    raise ValueError("Unknown wind speed/burning condition: " + str(wc) + ", " + str(bc))
+
+
+def get_mfl(wc, bc):
+    try:
+        return MFL_TABLE[(wc, bc)]
+    except KeyError:
+        raise ValueError("Unknown wind speed/burning condition: " + str(wc) + ", " + str(bc))
+
+
+#######################################################################
+##   LANDFIRE EVH classified values into continous meters            ##
+#######################################################################
+# same remap list the Reclassify step uses (values in cm so they stay integers)
+def evh_remap_values():
+    vals = []
+    # values 11 thru 100 ==> 0
+    for x in range(11,101):
+        vals.append([x,0])
+    # 101 thru 199 ==> value - 100 meters
+    for x in range(101, 200):
+        vals.append([x, (x-100)*100])
+    # 201 (NO 200) - 230 ==> value - 200 / 10
+    for x in range(201, 231):
+        vals.append([x, int(((x-200)/10.0)*100)])
+    # 301-310 ==> value - 300 / 10
+    for x in range(301,311):
+        vals.append([x,int(((x-300)/10.0)*100)])
+    return vals
+
+
+# lookup table indexed by EVH code. Codes that aren't in the remap keep their
+# own value, which is what Reclassify does with the default missing_values="DATA".
+EVH_LUT = np.arange(311, dtype=np.float64)
+for code, cm in evh_remap_values():
+    EVH_LUT[code] = cm
+EVH_LUT = (EVH_LUT / 100.0).astype(np.float32)
+
+
+# EVH codes -> vegetation height in meters (float32, NaN where EVH is NaN)
+def evh_to_meters(evh):
+    evh = np.asarray(evh)
+    vh = (evh / 100.0).astype(np.float32)
+    codes = np.where(np.isfinite(evh), evh, -1).astype(np.int64)
+    in_lut = (codes >= 0) & (codes < EVH_LUT.size)
+    vh[in_lut] = EVH_LUT[codes[in_lut]]
+    return vh
+
+
+###############################
+##   slope                   ##
+###############################
+# percent rise slope with the same 3x3 (Horn) kernel as Spatial Analyst Slope.
+# Neighbors that are NoData (or off the edge of the array) take the value of the
+# center cell, like Slope does. If the array already has a one cell halo around
+# the area of interest, the interior cells match a slope over the full raster.
+def slope_percent(dtm, cellsize_x, cellsize_y=None, z_factor=1.0):
+    if cellsize_y is None:
+        cellsize_y = cellsize_x
+    z = np.asarray(dtm, dtype=np.float64) * z_factor
+    pad = np.pad(z, 1, mode="constant", constant_values=np.nan)
+    nrows, ncols = z.shape
+
+    # a b c
+    # d e f
+    # g h i
+    def neighbor(dr, dc):
+        n = pad[1 + dr:1 + dr + nrows, 1 + dc:1 + dc + ncols]
+        return np.where(np.isnan(n), z, n)
+    a = neighbor(-1, -1)
+    b = neighbor(-1, 0)
+    c = neighbor(-1, 1)
+    d = neighbor(0, -1)
+    f = neighbor(0, 1)
+    g = neighbor(1, -1)
+    h = neighbor(1, 0)
+    i = neighbor(1, 1)
+    dz_dx = ((c + 2*f + i) - (a + 2*d + g)) / (8 * cellsize_x)
+    dz_dy = ((g + 2*h + i) - (a + 2*b + c)) / (8 * cellsize_y)
+    return (np.sqrt(dz_dx**2 + dz_dy**2) * 100).astype(np.float32)
+
+
+# slope class 0-3 for indexing mfl, -1 where slope is NoData
+def slope_class(slope):
+    slope = np.asarray(slope)
+    cls = np.searchsorted(SLOPE_BREAKS, slope, side="right").astype(np.int8)
+    cls[~(slope >= 0)] = -1
+    return cls
+
+
+#########################
+##   Calculate SSD     ##
+#########################
+# SSD = 8 * vh * mfl[slope class] for every cell, NaN where EVH or slope is NoData.
+# 8 * mfl is folded into one factor per class (exact, 8 is a power of two) so the
+# result is the same float32 value the raster multiply gives.
+def compute_ssd(evh, slope, mfl):
+    return compute_ssd_from_class(evh, slope_class(slope), mfl)
+
+
+# same as compute_ssd but from an already classified slope (see slope_class)
+def compute_ssd_from_class(evh, cls, mfl):
+    vh = evh_to_meters(evh)
+    ssd = vh * ssd_factors(mfl)[cls]
+    ssd[np.isnan(vh)] = np.nan
+    return ssd
+
+
+# 8 * mfl per slope class, with NaN at index -1 for NoData slope
+def ssd_factors(mfl):
+    return np.append(8 * np.asarray(mfl, dtype=np.float32), np.float32(np.nan))
+
+
+# SSD for every scenario in SCENARIOS as a (9, rows, cols) stack. Slope class and
+# vegetation height don't depend on the conditions so they're only worked out once.
+def compute_ssd_scenarios(evh, slope, scenarios=None):
+    return compute_ssd_scenarios_from_class(evh, slope_class(slope), scenarios)
+
+
+def compute_ssd_scenarios_from_class(evh, cls, scenarios=None):
+    if scenarios is None:
+        scenarios = SCENARIOS
+    vh = evh_to_meters(evh)
+    stack = np.empty((len(scenarios),) + vh.shape, dtype=np.float32)
+    for band, (wc, bc) in enumerate(scenarios):
+        np.multiply(vh, ssd_factors(get_mfl(wc, bc))[cls], out=stack[band])
+    stack[:, np.isnan(vh)] = np.nan
+    return stack
+
+
+# convenience wrapper that starts from the DTM. halo is the number of extra
+# rows/columns around evh that dtm carries for the slope kernel.
+def compute_ssd_from_dtm(evh, dtm, cellsize_x, cellsize_y=None, mfl=None, z_factor=1.0, halo=0):
+    slope = slope_percent(dtm, cellsize_x, cellsize_y, z_factor)
+    if halo:
+        slope = slope[halo:-halo, halo:-halo]
+    return compute_ssd(evh, slope, mfl)
+
+
+###############################
+##   tiles                   ##
+###############################
+# split an nrows x ncols grid into tiles of at most tile_size x tile_size cells,
+# yields (row, col, nrows, ncols) for each tile in row-major order
+def iter_tiles(nrows, ncols, tile_size):
+    for row in range(0, nrows, tile_size):
+        for col in range(0, ncols, tile_size):
+            yield row, col, min(tile_size, nrows - row), min(tile_size, ncols - col)
+
+
+# SSD for one tile. dtm carries a one cell halo around evh so the slope kernel
+# sees real neighbors across tile edges, the tile result is then identical to
+# the same cells of a whole-raster run.
+def compute_ssd_tile(evh, dtm, cellsize_x, cellsize_y, mfl, z_factor=1.0):
+    return compute_ssd_from_dtm(evh, dtm, cellsize_x, cellsize_y, mfl = mfl, z_factor = z_factor, halo = 1)
@@ -0,0 +1,92 @@
+## The University of Utah and the operator of this website (along with their employees or agents) are not responsible
+## for any decisions or results of the decisions that you make. You assume all risk arising from reliance on this
+## website and, by using this website you agree to hold the University of Utah and the operation of the website harmless
+## for damages arising out of your actions, whether or not in reliance on information provided through the website.
+
+## The information provided through the website application is given “as is”. To the maximum extent permitted by applicable
+## law, the University of Utah and the operator of the website disclaim all representations and warranties, expressed or
+## implied, with respect to such information, services, products, and materials, including without limitation any implied
+## warranties or merchantability, fitness for a particular purpose and noninfringement. In no event will the University of
+## Utah or website operator be liable for any consequential, indirect, incidental, special, or punitive damages, however
+## caused and under any theory of liability (including negligence), arising from your use of the website or the provision
+## of the information, services, products, and materials provided to or by the University of Utah or the website operator,
+## even if the University of Utah or website operator has been advised of the possibility of such damages.
+
+
+
+## max-pyramid index over an SSD array for "largest SSD within a distance of the
+## safety zone" queries (the large donut maximum that sizes the small donut).
+##
+## Level 0 is the SSD itself, every level above holds the maximum of 2 x 2 blocks of
+## the one below. A query walks down from the top, best block maximum first, and
+## stops at the first block that lies entirely inside the distance range: nothing
+## left in the queue can beat it. Blocks entirely out of range, or whose maximum is
+## below that, are never opened, so a query touches a few blocks per level instead
+## of every cell of the 9280 m ring.
+##
+## Building the pyramid is a full pass over the SSD, so it pays off where one SSD
+## answers many zones: ssde_batch_EXECUTION.py and ssde_service.py build one per
+## scenario and keep it for every safety zone they evaluate.
+
+## import relevant packages
+import heapq
+import numpy as np
+
+
+class MaxPyramid:
+    def __init__(self, levels):
+        self.levels = levels
+
+    # pyramid of an SSD array (NaN = NoData)
+    @classmethod
+    def build(cls, arr):
+        level = np.where(np.isnan(arr), -np.inf, arr).astype(np.float32)
+        levels = [level]
+        while level.shape[0] > 1 or level.shape[1] > 1:
+            nrows, ncols = level.shape
+            pad = np.full((nrows + nrows % 2, ncols + ncols % 2), -np.inf, dtype=np.float32)
+            pad[:nrows, :ncols] = level
+            level = pad.reshape(pad.shape[0] // 2, 2, pad.shape[1] // 2, 2).max(axis=(1, 3))
+            levels.append(level)
+        return cls(levels)
+
+    @property
+    def shape(self):
+        return self.levels[0].shape
+
+    # largest SSD among cells more than inner and at most outer (map units) from the
+    # nearest SZ cell, with the SZ given as (row, col) cells of the indexed grid.
+    # With inner=0 that's donut_mask(zone_distance(...), outer) in pssd_engine.
+    # NaN if there is no SSD in range.
+    def max_within(self, sz_rows, sz_cols, outer, cellsize_x, cellsize_y=None, inner=0.0):
+        from scipy.spatial import cKDTree
+        if cellsize_y is None:
+            cellsize_y = cellsize_x
+        tree = cKDTree(np.column_stack((np.asarray(sz_cols) * cellsize_x, np.asarray(sz_rows) * cellsize_y)))
+        nrows, ncols = self.shape
+        top = len(self.levels) - 1
+        heap = [(-float(self.levels[top][0, 0]), top, 0, 0)]
+        while heap:
+            neg_max, level, i, j = heapq.heappop(heap)
+            if neg_max == np.inf:
+                break
+            size = 2 ** level
+            r0, c0 = i * size, j * size
+            r1, c1 = min(r0 + size, nrows) - 1, min(c0 + size, ncols) - 1
+            # distance from the block's middle to the SZ, +- the block's half diagonal
+            center = ((c0 + c1) / 2.0 * cellsize_x, (r0 + r1) / 2.0 * cellsize_y)
+            half = np.hypot((c1 - c0) / 2.0 * cellsize_x, (r1 - r0) / 2.0 * cellsize_y)
+            d = tree.query(center)[0]
+            if d - half > outer or d + half <= inner:
+                continue
+            if level == 0 or (d - half > inner and d + half <= outer):
+                if level > 0 or inner < d <= outer:
+                    return -neg_max
+                continue
+            below = self.levels[level - 1]
+            for ci in (2 * i, 2 * i + 1):
+                for cj in (2 * j, 2 * j + 1):
+                    if ci < below.shape[0] and cj < below.shape[1] and below[ci, cj] > -np.inf:
+                        heapq.heappush(heap, (-float(below[ci, cj]), level - 1, ci, cj))
+        return np.nan
+
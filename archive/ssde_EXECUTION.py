@@ -24,6 +24,14 @@ from time import time
 import os
 import math
 import shutil
+import numpy as np
+import pssd_engine
+import ssd_engine
+import raster_io
+import raster_cache
+import segmentation
+import profiling
+import scratch
 
 arcpy.env.overwriteOutput = True
 arcpy.env.parallelProcessingFactor = "50%"
@@ -38,13 +46,11 @@ except:
 ##############################
 ## create processing folder ##
 ##############################
-processing_dir = sys.argv[7] + "//SSDE_processing" 
-if not os.path.exists(processing_dir):
-        os.mkdir(processing_dir)
+# intermediates are held in memory or a local scratch folder (see scratch.py)
+ws = scratch.Workspace(sys.argv[7], "SSDE_processing")
 
-arcpy.env.workspace = processing_dir
-arcpy.env.scratchWorkspace = processing_dir
-TempFolders = processing_dir
+# wall/CPU time and memory of every stage, reported when the run is done
+prof = profiling.Profiler("ssde")
 
 
 def run_ssde():
@@ -56,12 +62,48 @@ def run_ssde():
     dtm = sys.argv[4]
     wc = sys.argv[5]
     bc = sys.argv[6]
+    # optional: how pSSD is calculated, "ARCPY" (DistanceAccumulation per segment, default)
+    # "KDTREE" (NumPy, distances only for safety zone cells) or "PRUNED" (KDTREE that
+    # skips segments that can't lower pSSD anywhere in the safety zone) or "PYRAMID"
+    # (coarse to fine, exact safest point and SSD met, other pSSD values approximate)
+    # or "PARALLEL" (KDTREE with the segments split over worker processes)
+    pssd_method = "ARCPY"
+    if len(sys.argv) > 11 and sys.argv[11] not in ("", "#"):
+        pssd_method = sys.argv[11].upper()
+    # optional: 'true' to size the buffers to an upper bound of the SSD near the safety
+    # zone (from the tallest vegetation around it) instead of the worst case 9280 m
+    adaptive = len(sys.argv) > 12 and sys.argv[12] == "true"
+    # optional: how the SSD donut is segmented, "MEANSHIFT" (SegmentMeanShift, default),
+    # "NUMPY" (quantized SSD classes and connected components, see segmentation.py,
+    # faster but the segment shapes differ) or "COMPARE" (both, reports their timings
+    # and agreement, then carries on with the mean shift segments)
+    seg_method = "MEANSHIFT"
+    if len(sys.argv) > 13 and sys.argv[13] not in ("", "#"):
+        seg_method = sys.argv[13].upper()
+    # optional: number of worker processes for the PARALLEL pSSD method (default: all cores)
+    pssd_workers = None
+    if len(sys.argv) > 14 and sys.argv[14] not in ("", "#"):
+        pssd_workers = int(sys.argv[14])
+    # optional: output raster with the ID of the segment that gives each cell its pSSD
+    # (ARCPY, KDTREE and PRUNED methods)
+    segment_out = None
+    if len(sys.argv) > 15 and sys.argv[15] not in ("", "#"):
+        segment_out = sys.argv[15]
+    buffer_dist = "9280 Meters"
+    buffer_m = pssd_engine.MAX_SSD
+    if adaptive:
+        with prof.stage("adaptive radius"):
+            radius = raster_io.zone_radius(sz, vh, max(ssd_engine.get_mfl(wc, bc)))
+        buffer_m = math.ceil(radius)
+        buffer_dist = str(buffer_m) + " Meters"
+        arcpy.AddMessage("Processing radius around the safety zone: " + buffer_dist + ".")
     
     ###############################################
     ##   start by buffering SZ to get max extent ##
     ###############################################
-    arcpy.analysis.Buffer(sz, "lrg_buffer.shp", "9280 Meters", "FULL", "ROUND", "ALL")  # won't use this later because it is in the wrong coord. sys. 
-    arcpy.env.extent = arcpy.Describe("lrg_buffer.shp").extent                          # this way the UTM conversions will only be done within this processing extent
+    lrg_buffer = ws.features("lrg_buffer.shp")
+    arcpy.analysis.Buffer(sz, lrg_buffer, buffer_dist, "FULL", "ROUND", "ALL")  # won't use this later because it is in the wrong coord. sys. 
+    arcpy.env.extent = arcpy.Describe(lrg_buffer).extent                          # this way the UTM conversions will only be done within this processing extent
     
     ##############################
     ##   convert to UTM         ## 
@@ -80,27 +122,30 @@ def run_ssde():
     
     # make sure the rasters aren't already in UTM
     # if they are not, convert them, and rename variable to reprojected raster.
-    sr1 = arcpy.Describe(vh).spatialReference
-    sr2 = arcpy.Describe(dtm).spatialReference
-    sr3 = arcpy.Describe(sz).spatialReference
-    if sr1.name != utm_sr.name:
-        arcpy.management.ProjectRaster(vh, 'vh_reproj.tif', utm_sr, "NEAREST") # these need to be written to file, can't just be held in memory.
-        vh = 'vh_reproj.tif'
-        arcpy.AddMessage("Vegetation height raster converted to UTM coordinates.")
-    else:
-        arcpy.AddMessage("Vegetation height raster in UTM coordinates.")
-    if sr2.name != utm_sr.name:
-        arcpy.management.ProjectRaster(dtm, 'dtm_reproj.tif', utm_sr, "BILINEAR")
-        dtm = 'dtm_reproj.tif'
-        arcpy.AddMessage("DTM raster converted to UTM coordinates.")
-    else:
-        arcpy.AddMessage("DTM raster in UTM coordinates.")
-    if sr3.name != utm_sr.name:
-        arcpy.management.Project(sz, "sz_reproj.shp", utm_sr)
-        sz = "sz_reproj.shp"
-        arcpy.AddMessage("Safety zone polygon converted to UTM coordinates.")
-    else:
-        arcpy.AddMessage("Safety zone polygon in UTM coordinates.")
+    with prof.stage("reprojection") as s:
+        sr1 = arcpy.Describe(vh).spatialReference
+        sr2 = arcpy.Describe(dtm).spatialReference
+        sr3 = arcpy.Describe(sz).spatialReference
+        if sr1.name != utm_sr.name:
+            # these need to be written to file, can't just be held in memory. they go through
+            # the raster cache so a repeat run with the same inputs skips the reprojection
+            vh = raster_cache.project_raster(vh, 'vh_reproj.tif', utm_sr, "NEAREST")
+            arcpy.AddMessage("Vegetation height raster converted to UTM coordinates.")
+        else:
+            arcpy.AddMessage("Vegetation height raster in UTM coordinates.")
+        if sr2.name != utm_sr.name:
+            dtm = raster_cache.project_raster(dtm, 'dtm_reproj.tif', utm_sr, "BILINEAR")
+            arcpy.AddMessage("DTM raster converted to UTM coordinates.")
+        else:
+            arcpy.AddMessage("DTM raster in UTM coordinates.")
+        if sr3.name != utm_sr.name:
+            sz_reproj = ws.features("sz_reproj.shp")
+            arcpy.management.Project(sz, sz_reproj, utm_sr)
+            sz = sz_reproj
+            arcpy.AddMessage("Safety zone polygon converted to UTM coordinates.")
+        else:
+            arcpy.AddMessage("Safety zone polygon in UTM coordinates.")
+        s["pixels"] = raster_io.pixel_count(vh)
     arcpy.AddMessage(ctime() + ": Done.")
     # clear the extent to allow geoprocessing to determine appropriate extents
     arcpy.env.extent = None
@@ -140,15 +185,32 @@ def run_ssde():
     # first get a slope raster from the DTM
     # get units
     dtm_linearunit = (arcpy.Describe(dtm).spatialReference.linearUnitName.upper())
-    # get slope raster 
-    slope = Slope(dtm, output_measurement = "PERCENT_RISE", z_unit = dtm_linearunit)
-    # get large buffer with max possible SSD (including SZ)
-    arcpy.analysis.Buffer(sz, "sz_with_lrg_donut_fc.shp", "9280 Meters", "FULL", "ROUND", "ALL")
-    # this EXCLUDES the safety zone
-    arcpy.analysis.Buffer(sz, "lrg_donut_fc.shp", "9280 Meters", "OUTSIDE_ONLY", "ROUND", "ALL")
-    # then EBM slope and veg height to DONUT + SZ (later use EBM to just look at either)
-    vh_ebm = ExtractByMask(vh, "sz_with_lrg_donut_fc.shp")
-    slope_ebm = ExtractByMask(slope, "sz_with_lrg_donut_fc.shp")
+    # get slope raster (cached with the DTM it came from)
+    with prof.stage("slope") as s:
+        slope = Raster(raster_cache.cached([dtm], ["PERCENT_RISE", dtm_linearunit], "slope.tif",
+                                           lambda path: Slope(dtm, output_measurement = "PERCENT_RISE", z_unit = dtm_linearunit).save(path)))
+        s["pixels"] = raster_io.pixel_count(slope)
+    # the safety zone is rasterized once on the vegetation height grid and every
+    # buffer below is a threshold on its distance transform (cell center to nearest
+    # SZ cell center), kept in memory instead of Buffer shapefiles
+    with prof.stage("donut extraction") as s:
+        # vegetation height grid over the SZ plus the processing radius
+        mask_window = raster_io.window_for_extent(vh, sz_extent.XMin - buffer_m, sz_extent.YMin - buffer_m,
+                                                  sz_extent.XMax + buffer_m, sz_extent.YMax + buffer_m)
+        sz_mask = raster_io.polygon_mask(sz, mask_window, ws.raster("sz_mask.tif", mask_window))
+        if not sz_mask.any():
+            # SZ smaller than a cell, the cell under its center stands in for it
+            center = geom_sz.centroid
+            sz_mask[int((mask_window.ymax - center.Y) // mask_window.cellsize_y),
+                    int((center.X - mask_window.xmin) // mask_window.cellsize_x)] = True
+        sz_dist = pssd_engine.zone_distance(sz_mask, mask_window.cellsize_x, mask_window.cellsize_y)
+        # large buffer with max possible SSD (including SZ)
+        sz_with_lrg_donut = raster_io.mask_raster(sz_dist <= buffer_m, mask_window, utm_sr,
+                                                  ws.raster("sz_with_lrg_donut.tif", mask_window))
+        # then EBM slope and veg height to DONUT + SZ (later use EBM to just look at either)
+        vh_ebm = ExtractByMask(vh, sz_with_lrg_donut)
+        slope_ebm = ExtractByMask(slope, sz_with_lrg_donut)
+        s["pixels"] = raster_io.pixel_count(vh_ebm)
     arcpy.AddMessage(ctime() + ": Done.")
     
     ##############################################
@@ -161,24 +223,7 @@ def run_ssde():
     # slope is PER pixel, other two are constant across landscape
     
     ## make a list of multiplactive factor (mf) values to pull from
-    if wc == "Light (0-10 mph)" and bc == "Low":
-        mfl = [0.8, 1, 1, 2]
-    if wc == "Light (0-10 mph)" and bc == "Moderate":
-        mfl = [1,1,1.5,2]
-    if wc == "Light (0-10 mph)" and bc == "Extreme":
-        mfl = [1,1.5,1.5,3]
-    if wc == "Moderate (11-20 mph)" and bc == "Low":
-        mfl = [1.5,2,3,4]
-    if wc == "Moderate (11-20 mph)" and bc == "Moderate":
-        mfl = [2,2,4,6]
-    if wc == "Moderate (11-20 mph)" and bc == "Extreme":
-        mfl = [2,2.5,5,6]
-    if wc == "High (>20 mph)" and bc == "Low":
-        mfl = [2.5,3,4,6]
-    if wc == "High (>20 mph)" and bc == "Moderate":
-        mfl = [3,3,5,7]
-    if wc == "High (>20 mph)" and bc == "Extreme":
-        mfl = [3,4,5,10]
+    mfl = ssd_engine.get_mfl(wc, bc)
     arcpy.AddMessage(ctime() + ": Done.")
     ## use Con to reclassify slope into the delta value for SSD calculation
     arcpy.AddMessage(ctime() + ": Calculating slope/wind factor...")
@@ -187,10 +232,12 @@ def run_ssde():
     where_clause1 = "Value >= 7.5 And Value < 22.5"    #mlf[1]
     where_clause2 = "Value >= 22.5 And Value < 41"     #mlf[2]
     where_clause3 = "Value >= 41"                       #mlf[3]
-    slope_remap = Con(in_conditional_raster, mfl[0],
-        Con(in_conditional_raster, mfl[1],
-            Con(in_conditional_raster, mfl[2],
-                Con(in_conditional_raster, mfl[3], where_clause = where_clause3), where_clause2), where_clause1), where_clause0)
+    with prof.stage("remap") as s:
+        slope_remap = Con(in_conditional_raster, mfl[0],
+            Con(in_conditional_raster, mfl[1],
+                Con(in_conditional_raster, mfl[2],
+                    Con(in_conditional_raster, mfl[3], where_clause = where_clause3), where_clause2), where_clause1), where_clause0)
+        s["pixels"] = raster_io.pixel_count(slope_remap)
     
     arcpy.AddMessage(ctime() + ": Done.")
     
@@ -198,26 +245,15 @@ def run_ssde():
     ##   Change landfire EVH classified values into continous meters     ##
     #######################################################################
     arcpy.AddMessage(ctime() + ": Reclassify LANDFIRE EVH to meters...")
-    # GENERATE REMAP VALUE LIST
+    # GENERATE REMAP VALUE LIST (shared with the NumPy engines, see ssd_engine.py)
     # calculations done on NUMERIC, all final values must be INTEGERS
-    # initiate empty list first
-    vals = []
-    # values 11 thru 100 ==> 0
-    for x in range(11,101):
-        vals.append([x,0])
-    # 101 thru 199 ==> value - 100 meters
-    for x in range(101, 200):
-        vals.append([x, (x-100)*100])
-    # 201 (NO 200) - 230 ==> value - 200 / 10
-    for x in range(201, 231):
-        vals.append([x, int(((x-200)/10.0)*100)])
-    # 301-310 ==> value - 300 / 10
-    for x in range(301,311):
-        vals.append([x,int(((x-300)/10.0)*100)])
+    vals = ssd_engine.evh_remap_values()
     
     ## next need to reclassify EVH to actually be meters
-    vh_reclass = Reclassify(in_raster = vh_ebm,  reclass_field = "Value", remap = RemapValue(vals))
-    vh_meters = Raster(vh_reclass)/100.0
+    with prof.stage("reclass") as s:
+        vh_reclass = Reclassify(in_raster = vh_ebm,  reclass_field = "Value", remap = RemapValue(vals))
+        vh_meters = Raster(vh_reclass)/100.0
+        s["pixels"] = raster_io.pixel_count(vh_meters)
     
     # if you get an error on Reclassify (999999) close Arc and close the python shell if its open. 
     arcpy.AddMessage(ctime() + ": Done.")
@@ -227,58 +263,118 @@ def run_ssde():
     #########################
     arcpy.AddMessage(ctime() + ": Calculating SSD...")
     ## for the entire input safety zone
-    ssd = 8 * vh_meters * slope_remap
+    with prof.stage("ssd") as s:
+        ssd = 8 * vh_meters * slope_remap
+        s["pixels"] = raster_io.pixel_count(ssd)
         
     ## now we just want to look at the donut
     # EBM SSD to the donut
-    ssd_lrg_donut = ExtractByMask(ssd, "lrg_donut_fc.shp")
-    # find the maximum SSD
-    max_ssd_lrg_donut = arcpy.management.GetRasterProperties(ssd_lrg_donut, "MAXIMUM")
-    # make a new smaller donut using the max value
-    max_string = str(max_ssd_lrg_donut) + " Meters"
-    arcpy.analysis.Buffer(sz, "sml_donut_buf_fc.shp", max_string, "OUTSIDE_ONLY", "ROUND", "ALL")
-    # EBM to smaller donut
-    ssd_sml_donut = ExtractByMask(ssd, "sml_donut_buf_fc.shp")
+    with prof.stage("small donut extraction") as s:
+        # maximum SSD in the large donut, one pass over the window the SSD was calculated
+        # on instead of extracting the ring first. The SSD is new every run, so a
+        # max-pyramid (ssd_index.py) would cost a scan to build for a single query.
+        lrg_donut_ssd = raster_io.read_array(ssd, mask_window, np.float32)[pssd_engine.donut_mask(sz_dist, buffer_m)]
+        lrg_donut_ssd = lrg_donut_ssd[np.isfinite(lrg_donut_ssd)]
+        max_ssd_lrg_donut = float(lrg_donut_ssd.max()) if lrg_donut_ssd.size else np.nan
+        if not max_ssd_lrg_donut > 0:
+            arcpy.AddError("No vegetation with SSD around the safety zone.")
+            sys.exit()
+        # make a new smaller donut using the max value (this EXCLUDES the safety zone)
+        sml_donut = raster_io.mask_raster(pssd_engine.donut_mask(sz_dist, max_ssd_lrg_donut), mask_window, utm_sr,
+                                          ws.raster("sml_donut.tif", mask_window))
+        # EBM to smaller donut
+        ssd_sml_donut = ExtractByMask(ssd, sml_donut)
+        s["pixels"] = raster_io.pixel_count(ssd_sml_donut)
     
     arcpy.AddMessage(ctime() + ": Done.")
     ##############################
     ##   image segmentation     ##
     ##############################
     arcpy.AddMessage(ctime() + ": Segmenting SSD raster...")
-    # take smaller donut and use segment mean shift
-    seg_raster = SegmentMeanShift(in_raster = ssd_sml_donut, spectral_detail = 8,
-                                  spatial_detail = 8, min_segment_size = 20,
-                                  max_segment_size = -1)
-    seg_raster.save(sys.argv[7] + "seg_ras.tif")
+    seg_labels = None
+    # on disk, the pSSD loop reads segment IDs from its attribute table
+    seg_ras = ws.disk("seg_ras.tif")
+    if seg_method in ("NUMPY", "COMPARE"):
+        # labels and segment stats stay in memory
+        with prof.stage("segmentation (numpy)") as s:
+            seg_window = raster_io.common_window(ssd_sml_donut)
+            seg_labels, seg_stats = segmentation.segment_ssd(raster_io.read_array(ssd_sml_donut, seg_window))
+            s["pixels"] = seg_labels.size
+            s["segments"] = seg_stats["count"].size
+    if seg_method != "NUMPY":
+        # take smaller donut and use segment mean shift
+        with prof.stage("segmentation") as s:
+            seg_raster = SegmentMeanShift(in_raster = ssd_sml_donut, spectral_detail = 8,
+                                          spatial_detail = 8, min_segment_size = 20,
+                                          max_segment_size = -1)
+            seg_raster.save(seg_ras)
+            s["pixels"] = raster_io.pixel_count(seg_raster)
+    if seg_method == "COMPARE":
+        agreement = segmentation.segment_agreement(raster_io.read_array(seg_raster, seg_window), seg_labels)
+        arcpy.AddMessage("Segment agreement (adjusted Rand index): " + str(round(agreement["adjusted_rand"], 3)) +
+                         ", mean shift segments: " + str(agreement["segments_a"]) +
+                         ", NumPy segments: " + str(agreement["segments_b"]))
+        seg_labels = None
+    elif seg_method == "NUMPY" and pssd_method not in ("KDTREE", "PRUNED", "PYRAMID", "PARALLEL"):
+        # the per-segment Spatial Analyst loop needs the segments as a raster
+        seg_labels_ras = raster_io.write_array(seg_labels, seg_window, ws.raster("seg_labels.tif", seg_window), utm_sr)
+        seg_raster = Raster(seg_labels_ras)
     arcpy.AddMessage(ctime() + ": Done.")
     ##############################
     ##   pSSD calculations      ## 
     ##############################
     arcpy.AddMessage(ctime() + ": Calculating pSSD...")
     
-    ## start by getting the euclidian distance for each segment
-    # get a list of OIDs for each segment/group of segments
-    cursor = arcpy.da.SearchCursor(sys.argv[7] + "seg_ras.tif", ['Value'])
-    segment_ids = []
-    for row in cursor:
-        segment_ids.append(row[0])
-    raslist = []
-    for segment_id in segment_ids:
-        segment = SetNull(seg_raster, 1, "VALUE <> " + str(segment_id))
-        # euclidian distance
-        dist1 = DistanceAccumulation(segment)
-        dist = ExtractByMask(dist1, sz)
-        ssd_ebm = ExtractByMask(ssd_sml_donut, segment)
-        mean_ssd = arcpy.management.GetRasterProperties(ssd_ebm, "MEAN").getOutput(0)
-        # divide euclid. dist. by mean and save
-        pssd = dist/float(mean_ssd)
-        # list of all pSSD rasters for next step
-        raslist.append(pssd)
-        
-    
-    ## use list of pssd rasters to get raster with minimum across all pssds
-    minimum_pssd = CellStatistics(raslist, "MINIMUM")
-    minimum_pssd.save(sys.argv[8])
+    if pssd_method in ("KDTREE", "PRUNED", "PYRAMID", "PARALLEL"):
+        if seg_labels is not None:
+            minimum_pssd = run_pssd_kdtree(sz_mask, mask_window, None, ssd_sml_donut, utm_sr, method = pssd_method,
+                                           labels = seg_labels, window = seg_window, workers = pssd_workers,
+                                           segment_out = segment_out)
+        else:
+            minimum_pssd = run_pssd_kdtree(sz_mask, mask_window, seg_ras, ssd_sml_donut, utm_sr,
+                                           method = pssd_method, workers = pssd_workers, segment_out = segment_out)
+    else:
+        ## start by getting the euclidian distance for each segment
+        # get a list of OIDs for each segment/group of segments
+        if seg_labels is not None:
+            # NumPy segments are numbered 1..n
+            segment_ids = list(range(1, seg_stats["count"].size + 1))
+        else:
+            cursor = arcpy.da.SearchCursor(seg_ras, ['Value'])
+            segment_ids = []
+            for row in cursor:
+                segment_ids.append(row[0])
+        # fold each segment's pSSD into a running minimum (and the segment it came from)
+        # as soon as it's calculated, so only one segment's rasters exist at a time
+        window = raster_io.common_window(seg_raster)
+        best = ws.array((window.nrows, window.ncols), np.float32)
+        best[:] = np.inf
+        best_id = ws.array((window.nrows, window.ncols), np.float32)
+        best_id[:] = np.nan
+        with prof.stage("pssd", segments = len(segment_ids)) as s:
+            for segment_id in segment_ids:
+                segment = SetNull(seg_raster, 1, "VALUE <> " + str(segment_id))
+                # euclidian distance
+                dist1 = DistanceAccumulation(segment)
+                dist = ExtractByMask(dist1, sz)
+                ssd_ebm = ExtractByMask(ssd_sml_donut, segment)
+                mean_ssd = arcpy.management.GetRasterProperties(ssd_ebm, "MEAN").getOutput(0)
+                # divide euclid. dist. by mean and save
+                pssd = dist/float(mean_ssd)
+                # keep the smaller pSSD, like CellStatistics MINIMUM (NoData ignored)
+                arr = raster_io.read_array(pssd, window, np.float32)
+                closer = arr < best
+                best[closer] = arr[closer]
+                best_id[closer] = segment_id
+                del segment, dist1, dist, ssd_ebm, pssd, arr, closer
+            s["pixels"] = len(segment_ids) * raster_io.pixel_count(seg_raster)
+        best[np.isinf(best)] = np.nan
+        best_id[np.isnan(best)] = np.nan
+        # float32 copy for the steps below, the output in the configured encoding
+        minimum_pssd = Raster(raster_io.write_array(best, window, ws.raster("minimum_pssd.tif", window), utm_sr))
+        raster_io.write_array(best, window, sys.argv[8], utm_sr, kind = "pssd")
+        if segment_out is not None:
+            raster_io.write_array(best_id, window, segment_out, utm_sr, kind = "id")
     
     arcpy.AddMessage(ctime() + ": Done.")
     
@@ -287,34 +383,69 @@ def run_ssde():
     ##################################################
     arcpy.AddMessage(ctime() + ": Determining areas where SSD has been met...")
     # use Con to determine areas >1.0 (safe, SSD met) and <1.0 (unsafe, SSD not met)
-    binary_pssd = Con(minimum_pssd, 1, 0, "Value > 1.0")
-    binary_pssd.save(sys.argv[9])
+    with prof.stage("ssd met") as s:
+        binary_pssd = Con(minimum_pssd, 1, 0, "Value > 1.0")
+        raster_io.save_output(binary_pssd, sys.argv[9], "mask")
+        s["pixels"] = raster_io.pixel_count(binary_pssd)
     arcpy.AddMessage(ctime() + ": Done.")
     arcpy.AddMessage(ctime() + ": Getting safest point...")
     # get maximum value of minimum_pssd
-    max_minimum_pssd =  arcpy.management.GetRasterProperties(minimum_pssd, "MAXIMUM").getOutput(0)
-    # set everything that is not the max value to NoData
-    max_pixel_only = SetNull(minimum_pssd, max_minimum_pssd, "VALUE <> " + str(max_minimum_pssd))
-    # convert the new raster to a point (should result in one point)
-    arcpy.conversion.RasterToPoint(max_pixel_only, sys.argv[10])
+    with prof.stage("safest point") as s:
+        max_minimum_pssd =  arcpy.management.GetRasterProperties(minimum_pssd, "MAXIMUM").getOutput(0)
+        # set everything that is not the max value to NoData
+        max_pixel_only = SetNull(minimum_pssd, max_minimum_pssd, "VALUE <> " + str(max_minimum_pssd))
+        # convert the new raster to a point (should result in one point)
+        arcpy.conversion.RasterToPoint(max_pixel_only, sys.argv[10])
+        s["pixels"] = raster_io.pixel_count(minimum_pssd)
     arcpy.AddMessage(ctime() + ": Done.")
     
     # check in sa extension
     arcpy.CheckInExtension("spatial")
 
-# run SSD function
-run_ssde()
-
-    
-
-# clean up files 
-def delete_files():
-    arcpy.Delete_management(processing_dir)
-    seg_ras = Raster(sys.argv[7] + "seg_ras.tif")
-    arcpy.Delete_management(seg_ras)
+def run_pssd_kdtree(sz_mask, mask_window, seg_ras, ssd_sml_donut, utm_sr, method="KDTREE", labels=None, window=None,
+                    workers=None, segment_out=None):
+    ##########################################
+    ##   pSSD with a KD-tree per segment    ##
+    ##########################################
+    # read segments, SSD and the safety zone as arrays on the segment raster grid
+    # and only calculate distances for the cells inside the safety zone
+    # (segments already in memory come with the window they're on). The SZ is the
+    # mask run_ssde made on mask_window, so a SZ smaller than a cell keeps its center cell
+    if labels is None:
+        window = raster_io.common_window(seg_ras)
+        labels = raster_io.read_array(seg_ras, window, np.float32)
+    ssd_arr = raster_io.read_array(ssd_sml_donut, window, np.float32)
+    sz_mask = raster_io.crop_array(sz_mask, mask_window, window, False)
+    stats = {}
+    with prof.stage("pssd", pixels = int(sz_mask.sum())) as s:
+        if method == "PYRAMID":
+            minimum_pssd = pssd_engine.minimum_pssd_pyramid(labels, ssd_arr, sz_mask, window.cellsize_x,
+                                                            window.cellsize_y, stats = stats)
+            s["evaluated"] = stats["evaluated"]
+        elif method == "PARALLEL":
+            minimum_pssd = pssd_engine.minimum_pssd_parallel(labels, ssd_arr, sz_mask, window.cellsize_x,
+                                                             window.cellsize_y, workers = workers, stats = stats)
+            s["segments"] = stats["evaluated"]
+            s["workers"] = stats.get("workers", 1)
+        else:
+            minimum_pssd, segment = pssd_engine.minimum_pssd_kdtree(labels, ssd_arr, sz_mask, window.cellsize_x,
+                                                                    window.cellsize_y, prune = method == "PRUNED",
+                                                                    stats = stats, return_segment = True)
+            s["segments"] = stats["evaluated"]
+            if segment_out is not None:
+                raster_io.write_array(segment, window, segment_out, utm_sr, kind = "id")
+    if method == "PRUNED":
+        arcpy.AddMessage(str(stats["pruned"]) + " of " + str(stats["segments"]) + " segments pruned.")
+    elif method == "PYRAMID":
+        arcpy.AddMessage("pSSD evaluated exactly at " + str(stats["evaluated"]) + " of " + str(stats["cells"]) + " safety zone cells.")
+    # float32 copy for the steps after, the output in the configured encoding
+    out = raster_io.write_array(minimum_pssd, window, ws.raster("minimum_pssd.tif", window), utm_sr)
+    raster_io.write_array(minimum_pssd, window, sys.argv[8], utm_sr, kind = "pssd")
+    return Raster(out)
 
+# run SSD function, the intermediates (donut masks included) are deleted even if it stops early
 try:
-    delete_files()
-except:
-    arcpy.AddError("Could not delete temporary files.")
-    sys.exit()
+    run_ssde()
+    prof.report(arcpy.AddMessage)
+finally:
+    ws.close()
@@ -28,6 +28,11 @@
             self.params[7].enabled = True
             self.params[8].enabled = True
             self.params[9].enabled = True
+            self.params[10].enabled = True
+            self.params[11].enabled = True
+            self.params[12].enabled = True
+            self.params[13].enabled = True
+            self.params[14].enabled = True
             self.params[1].enabled = True
         else:
             self.params[2].enabled = False
@@ -38,6 +43,11 @@
             self.params[7].enabled = False
             self.params[8].enabled = False
             self.params[9].enabled = False
+            self.params[10].enabled = False
+            self.params[11].enabled = False
+            self.params[12].enabled = False
+            self.params[13].enabled = False
+            self.params[14].enabled = False
             self.params[1].enabled = False
             
         
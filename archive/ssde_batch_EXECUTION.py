@@ -0,0 +1,267 @@
+## The University of Utah and the operator of this website (along with their employees or agents) are not responsible
+## for any decisions or results of the decisions that you make. You assume all risk arising from reliance on this
+## website and, by using this website you agree to hold the University of Utah and the operation of the website harmless
+## for damages arising out of your actions, whether or not in reliance on information provided through the website.
+
+## The information provided through the website application is given “as is”. To the maximum extent permitted by applicable
+## law, the University of Utah and the operator of the website disclaim all representations and warranties, expressed or
+## implied, with respect to such information, services, products, and materials, including without limitation any implied
+## warranties or merchantability, fitness for a particular purpose and noninfringement. In no event will the University of
+## Utah or website operator be liable for any consequential, indirect, incidental, special, or punitive damages, however
+## caused and under any theory of liability (including negligence), arising from your use of the website or the provision
+## of the information, services, products, and materials provided to or by the University of Utah or the website operator,
+## even if the University of Utah or website operator has been advised of the possibility of such damages.
+
+
+## SSDE for every polygon in a feature class. Reprojection, slope and SSD are done
+## once over the union of all the buffered safety zones, then each safety zone gets
+## its own pSSD, SSD met raster and safest point from those shared arrays.
+
+## import relevant packages
+
+import arcpy
+import sys
+from arcpy import env
+from arcpy.sa import *
+from time import ctime
+from concurrent.futures import ThreadPoolExecutor
+import os
+import csv
+import math
+import numpy as np
+import ssd_engine
+import ssd_index
+import pssd_engine
+import raster_io
+import raster_cache
+import segmentation
+import profiling
+import scratch
+
+arcpy.env.overwriteOutput = True
+arcpy.env.parallelProcessingFactor = "50%"
+
+try:
+    # check out sa extension
+    arcpy.CheckOutExtension("spatial")
+except:
+    arcpy.AddError("Could not check out Spatial Analyst license. Are you licensed to use this extension?")
+    sys.exit()
+
+##############################
+## create processing folder ##
+##############################
+# intermediates are held in memory or a local scratch folder (see scratch.py)
+ws = scratch.Workspace(sys.argv[7], "SSDE_batch_processing")
+
+# wall/CPU time and memory of every stage, reported when the run is done
+prof = profiling.Profiler("ssde_batch")
+
+
+def run_ssde_batch():
+    ##############################
+    ## get parameters from tool ##
+    ##############################
+    sz = sys.argv[2]
+    vh = sys.argv[3]
+    dtm = sys.argv[4]
+    wc = sys.argv[5]
+    bc = sys.argv[6]
+    out_dir = sys.argv[8]
+    # optional: number of safety zones evaluated at the same time
+    workers = max(1, (os.cpu_count() or 2) // 2)
+    if len(sys.argv) > 9 and sys.argv[9] not in ("", "#"):
+        workers = int(sys.argv[9])
+    # optional: 'true' to evaluate every wind speed/burning condition scenario (wc and bc are ignored)
+    scenarios = [(wc, bc)]
+    if len(sys.argv) > 10 and sys.argv[10] == "true":
+        scenarios = ssd_engine.SCENARIOS
+    # optional: "NUMPY" to segment with segmentation.py instead of SegmentMeanShift
+    # (faster, nothing written to disk, segment shapes differ)
+    seg_method = "MEANSHIFT"
+    if len(sys.argv) > 11 and sys.argv[11] not in ("", "#"):
+        seg_method = sys.argv[11].upper()
+    # optional: "PYRAMID" for coarse to fine pSSD (exact safest point and SSD met,
+    # other pSSD values approximate) instead of the pruned KD-tree
+    pssd_method = "PRUNED"
+    if len(sys.argv) > 12 and sys.argv[12] not in ("", "#"):
+        pssd_method = sys.argv[12].upper()
+    if not os.path.exists(out_dir):
+        os.mkdir(out_dir)
+
+    ###############################################
+    ##   buffer ALL SZs to get the union extent  ##
+    ###############################################
+    lrg_buffer = ws.features("lrg_buffer.shp")
+    arcpy.analysis.Buffer(sz, lrg_buffer, "9280 Meters", "FULL", "ROUND", "ALL")
+    arcpy.env.extent = arcpy.Describe(lrg_buffer).extent
+
+    ##############################
+    ##   convert to UTM         ##
+    ##############################
+    arcpy.AddMessage(ctime() + ": Converting coordinate systems...")
+    # UTM zone from the center of the union of the buffered safety zones
+    buf_ext = arcpy.Describe(lrg_buffer).extent
+    pt = arcpy.PointGeometry(arcpy.Point((buf_ext.XMin + buf_ext.XMax)/2, (buf_ext.YMin + buf_ext.YMax)/2),
+                             arcpy.Describe(lrg_buffer).spatialReference).projectAs(arcpy.SpatialReference(4326))
+    utm_num = (math.floor((pt.firstPoint.X + 180)/6 )%60) + 1
+    epsg_code = utm_num + 26900
+    utm_sr = arcpy.SpatialReference(epsg_code)
+
+    with prof.stage("reprojection") as s:
+        if arcpy.Describe(vh).spatialReference.name != utm_sr.name:
+            vh = raster_cache.project_raster(vh, 'vh_reproj.tif', utm_sr, "NEAREST")
+        arcpy.env.snapRaster = vh
+        if arcpy.Describe(dtm).spatialReference.name != utm_sr.name or not raster_io.is_aligned(vh, dtm):
+            dtm = raster_cache.project_raster(dtm, 'dtm_reproj.tif', utm_sr, "BILINEAR", arcpy.Describe(vh).meanCellWidth)
+        arcpy.env.snapRaster = None
+        if arcpy.Describe(sz).spatialReference.name != utm_sr.name:
+            sz_reproj = ws.features("sz_reproj.shp")
+            arcpy.management.Project(sz, sz_reproj, utm_sr)
+            sz = sz_reproj
+        s["pixels"] = raster_io.pixel_count(vh)
+    arcpy.env.extent = None
+    arcpy.AddMessage(ctime() + ": Done.")
+
+    #########################################
+    ##   SSD once for all safety zones     ##
+    #########################################
+    arcpy.AddMessage(ctime() + ": Calculating SSD...")
+    with prof.stage("ssd") as s:
+        # only the rasters under the buffered safety zones (plus a cell, the window keeps
+        # whole cells), the inputs may cover far more
+        sz_ext = arcpy.Describe(sz).extent
+        buf = pssd_engine.MAX_SSD + arcpy.Describe(vh).meanCellWidth
+        buf_ext = arcpy.Extent(sz_ext.XMin - buf, sz_ext.YMin - buf, sz_ext.XMax + buf, sz_ext.YMax + buf)
+        window = raster_io.common_window(vh, dtm, extent = buf_ext)
+        evh = raster_io.read_array(vh, window, np.float32)
+        cls = raster_cache.slope_class_array(dtm, window, utm_sr)
+        # one band per scenario, slope class and vegetation height are shared
+        ssd_stack = ssd_engine.compute_ssd_scenarios_from_class(evh, cls, scenarios)
+        del evh, cls
+        # max-pyramid per scenario for the large donut maximum of every zone
+        pyramids = [ssd_index.MaxPyramid.build(band) for band in ssd_stack]
+        s["pixels"] = int(ssd_stack.size)
+    arcpy.AddMessage(ctime() + ": Done.")
+
+    ##################################################
+    ##   donuts and segmentation for each SZ        ##
+    ##################################################
+    # arcpy isn't thread safe, so segmentation runs here one zone at a time
+    pad = int(math.ceil(pssd_engine.MAX_SSD / min(window.cellsize_x, window.cellsize_y))) + 1
+    zones = []
+    oid_field = arcpy.Describe(sz).OIDFieldName
+    with arcpy.da.SearchCursor(sz, ["OID@", "SHAPE@"]) as cursor:
+        zone_extents = [(row[0], row[1].extent) for row in cursor]
+    for oid, ext in zone_extents:
+        # zone extent plus the largest possible SSD, in cells of the SSD grid
+        r0 = int(math.floor((window.ymax - ext.YMax) / window.cellsize_y)) - pad
+        r1 = int(math.ceil((window.ymax - ext.YMin) / window.cellsize_y)) + pad
+        c0 = int(math.floor((ext.XMin - window.xmin) / window.cellsize_x)) - pad
+        c1 = int(math.ceil((ext.XMax - window.xmin) / window.cellsize_x)) + pad
+        if r0 < 0 or c0 < 0 or r1 > window.nrows or c1 > window.ncols:
+            arcpy.AddWarning("Rasters may not cover the full 9280 m around safety zone " + str(oid) + ".")
+        r0, r1 = max(0, r0), min(window.nrows, r1)
+        c0, c1 = max(0, c0), min(window.ncols, c1)
+        if r1 <= r0 or c1 <= c0:
+            arcpy.AddWarning("Safety zone " + str(oid) + " is outside the rasters, skipped.")
+            continue
+        sub = window.sub(r0, c0, r1 - r0, c1 - c0)
+        # each zone is rasterized on its own, so zones that overlap all keep their shared cells
+        with prof.stage("rasterize safety zone", zone = str(oid), pixels = sub.nrows * sub.ncols):
+            zone_layer = arcpy.management.MakeFeatureLayer(
+                sz, "zone_" + str(oid), arcpy.AddFieldDelimiters(sz, oid_field) + " = " + str(oid))
+            sz_mask = raster_io.polygon_mask(zone_layer, sub, ws.raster("zone_mask.tif", sub))
+            arcpy.management.Delete(zone_layer)
+        rows, cols = np.nonzero(sz_mask)
+        if rows.size == 0:
+            arcpy.AddWarning("Safety zone " + str(oid) + " is smaller than a cell, skipped.")
+            continue
+        # cells of the zone on the full SSD grid, for the large donut maximum
+        rows, cols = rows + r0, cols + c0
+        dist = pssd_engine.zone_distance(sz_mask, sub.cellsize_x, sub.cellsize_y)
+
+        for band, (scen_wc, scen_bc) in enumerate(scenarios):
+            # output names get the scenario added when there's more than one
+            name = str(oid)
+            if len(scenarios) > 1:
+                name = name + "_" + ssd_engine.scenario_name(scen_wc, scen_bc)
+            arcpy.AddMessage(ctime() + ": Segmenting SSD around safety zone " + name + "...")
+            with prof.stage("donut extraction", zone = name, pixels = int(dist.size)):
+                ssd_sub = ssd_stack[band, r0:r1, c0:c1]
+                max_ssd = pyramids[band].max_within(rows, cols, pssd_engine.MAX_SSD, window.cellsize_x, window.cellsize_y)
+                if not max_ssd > 0:
+                    arcpy.AddWarning("No vegetation with SSD around safety zone " + name + ", skipped.")
+                    continue
+                ssd_sml_donut = np.where(pssd_engine.donut_mask(dist, max_ssd), ssd_sub, np.nan)
+                if seg_method != "NUMPY":
+                    donut_ras = raster_io.write_array(ssd_sml_donut, sub, ws.raster("ssd_donut_" + name + ".tif", sub), utm_sr)
+            with prof.stage("segmentation", zone = name, pixels = int(dist.size)) as s:
+                if seg_method == "NUMPY":
+                    labels, _ = segmentation.segment_ssd(ssd_sml_donut)
+                else:
+                    seg_raster = SegmentMeanShift(in_raster = donut_ras, spectral_detail = 8,
+                                                  spatial_detail = 8, min_segment_size = 20,
+                                                  max_segment_size = -1)
+                    labels = raster_io.read_array(seg_raster, sub, np.float32)
+                s["segments"] = int(np.unique(labels[np.isfinite(labels)]).size)
+            zones.append((oid, name, scen_wc, scen_bc, sub, sz_mask, ssd_sml_donut, labels))
+
+    ##############################
+    ##   pSSD for every SZ      ##
+    ##############################
+    arcpy.AddMessage(ctime() + ": Calculating pSSD for " + str(len(zones)) + " safety zones...")
+    def zone_pssd(zone):
+        oid, name, scen_wc, scen_bc, sub, sz_mask, ssd_sml_donut, labels = zone
+        if pssd_method == "PYRAMID":
+            return pssd_engine.minimum_pssd_pyramid(labels, ssd_sml_donut, sz_mask, sub.cellsize_x, sub.cellsize_y)
+        return pssd_engine.minimum_pssd_kdtree(labels, ssd_sml_donut, sz_mask, sub.cellsize_x, sub.cellsize_y,
+                                               prune = True)
+    with prof.stage("pssd", segments = sum(int(np.unique(z[7][np.isfinite(z[7])]).size) for z in zones)) as s:
+        with ThreadPoolExecutor(max_workers = workers) as pool:
+            results = list(pool.map(zone_pssd, zones))
+        s["pixels"] = sum(int(z[5].sum()) for z in zones)
+    arcpy.AddMessage(ctime() + ": Done.")
+
+    ##################################################
+    ##   outputs: one set per SZ + summary table    ##
+    ##################################################
+    arcpy.AddMessage(ctime() + ": Writing outputs...")
+    with prof.stage("outputs", pixels = sum(int(z[6].size) for z in zones)):
+        summary = []
+        for (oid, name, scen_wc, scen_bc, sub, sz_mask, ssd_sml_donut, labels), minimum_pssd in zip(zones, results):
+            raster_io.write_array(minimum_pssd, sub, os.path.join(out_dir, "pSSD_" + name + ".tif"), utm_sr, kind = "pssd")
+            binary_pssd = np.where(np.isnan(minimum_pssd), np.nan, minimum_pssd > 1.0)
+            raster_io.write_array(binary_pssd, sub, os.path.join(out_dir, "SSD_met_" + name + ".tif"), utm_sr, kind = "mask")
+
+            # safest point(s): every cell with the maximum pSSD
+            point_fc = os.path.join(out_dir, "safest_point_" + name + ".shp")
+            arcpy.management.CreateFeatureclass(out_dir, "safest_point_" + name + ".shp", "POINT", spatial_reference = utm_sr)
+            arcpy.management.AddField(point_fc, "grid_code", "DOUBLE")
+            max_pssd = np.nan
+            safest = (np.nan, np.nan)
+            if np.isfinite(minimum_pssd).any():
+                max_pssd = np.nanmax(minimum_pssd)
+                with arcpy.da.InsertCursor(point_fc, ["SHAPE@XY", "grid_code"]) as cursor:
+                    for r, c in zip(*np.nonzero(minimum_pssd == max_pssd)):
+                        xy = (sub.xmin + (c + 0.5) * sub.cellsize_x, sub.ymax - (r + 0.5) * sub.cellsize_y)
+                        cursor.insertRow([xy, float(max_pssd)])
+                        safest = xy
+            met = np.count_nonzero(binary_pssd == 1)
+            summary.append([oid, scen_wc, scen_bc, int(sz_mask.sum()), met, met / float(sz_mask.sum()), max_pssd, safest[0], safest[1]])
+
+        with open(os.path.join(out_dir, "ssde_summary.csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["oid", "wind_speed", "burning_condition", "sz_cells", "ssd_met_cells", "ssd_met_fraction", "max_pssd", "safest_x", "safest_y"])
+            writer.writerows(summary)
+    arcpy.AddMessage(ctime() + ": Done.")
+
+    # check in sa extension
+    arcpy.CheckInExtension("spatial")
+
+# run batch SSDE function, the intermediates are deleted even if it stops early
+try:
+    run_ssde_batch()
+    prof.report(arcpy.AddMessage)
+finally:
+    ws.close()
@@ -0,0 +1,50 @@
+class ToolValidator:
+  # Class to add custom behavior and properties to the tool and tool parameters.
+
+    def __init__(self):
+        # set self.params for use in other function
+        self.params = arcpy.GetParameterInfo()
+
+    def initializeParameters(self):
+        # Customize parameter properties.
+        # This gets called when the tool is opened.
+        return
+
+    def updateParameters(self):
+        # Modify parameter values and properties.
+        # This gets called each time a parameter is modified, before
+        # standard validation.
+        # 0 terms, 1 safety zones, 2 vegetation height, 3 DTM, 4 wind speed, 5 burning condition,
+        # 6 workspace, 7 output folder, 8 workers, 9 all scenarios, 10 segmentation, 11 pSSD method
+        if self.params[6].altered and not self.params[7].altered:
+            self.params[7].value = self.params[6].valueAsText + "\\SSDE_batch"
+
+        for i in range(1, 12):
+            self.params[i].enabled = self.params[0].value == True
+
+        # every scenario is evaluated, wind speed and burning condition aren't used
+        if self.params[9].value == True:
+            self.params[4].enabled = False
+            self.params[5].enabled = False
+
+        return
+
+    def updateMessages(self):
+        # Customize messages for the parameters.
+        # This gets called after standard validation.
+        if self.params[8].value is not None and self.params[8].value < 1:
+            self.params[8].setErrorMessage("Use at least 1 worker.")
+        if self.params[9].value != True:
+            for i in (4, 5):
+                if self.params[i].enabled and not self.params[i].value:
+                    self.params[i].setErrorMessage("Required unless all scenarios are evaluated.")
+        return
+
+    # def isLicensed(self):
+    #     # set tool isLicensed.
+    # return True
+
+    # def postExecute(self):
+    #     # This method takes place after outputs are processed and
+    #     # added to the display.
+    # return
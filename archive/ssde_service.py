@@ -0,0 +1,355 @@
+## The University of Utah and the operator of this website (along with their employees or agents) are not responsible
+## for any decisions or results of the decisions that you make. You assume all risk arising from reliance on this
+## website and, by using this website you agree to hold the University of Utah and the operation of the website harmless
+## for damages arising out of your actions, whether or not in reliance on information provided through the website.
+
+## The information provided through the website application is given “as is”. To the maximum extent permitted by applicable
+## law, the University of Utah and the operator of the website disclaim all representations and warranties, expressed or
+## implied, with respect to such information, services, products, and materials, including without limitation any implied
+## warranties or merchantability, fitness for a particular purpose and noninfringement. In no event will the University of
+## Utah or website operator be liable for any consequential, indirect, incidental, special, or punitive damages, however
+## caused and under any theory of liability (including negligence), arising from your use of the website or the provision
+## of the information, services, products, and materials provided to or by the University of Utah or the website operator,
+## even if the University of Utah or website operator has been advised of the possibility of such damages.
+
+
+
+## long-running SSDE service for one incident. EVH and DTM are read, reprojected to
+## UTM, turned into slope classes and SSD for every wind speed/burning condition once
+## at start-up; after that each safety zone is pure NumPy on the arrays in memory
+## (donuts, segmentation.py segments, pssd_engine pSSD), so a zone sketched by an
+## operator comes back in well under a second instead of a cold tool run.
+##
+##   python ssde_service.py EVH.tif DTM.tif [--host localhost] [--port 8790] [--workers 4] [--queue 16]
+##
+##   GET  /status    incident grid, scenarios and request counts
+##   POST /evaluate  {"rings": [[[x, y], [x, y], ...]], "wkid": 4326,
+##                    "wind_speed": "High", "burning_condition": "Low",
+##                    "pssd_method": "PRUNED"}            (or "KDTREE", "PYRAMID")
+##        -> SZ cells, SSD met cells and fraction, max pSSD and the safest point(s)
+##           in the coordinate system the rings were sent in
+##        -> 400 {"error": ...} for a malformed request, 500 if the evaluation breaks
+##
+## At most workers zones are evaluated at once and queue more wait; anything past
+## that gets a 503 straight away so a busy service never piles up work.
+
+## import relevant packages
+import json
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pssd_engine
+import segmentation
+import ssd_engine
+import ssd_index
+
+DEFAULT_PORT = 8790
+DEFAULT_QUEUE = 16
+PSSD_METHODS = ("PRUNED", "KDTREE", "PYRAMID")
+
+
+class ServiceError(Exception):
+    pass
+
+
+##############################
+##   rasterize a polygon    ##
+##############################
+# cells of window whose centers are inside the polygon rings (even-odd, so holes
+# work), the same cells PolygonToRaster CELL_CENTER gives. Returns the mask and
+# the (row, col) of its top left cell, only the polygon's bounding box is scanned.
+def polygon_cells(rings, window):
+    xs = np.concatenate([np.asarray(ring, dtype=np.float64)[:, 0] for ring in rings])
+    ys = np.concatenate([np.asarray(ring, dtype=np.float64)[:, 1] for ring in rings])
+    c0 = max(0, int(math.floor((xs.min() - window.xmin) / window.cellsize_x)))
+    c1 = min(window.ncols, int(math.ceil((xs.max() - window.xmin) / window.cellsize_x)))
+    r0 = max(0, int(math.floor((window.ymax - ys.max()) / window.cellsize_y)))
+    r1 = min(window.nrows, int(math.ceil((window.ymax - ys.min()) / window.cellsize_y)))
+    if c1 <= c0 or r1 <= r0:
+        return np.zeros((0, 0), dtype=bool), (0, 0)
+    x = window.xmin + (np.arange(c0, c1) + 0.5) * window.cellsize_x
+    y = window.ymax - (np.arange(r0, r1) + 0.5) * window.cellsize_y
+    x, y = np.meshgrid(x, y)
+    inside = np.zeros(x.shape, dtype=bool)
+    for ring in rings:
+        ring = np.asarray(ring, dtype=np.float64)
+        for (x1, y1), (x2, y2) in zip(ring, np.roll(ring, -1, axis=0)):
+            if y1 == y2:
+                continue
+            crosses = (y1 > y) != (y2 > y)
+            inside ^= crosses & (x < x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+    return inside, (r0, c0)
+
+
+# evaluate arguments from a request body, ServiceError says what's wrong with it.
+# rings is a list of rings, each at least 3 [x, y] points.
+def parse_request(request):
+    if not isinstance(request, dict):
+        raise ServiceError("The request must be a JSON object.")
+    rings = request.get("rings")
+    if not isinstance(rings, list) or not rings:
+        raise ServiceError("rings must be a list of rings.")
+    for ring in rings:
+        if not isinstance(ring, list) or len(ring) < 3:
+            raise ServiceError("Each ring must be a list of at least 3 [x, y] points.")
+        for point in ring:
+            if (not isinstance(point, list) or len(point) != 2 or
+                    not all(isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v) for v in point)):
+                raise ServiceError("Ring points must be [x, y] pairs of numbers, got " + json.dumps(point) + ".")
+    wkid = request.get("wkid")
+    if wkid is not None and (not isinstance(wkid, int) or isinstance(wkid, bool)):
+        raise ServiceError("wkid must be an integer.")
+    pssd_method = str(request.get("pssd_method", "PRUNED")).upper()
+    if pssd_method not in PSSD_METHODS:
+        raise ServiceError("Unknown pssd_method " + pssd_method + ", use one of " + ", ".join(PSSD_METHODS) + ".")
+    return (rings, wkid, request.get("wind_speed", "Moderate"), request.get("burning_condition", "Moderate"),
+            pssd_method)
+
+
+##############################
+##   the incident           ##
+##############################
+# SSD for every scenario on a UTM window, plus what's needed to evaluate zones on it.
+# project(rings, wkid) and unproject(points, wkid) move coordinates to and from the
+# window's coordinate system (both None when everything is sent in UTM).
+class Incident:
+    def __init__(self, window, ssd_stack, epsg, project=None, unproject=None):
+        self.window = window
+        self.ssd_stack = ssd_stack
+        self.epsg = epsg
+        self.project = project
+        self.unproject = unproject
+        # max-pyramid per scenario for the large donut maximum
+        self.pyramids = [ssd_index.MaxPyramid.build(band) for band in ssd_stack]
+        self.pad = int(math.ceil(pssd_engine.MAX_SSD / min(window.cellsize_x, window.cellsize_y))) + 1
+
+    # evaluate one safety zone, the rings in wkid coordinates
+    def evaluate(self, rings, wkid=None, wind_speed="Moderate", burning_condition="Moderate", pssd_method="PRUNED"):
+        start = time.perf_counter()
+        if pssd_method not in PSSD_METHODS:
+            raise ServiceError("Unknown pssd_method " + str(pssd_method) + ".")
+        scenario = ssd_engine.find_scenario(wind_speed, burning_condition)
+        band = ssd_engine.SCENARIOS.index(scenario)
+        if wkid not in (None, self.epsg):
+            if self.project is None:
+                raise ServiceError("Send the rings in EPSG " + str(self.epsg) + ".")
+            rings = self.project(rings, wkid)
+        window = self.window
+        inside, (r, c) = polygon_cells(rings, window)
+        if not inside.any():
+            raise ServiceError("The safety zone is outside the rasters or smaller than a cell.")
+
+        # the zone with everything within the largest SSD around it, like ssde_batch
+        rows, cols = np.nonzero(inside)
+        rows, cols = rows + r, cols + c
+        r0, r1 = max(0, rows.min() - self.pad), min(window.nrows, rows.max() + self.pad + 1)
+        c0, c1 = max(0, cols.min() - self.pad), min(window.ncols, cols.max() + self.pad + 1)
+        sub = window.sub(r0, c0, r1 - r0, c1 - c0)
+        sz_mask = np.zeros((r1 - r0, c1 - c0), dtype=bool)
+        sz_mask[rows - r0, cols - c0] = True
+        dist = pssd_engine.zone_distance(sz_mask, sub.cellsize_x, sub.cellsize_y)
+        ssd_sub = self.ssd_stack[band, r0:r1, c0:c1]
+        max_ssd = self.pyramids[band].max_within(rows, cols, pssd_engine.MAX_SSD, window.cellsize_x, window.cellsize_y)
+        if not max_ssd > 0:
+            raise ServiceError("No vegetation with SSD around the safety zone.")
+        ssd_sml_donut = np.where(pssd_engine.donut_mask(dist, max_ssd), ssd_sub, np.nan)
+        labels, _ = segmentation.segment_ssd(ssd_sml_donut)
+        if pssd_method == "PYRAMID":
+            minimum_pssd = pssd_engine.minimum_pssd_pyramid(labels, ssd_sml_donut, sz_mask, sub.cellsize_x, sub.cellsize_y)
+        else:
+            minimum_pssd = pssd_engine.minimum_pssd_kdtree(labels, ssd_sml_donut, sz_mask, sub.cellsize_x, sub.cellsize_y,
+                                                           prune = pssd_method == "PRUNED")
+
+        sz_cells = int(sz_mask.sum())
+        met = int(np.count_nonzero(minimum_pssd > 1.0))
+        result = {"wind_speed": scenario[0], "burning_condition": scenario[1], "sz_cells": sz_cells,
+                  "ssd_met_cells": met, "ssd_met_fraction": met / float(sz_cells),
+                  "max_ssd": float(max_ssd), "max_pssd": None, "safest_points": []}
+        if np.isfinite(minimum_pssd).any():
+            max_pssd = np.nanmax(minimum_pssd)
+            safe_rows, safe_cols = np.nonzero(minimum_pssd == max_pssd)
+            points = [[float(sub.xmin + (sc + 0.5) * sub.cellsize_x), float(sub.ymax - (sr + 0.5) * sub.cellsize_y)]
+                      for sr, sc in zip(safe_rows, safe_cols)]
+            if wkid not in (None, self.epsg):
+                points = self.unproject(points, wkid)
+            result["max_pssd"] = float(max_pssd)
+            result["safest_points"] = points
+        result["seconds"] = round(time.perf_counter() - start, 4)
+        return result
+
+
+# read, reproject and compute SSD for every scenario (the only arcpy part, run once)
+def load_incident(vh, dtm, log=print):
+    import arcpy
+    import raster_io
+    import raster_warp
+    d = arcpy.Describe(vh)
+    center = arcpy.PointGeometry(arcpy.Point((d.extent.XMin + d.extent.XMax) / 2, (d.extent.YMin + d.extent.YMax) / 2),
+                                 d.spatialReference).projectAs(arcpy.SpatialReference(4326))
+    epsg = (math.floor((center.firstPoint.X + 180) / 6) % 60) + 1 + 26900
+    utm_sr = arcpy.SpatialReference(epsg)
+    log("Reading and reprojecting to EPSG " + str(epsg) + "...")
+    if d.spatialReference.name == utm_sr.name:
+        window = raster_io.common_window(vh)
+    else:
+        window = raster_warp.target_window(d.extent, utm_sr, raster_warp.cellsize_meters(vh))
+    evh = raster_warp.read_reprojected(vh, window, utm_sr, "NEAREST")
+    dtm_arr = raster_warp.read_reprojected(dtm, window.grow(1), utm_sr, "BILINEAR")
+    cls = ssd_engine.slope_class(ssd_engine.slope_percent(dtm_arr, window.cellsize_x, window.cellsize_y)[1:-1, 1:-1])
+    del dtm_arr
+    log("Calculating SSD for every scenario on " + str(window.nrows) + " x " + str(window.ncols) + " cells...")
+    ssd_stack = ssd_engine.compute_ssd_scenarios_from_class(evh, cls)
+    del evh, cls
+
+    # arcpy geometry isn't thread safe, the workers take turns projecting
+    lock = threading.Lock()
+    def project(rings, wkid):
+        with lock:
+            sr = arcpy.SpatialReference(int(wkid))
+            parts = arcpy.Array([arcpy.Array([arcpy.Point(x, y) for x, y in ring]) for ring in rings])
+            polygon = arcpy.Polygon(parts, sr).projectAs(utm_sr)
+            # a part lists its outer ring then each hole, separated by None; they stay
+            # separate rings so polygon_cells leaves the holes out
+            out = []
+            for part in polygon:
+                ring = []
+                for p in list(part) + [None]:
+                    if p is not None:
+                        ring.append([p.X, p.Y])
+                    elif ring:
+                        out.append(ring)
+                        ring = []
+            return out
+    def unproject(points, wkid):
+        with lock:
+            sr = arcpy.SpatialReference(int(wkid))
+            out = []
+            for x, y in points:
+                p = arcpy.PointGeometry(arcpy.Point(x, y), utm_sr).projectAs(sr).firstPoint
+                out.append([p.X, p.Y])
+            return out
+    return Incident(window, ssd_stack, epsg, project, unproject)
+
+
+##############################
+##   HTTP                   ##
+##############################
+class Service:
+    def __init__(self, incident, workers, queue=DEFAULT_QUEUE):
+        self.incident = incident
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers = workers)
+        # running + waiting requests, past this the service answers 503
+        self.slots = threading.BoundedSemaphore(workers + queue)
+        self.capacity = workers + queue
+        self.lock = threading.Lock()
+        self.counts = {"served": 0, "failed": 0, "rejected": 0, "in_progress": 0}
+
+    def count(self, key, n=1):
+        with self.lock:
+            self.counts[key] += n
+
+    def status(self):
+        w = self.incident.window
+        with self.lock:
+            counts = dict(self.counts)
+        return {"epsg": self.incident.epsg, "rows": w.nrows, "cols": w.ncols,
+                "cellsize": [w.cellsize_x, w.cellsize_y],
+                "extent": [w.xmin, w.ymax - w.nrows * w.cellsize_y, w.xmin + w.ncols * w.cellsize_x, w.ymax],
+                "scenarios": [list(s) for s in ssd_engine.SCENARIOS], "workers": self.workers,
+                "queue": self.capacity - self.workers, "requests": counts}
+
+    # evaluate a request on the pool, returns (HTTP code, JSON body)
+    def evaluate(self, request):
+        try:
+            args = parse_request(request)
+        except ServiceError as e:
+            self.count("failed")
+            return 400, {"error": str(e)}
+        if not self.slots.acquire(blocking = False):
+            self.count("rejected")
+            return 503, {"error": "Service busy, try again."}
+        self.count("in_progress")
+        try:
+            result = self.pool.submit(self.incident.evaluate, *args).result()
+            self.count("served")
+            return 200, result
+        except (ServiceError, ValueError) as e:
+            # unknown scenario, zone outside the rasters, ...
+            self.count("failed")
+            return 400, {"error": str(e)}
+        except Exception as e:
+            self.count("failed")
+            print("Evaluation failed: " + repr(e), file = sys.stderr)
+            return 500, {"error": "Evaluation failed: " + str(e)}
+        finally:
+            self.count("in_progress", -1)
+            self.slots.release()
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def send_json(self, obj, code=200):
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/status":
+                self.send_json(service.status())
+            else:
+                self.send_json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/evaluate":
+                self.send_json({"error": "not found"}, 404)
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length).decode("utf-8"))
+            except ValueError:
+                self.send_json({"error": "request body must be JSON"}, 400)
+                return
+            code, body = service.evaluate(request)
+            self.send_json(body, code)
+
+        def log_message(self, format, *args):
+            pass
+    return Handler
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description = "Keep an incident's SSD in memory and evaluate safety zones on request.")
+    parser.add_argument("vh", help = "LANDFIRE EVH raster")
+    parser.add_argument("dtm", help = "DTM raster")
+    parser.add_argument("--host", default = "localhost")
+    parser.add_argument("--port", type = int, default = DEFAULT_PORT)
+    parser.add_argument("--workers", type = int, default = max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--queue", type = int, default = DEFAULT_QUEUE, help = "requests that can wait for a worker")
+    args = parser.parse_args(argv)
+
+    incident = load_incident(args.vh, args.dtm)
+    service = Service(incident, args.workers, args.queue)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print("SSDE service for EPSG " + str(incident.epsg) + " listening on http://" + args.host + ":" + str(args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.pool.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
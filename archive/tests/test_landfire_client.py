@@ -0,0 +1,121 @@
+## tests for landfire_client.py against lfps_standin_server.py, run from archive/:
+##
+##   python -m pytest tests
+
+## import relevant packages
+import io
+import os
+import sys
+import threading
+import zipfile
+import pytest
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import landfire_client
+import lfps_standin_server
+
+
+@pytest.fixture
+def server():
+    lfps_standin_server.jobs.clear()
+    lfps_standin_server.flaky = False
+    httpd = ThreadingHTTPServer(("localhost", 0), lfps_standin_server.Handler)
+    thread = threading.Thread(target = httpd.serve_forever, daemon = True)
+    thread.start()
+    yield "http://localhost:" + str(httpd.server_address[1]) + "/api"
+    httpd.shutdown()
+    httpd.server_close()
+    lfps_standin_server.flaky = False
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # backoff waits are recorded instead of slept
+    waits = []
+    monkeypatch.setattr(landfire_client.time, "sleep", waits.append)
+    return waits
+
+
+def make_client(url, messages=None, **kwargs):
+    kwargs.setdefault("poll_initial", 0.01)
+    kwargs.setdefault("poll_max", 0.04)
+    kwargs.setdefault("poll_factor", 2.0)
+    return landfire_client.LandfireClient("someone+fire@example.com", base_url = url,
+                                          log = (messages.append if messages is not None else None), **kwargs)
+
+
+def member(job_id, name):
+    with zipfile.ZipFile(io.BytesIO(lfps_standin_server.job_zip(job_id))) as z:
+        return z.read(job_id + name)
+
+
+def test_fetch_polls_with_backoff_and_renames(server, sleeps, tmp_path):
+    messages = []
+    client = make_client(server, messages)
+    files = client.fetch("200EVH", client.aoi(-112.5, 40.0, -112.0, 40.5), str(tmp_path), "EVH")
+    assert sorted(os.path.basename(f) for f in files) == ["EVH.tfw", "EVH.tif"]
+    job_id, job = next(iter(lfps_standin_server.jobs.items()))
+    with open(tmp_path / "EVH.tif", "rb") as f:
+        assert f.read() == member(job_id, ".tif")
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".part")]
+    # every status is logged once, in order
+    statuses = [m.split(": ")[-1] for m in messages if m.startswith("LANDFIRE job")]
+    assert statuses == ["Pending", "Executing", "Succeeded"]
+    # one wait between each poll, growing by poll_factor up to poll_max
+    polls = lfps_standin_server.POLLS_PENDING + lfps_standin_server.POLLS_EXECUTING
+    assert sleeps == [0.01, 0.02, 0.04, 0.04][:polls]
+    # query values reach the service intact
+    assert job["email"] == "someone+fire@example.com"
+    assert job["aoi"] == "-112.0 40.0 -112.5 40.5"
+
+
+def test_failed_job(server, sleeps, tmp_path):
+    client = make_client(server)
+    with pytest.raises(landfire_client.LandfireError, match = "Failed"):
+        client.fetch("FAIL_200EVH", client.aoi(0, 0, 1, 1), str(tmp_path), "EVH")
+    assert len(lfps_standin_server.jobs) == 1
+
+
+def test_failed_job_is_resubmitted(server, sleeps, tmp_path):
+    messages = []
+    client = make_client(server, messages)
+    with pytest.raises(landfire_client.LandfireError):
+        client.fetch("FAIL_200EVH", client.aoi(0, 0, 1, 1), str(tmp_path), "EVH", retries = 2)
+    assert len(lfps_standin_server.jobs) == 3
+    assert sum("Resubmitting" in m for m in messages) == 2
+
+
+def test_flaky_download_resumes(server, sleeps, tmp_path):
+    lfps_standin_server.flaky = True
+    messages = []
+    client = make_client(server, messages)
+    client.fetch("200EVH", client.aoi(0, 0, 1, 1), str(tmp_path), "EVH")
+    job_id = next(iter(lfps_standin_server.jobs))
+    with open(tmp_path / "EVH.tif", "rb") as f:
+        assert f.read() == member(job_id, ".tif")
+    assert any("resuming" in m for m in messages)
+
+
+def test_timeout(server, sleeps, tmp_path):
+    client = make_client(server, timeout = 0.0)
+    with pytest.raises(landfire_client.LandfireError, match = "did not finish"):
+        client.fetch("200EVH", client.aoi(0, 0, 1, 1), str(tmp_path), "EVH")
+
+
+def test_http_errors_are_landfire_errors(server, sleeps, tmp_path):
+    client = make_client(server)
+    with pytest.raises(landfire_client.LandfireError):
+        client.download_extract(server.replace("/api", "/missing.zip"), str(tmp_path))
+    with pytest.raises(landfire_client.LandfireError):
+        make_client(server + "/nowhere").submit("200EVH", client.aoi(0, 0, 1, 1))
+
+
+def test_checksum_mismatch_removes_part_file(tmp_path):
+    data = bytearray(lfps_standin_server.job_zip("job"))
+    # CRC-32 of the first member, in its local file header
+    data[14] ^= 0xFF
+    extractor = landfire_client.ZipStreamExtractor(str(tmp_path))
+    with pytest.raises(landfire_client.LandfireError, match = "Checksum"):
+        extractor.feed(bytes(data))
+    assert os.listdir(tmp_path) == []
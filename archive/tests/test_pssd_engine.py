@@ -0,0 +1,92 @@
+## tests for the NumPy pSSD methods of pssd_engine.py against a brute force
+## minimum over every segment cell, run from archive/:
+##
+##   python -m pytest tests
+
+## import relevant packages
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pssd_engine
+
+CELLSIZE_X, CELLSIZE_Y = 30.0, 25.0
+
+
+# random segments of a few cells up to tens of cells around a rectangular SZ,
+# with some NoData SSD, one segment of SSD 0 and no segments on the SZ
+@pytest.fixture
+def grid():
+    rng = np.random.default_rng(7)
+    rows, cols = 40, 44
+    labels = ((np.arange(rows)[:, None] // 4) * 20 + np.arange(cols)[None, :] // 3).astype(np.float64)
+    labels += rng.integers(0, 2, (rows, cols)) * 1000
+    ssd = rng.uniform(1, 60, (rows, cols))
+    ssd[rng.random((rows, cols)) < 0.05] = np.nan
+    ssd[labels == labels[0, 0]] = 0
+    sz_mask = np.zeros((rows, cols), dtype=bool)
+    sz_mask[14:26, 15:29] = True
+    labels[sz_mask] = np.nan
+    labels[rng.random((rows, cols)) < 0.03] = np.nan
+    return labels, ssd, sz_mask
+
+
+# min over segments of (distance to the closest cell of the segment / mean SSD)
+def brute_force(labels, ssd, sz_mask):
+    out = np.full(sz_mask.shape, np.nan)
+    sz_rows, sz_cols = np.nonzero(sz_mask)
+    best = np.full(sz_rows.size, np.inf)
+    for value in np.unique(labels[np.isfinite(labels)]):
+        seg = labels == value
+        mean = np.nanmean(ssd[seg]) if np.isfinite(ssd[seg]).any() else np.nan
+        if not mean > 0:
+            continue
+        rows, cols = np.nonzero(seg)
+        dist = np.hypot((sz_cols[:, None] - cols[None, :]) * CELLSIZE_X,
+                        (sz_rows[:, None] - rows[None, :]) * CELLSIZE_Y).min(axis=1)
+        best = np.minimum(best, dist / mean)
+    out[sz_rows, sz_cols] = best
+    return out
+
+
+@pytest.mark.parametrize("prune", [False, True])
+def test_kdtree_matches_brute_force(grid, prune):
+    labels, ssd, sz_mask = grid
+    stats = {}
+    pssd = pssd_engine.minimum_pssd_kdtree(labels, ssd, sz_mask, CELLSIZE_X, CELLSIZE_Y, prune = prune, stats = stats)
+    assert np.allclose(pssd, brute_force(labels, ssd, sz_mask), equal_nan = True)
+    # the SSD 0 segment is never evaluated or counted as pruned
+    assert stats["evaluated"] + stats["pruned"] == stats["segments"] - 1
+    if prune:
+        assert stats["pruned"] > 0
+
+
+
+@pytest.mark.parametrize("block", [1, 4, 16])
+def test_pyramid_matches_brute_force(grid, block):
+    labels, ssd, sz_mask = grid
+    exact = brute_force(labels, ssd, sz_mask)
+    threshold = float(np.nanmedian(exact))
+    stats = {}
+    pssd = pssd_engine.minimum_pssd_pyramid(labels, ssd, sz_mask, CELLSIZE_X, CELLSIZE_Y, block = block,
+                                            threshold = threshold, stats = stats)
+    # same safest point(s), maximum and cells over the threshold, NaN outside the SZ
+    assert np.isclose(np.nanmax(pssd), np.nanmax(exact))
+    assert np.array_equal(np.isclose(pssd, np.nanmax(pssd)), np.isclose(exact, np.nanmax(exact)))
+    assert np.array_equal(pssd > threshold, exact > threshold)
+    assert np.isnan(pssd[~sz_mask]).all() and np.isfinite(pssd[sz_mask]).all()
+    assert stats["cells"] == sz_mask.sum()
+    if block == 1:
+        assert np.allclose(pssd, exact, equal_nan = True)
+    else:
+        assert stats["evaluated"] < stats["cells"]
+
+
+def test_parallel_matches_brute_force(grid):
+    labels, ssd, sz_mask = grid
+    stats = {}
+    pssd = pssd_engine.minimum_pssd_parallel(labels, ssd, sz_mask, CELLSIZE_X, CELLSIZE_Y, workers = 3, stats = stats)
+    assert stats["workers"] == 3
+    assert np.allclose(pssd, brute_force(labels, ssd, sz_mask), equal_nan = True)
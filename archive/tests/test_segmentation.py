@@ -0,0 +1,67 @@
+## tests for the NumPy segmentation of segmentation.py, run from archive/:
+##
+##   python -m pytest tests
+
+## import relevant packages
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import segmentation
+
+
+# two 30 cell halves (SSD 10 and 50), a 4 cell segment inside the right half (SSD 45)
+# and a 4 cell segment across the middle (SSD 12)
+def halves():
+    ids = np.zeros((5, 12), dtype=np.int64)
+    ids[:, 6:] = 1
+    ids[1:3, 8:10] = 2
+    ids[0:2, 5:7] = 3
+    ssd = np.array([10.0, 50.0, 45.0, 12.0])[ids]
+    return ids, ssd
+
+
+def test_merge_small_into_closest_mean():
+    ids, ssd = halves()
+    merged, n = segmentation.merge_small(ids, ssd, 4)
+    expected = np.zeros(ids.shape, dtype=np.int64)
+    expected[:, 6:] = 1
+    expected[0:2, 6] = 0
+    assert n == 2
+    assert np.array_equal(merged, expected)
+
+
+def test_merge_small_keeps_nodata():
+    ids, ssd = halves()
+    ids[4, :] = -1
+    ssd[4, :] = np.nan
+    merged, n = segmentation.merge_small(ids, ssd, 4)
+    assert n == 2
+    assert (merged[4] == -1).all()
+    assert (np.bincount(merged[merged >= 0]) >= segmentation.MIN_SEGMENT_SIZE).all()
+
+
+def test_segment_ssd_min_size():
+    rng = np.random.default_rng(3)
+    ssd = rng.uniform(0, 100, (40, 50))
+    ssd[:5, :5] = np.nan
+    labels, stats = segmentation.segment_ssd(ssd)
+    assert np.isnan(labels[:5, :5]).all() and np.isfinite(labels[5:, 5:]).all()
+    assert (stats["count"] >= segmentation.MIN_SEGMENT_SIZE).all()
+    assert stats["count"].sum() == np.isfinite(ssd).sum()
+
+
+def test_segment_agreement_identical():
+    a = np.array([[1, 1, 2], [2, 3, np.nan]])
+    # same partition with other label values
+    b = np.array([[7, 7, 5], [5, 9, 9]], dtype=np.float64)
+    out = segmentation.segment_agreement(a, b)
+    assert out == {"cells": 5, "segments_a": 3, "segments_b": 3, "adjusted_rand": 1.0}
+
+
+def test_segment_agreement_hand_value():
+    # contingency table [[2, 0, 0], [0, 1, 1]]: index 1, expected 2 * 1 / 6, max 1.5
+    a = np.array([0, 0, 1, 1], dtype=np.float64)
+    b = np.array([0, 0, 1, 2], dtype=np.float64)
+    assert np.isclose(segmentation.segment_agreement(a, b)["adjusted_rand"], 4 / 7.0)
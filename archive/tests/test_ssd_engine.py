@@ -0,0 +1,49 @@
+## tests for the slope classes and SSD of ssd_engine.py, run from archive/:
+##
+##   python -m pytest tests
+
+## import relevant packages
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ssd_engine
+
+# [0, 7.5) -> 0, [7.5, 22.5) -> 1, [22.5, 41) -> 2, >= 41 -> 3
+SLOPES = np.array([0.0, 7.49, 7.5, 22.49, 22.5, 40.99, 41.0, 300.0], dtype=np.float32)
+CLASSES = [0, 0, 1, 1, 2, 2, 3, 3]
+
+
+def test_slope_class_breaks():
+    assert ssd_engine.slope_class(SLOPES).tolist() == CLASSES
+
+
+def test_slope_class_nodata():
+    cls = ssd_engine.slope_class(np.array([np.nan, -1.0, 0.0], dtype=np.float32))
+    assert cls.tolist() == [-1, -1, 0]
+
+
+def test_evh_to_meters():
+    # 11-100 are 0 m, 101-199 are code - 100 m, 201-230 and 301-310 are tenths of a meter
+    evh = np.array([50, 105, 199, 215, 305, np.nan])
+    assert np.allclose(ssd_engine.evh_to_meters(evh), [0, 5, 99, 1.5, 0.5, np.nan], equal_nan = True)
+
+
+def test_compute_ssd_from_class():
+    # 5 m vegetation, Moderate/Extreme mfl is [2, 2.5, 5, 6]: SSD = 8 * 5 * mfl[class]
+    mfl = ssd_engine.get_mfl("Moderate (11-20 mph)", "Extreme")
+    evh = np.full(SLOPES.shape, 105.0)
+    ssd = ssd_engine.compute_ssd_from_class(evh, ssd_engine.slope_class(SLOPES), mfl)
+    assert ssd.dtype == np.float32
+    assert ssd.tolist() == [80, 80, 100, 100, 200, 200, 240, 240]
+
+
+def test_compute_ssd_nodata():
+    mfl = ssd_engine.get_mfl("Light (0-10 mph)", "Low")
+    evh = np.array([[215, np.nan], [215, 215]])
+    slope = np.array([[41.0, 0.0], [np.nan, 7.5]], dtype=np.float32)
+    ssd = ssd_engine.compute_ssd(evh, slope, mfl)
+    # 1.5 m: 8 * 1.5 * 2 and 8 * 1.5 * 1, NaN where EVH or slope is NoData
+    assert np.array_equal(ssd, [[24, np.nan], [np.nan, 12]], equal_nan = True)
+
@@ -0,0 +1,133 @@
+## tests for the request handling of ssde_service.py, run from archive/:
+##
+##   python -m pytest tests
+
+## import relevant packages
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ssde_service
+
+SQUARE = [[[0, 0], [0, 90], [90, 90], [90, 0]]]
+
+
+class StubIncident:
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = []
+
+    def evaluate(self, *args):
+        self.calls.append(args)
+        if self.error is not None:
+            raise self.error
+        return {"sz_cells": 9}
+
+
+def make_service(incident):
+    return ssde_service.Service(incident, 1, 1)
+
+
+@pytest.mark.parametrize("request_body", [
+    [],
+    {},
+    {"rings": []},
+    {"rings": [[[0, 0], [1, 1]]]},
+    {"rings": [[[0, 0], [1, 1], [2]]]},
+    {"rings": [[[0, 0], [1, 1], ["a", 2]]]},
+    {"rings": [[0, 1, 2]]},
+    {"rings": SQUARE, "wkid": "4326"},
+    {"rings": SQUARE, "pssd_method": "FASTEST"},
+])
+def test_malformed_requests_are_400(request_body):
+    incident = StubIncident()
+    service = make_service(incident)
+    code, body = service.evaluate(request_body)
+    assert code == 400 and "error" in body
+    assert incident.calls == []
+    assert service.counts["failed"] == 1
+
+
+def test_request_arguments():
+    incident = StubIncident()
+    service = make_service(incident)
+    code, body = service.evaluate({"rings": SQUARE, "wkid": 4326, "wind_speed": "High", "pssd_method": "pyramid"})
+    assert code == 200 and body == {"sz_cells": 9}
+    assert incident.calls == [(SQUARE, 4326, "High", "Moderate", "PYRAMID")]
+    assert service.counts["served"] == 1
+
+
+def test_evaluation_errors():
+    service = make_service(StubIncident(ssde_service.ServiceError("outside the rasters")))
+    assert service.evaluate({"rings": SQUARE})[0] == 400
+    service = make_service(StubIncident(IndexError("index 5 is out of bounds")))
+    code, body = service.evaluate({"rings": SQUARE})
+    assert code == 500 and "out of bounds" in body["error"]
+    assert service.counts["failed"] == 1 and service.counts["in_progress"] == 0
+
+
+##############################
+##   Incident.evaluate      ##
+##############################
+class Grid:
+    # the parts of raster_io.Window that Incident uses, without arcpy
+    def __init__(self, xmin, ymax, cellsize, ncols, nrows):
+        self.xmin, self.ymax = xmin, ymax
+        self.cellsize_x = self.cellsize_y = cellsize
+        self.ncols, self.nrows = ncols, nrows
+
+    def sub(self, row, col, nrows, ncols):
+        return Grid(self.xmin + col * self.cellsize_x, self.ymax - row * self.cellsize_y, self.cellsize_x, ncols, nrows)
+
+
+def brute_force(ssd, sz_mask, cellsize):
+    import segmentation
+    rows, cols = np.indices(ssd.shape)
+    sz = np.column_stack(np.nonzero(sz_mask)) * cellsize
+    cells = np.column_stack((rows.ravel(), cols.ravel())) * cellsize
+    dist = np.sqrt(((cells[:, None, :] - sz[None, :, :])**2).sum(axis=2)).min(axis=1).reshape(ssd.shape)
+    ring = (dist > 0) & (dist <= 9280.0) & np.isfinite(ssd)
+    max_ssd = ssd[ring].max()
+    donut = np.where((dist > 0) & (dist <= max_ssd), ssd, np.nan)
+    labels, _ = segmentation.segment_ssd(donut)
+    pssd = np.full(ssd.shape, np.nan)
+    for r, c in np.argwhere(sz_mask):
+        best = np.inf
+        for value in np.unique(labels[np.isfinite(labels)]):
+            seg = labels == value
+            mean = np.nanmean(np.where(seg, donut, np.nan))
+            if mean > 0:
+                d = np.sqrt(((np.argwhere(seg) - (r, c))**2).sum(axis=1)).min() * cellsize
+                best = min(best, d / mean)
+        pssd[r, c] = best
+    return max_ssd, pssd
+
+
+def test_incident_matches_brute_force():
+    rng = np.random.default_rng(7)
+    nrows, ncols, cellsize = 36, 40, 30.0
+    grid = Grid(500000.0, 4500000.0, cellsize, ncols, nrows)
+    # blocky SSD so segments are bigger than a cell, a little NoData
+    ssd = np.kron(rng.uniform(0, 400, (9, 9, 10)), np.ones((4, 4)))[:, :nrows, :ncols]
+    ssd[:, rng.random((nrows, ncols)) < 0.03] = np.nan
+    incident = ssde_service.Incident(grid, ssd, 26912)
+    # a 6 x 6 cell square with a 2 x 2 cell hole, cell edges at 15 * 30 m
+    x0, y0 = grid.xmin + 15 * cellsize, grid.ymax - 15 * cellsize
+    outer = [[x0, y0], [x0 + 180, y0], [x0 + 180, y0 - 180], [x0, y0 - 180]]
+    hole = [[x0 + 60, y0 - 60], [x0 + 120, y0 - 60], [x0 + 120, y0 - 120], [x0 + 60, y0 - 120]]
+    result = incident.evaluate([outer, hole], None, "High", "Extreme", "PRUNED")
+
+    sz_mask = np.zeros((nrows, ncols), dtype=bool)
+    sz_mask[15:21, 15:21] = True
+    sz_mask[17:19, 17:19] = False
+    band = ssde_service.ssd_engine.SCENARIOS.index(ssde_service.ssd_engine.find_scenario("High", "Extreme"))
+    max_ssd, pssd = brute_force(ssd[band], sz_mask, cellsize)
+    assert result["sz_cells"] == 32
+    assert result["max_ssd"] == pytest.approx(max_ssd)
+    assert result["ssd_met_cells"] == int(np.count_nonzero(pssd > 1.0))
+    assert result["max_pssd"] == pytest.approx(np.nanmax(pssd))
+    safest = [[grid.xmin + (c + 0.5) * cellsize, grid.ymax - (r + 0.5) * cellsize]
+              for r, c in np.argwhere(pssd == np.nanmax(pssd))]
+    assert sorted(result["safest_points"]) == sorted(safest)